@@ -0,0 +1,235 @@
+# batch.py — пакетная генерация без GUI: много отделов × месяцев в пуле процессов.
+# Запуск: python batch.py отдел1.db отдел2.json ... --start 2026-01 [--end 2026-12] [--workers 8] [--summary итоги.json]
+#         python batch.py --jobs jobs.json        (jobs.json: [{"roster": "отдел1.db", "year": 2026, "month": 1}, ...])
+# Источник *.db — ростер, отсутствия, события и итоги прошлых месяцев берутся из него, туда же пишется результат.
+# Источник *.json — ростер (список сотрудников или {"employees": [...]}); результат — в <имя>.db рядом.
+# Месяцы одного отдела идут подряд в одном процессе (итоги переходят из месяца в месяц), отделы — параллельно.
+# Читает и пишет в SQLite только главный процесс, каждый отдел — одной транзакцией.
+# Месяцы с теми же входами, что уже считались, берутся из кэша (cache.py) без генерации.
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import db
+import prof
+import cache
+from logic import generate_horizon, add_months, iter_months, month_arg, update_state
+
+def plan_jobs(jobs):
+    """
+    [(roster, year, month)] -> единицы работы: подряд идущие месяцы одного ростера,
+    [{"roster": Path, "start": (y, m), "months": k}] в порядке первого появления ростера.
+    """
+    by_roster = {}
+    for roster, y, m in jobs:
+        by_roster.setdefault(Path(roster), set()).add((y, m))
+    units = []
+    for roster, months in by_roster.items():
+        months = sorted(months)
+        start, k = months[0], 1
+        for ym in months[1:]:
+            if ym == add_months(*start, k):
+                k += 1
+            else:
+                units.append({"roster": roster, "start": start, "months": k})
+                start, k = ym, 1
+        units.append({"roster": roster, "start": start, "months": k})
+    return units
+
+def _target_db(roster: Path) -> Path:
+    return roster if roster.suffix.lower() == ".db" else roster.with_suffix(".db")
+
+def _load_json_roster(path: Path):
+    data = json.loads(path.read_text(encoding="utf-8"))
+    employees = data["employees"] if isinstance(data, dict) else data
+    return [{"name": e["name"], "part_time": bool(e.get("part_time", False)),
+             "can_duty": bool(e.get("can_duty", True)), "can_support": bool(e.get("can_support", True))}
+            for e in employees]
+
+@prof.timed("batch.read")
+def read_unit(unit):
+    """Всё, что нужно процессу-генератору, одним набором запросов к базе отдела."""
+    roster = unit["roster"]
+    from_json = roster.suffix.lower() == ".json"
+    db.DB_PATH = _target_db(roster)
+    db.init_db(seed=not from_json)
+    if from_json:
+        employees = _load_json_roster(roster)
+        db.upsert_employees(employees)
+    else:
+        employees = [{k: v for k, v in e.items() if k != "id"} for e in db.load_employees()]
+    names = [e["name"] for e in employees]
+    end = add_months(*unit["start"], unit["months"] - 1)
+    return dict(unit, employees=employees,
+                absences=db.load_absences_range(unit["start"], end, names),
+                fixed_events=db.load_fixed_events_range(unit["start"], end),
+                state=db.load_summary(*add_months(*unit["start"], -1)))
+
+def run_unit(unit):
+    """
+    В процессе пула: месяцы отдела подряд. Возвращает [(y, m, ScheduleMatrix|None, state|None, секунды, ошибка|None)];
+    после первой ошибки остальные месяцы отдела не считаются (им не с чего продолжать).
+    """
+    out = []
+    state = unit["state"]
+    months = generate_horizon(unit["employees"], unit["start"], unit["months"], state,
+                              unit["absences"], unit["fixed_events"], unit["duty"], unit["engine"])
+    for k in range(unit["months"]):
+        y, m = add_months(*unit["start"], k)
+        t0 = time.perf_counter()
+        try:
+            _y, _m, schedule = next(months)
+        except Exception:
+            out.append((y, m, None, None, time.perf_counter() - t0, traceback.format_exc(limit=3)))
+            for j in range(k + 1, unit["months"]):
+                out.append(add_months(*unit["start"], j) + (None, None, 0.0, "не сгенерирован: ошибка в предыдущем месяце"))
+            break
+        # копия: state продолжает меняться следующими месяцами
+        out.append((y, m, schedule, {n: dict(st) for n, st in state.items()}, time.perf_counter() - t0, None))
+    return out
+
+def take_cached(unit):
+    """
+    Месяцы из начала unit, которые уже есть в кэше (cache.py), — в формате run_unit, без генерации.
+    unit сдвигается на остаток: start, months и state — на конец последнего найденного месяца.
+    """
+    out = []
+    names = [e["name"] for e in unit["employees"]]
+    state = unit["state"]
+    while unit["months"]:
+        y, m = unit["start"]
+        t0 = time.perf_counter()
+        key = cache.schedule_key(unit["employees"], y, m, unit["absences"].get((y, m)),
+                                 unit["fixed_events"].get((y, m)), unit["duty"], state)
+        schedule = cache.lookup(key, names, y, m)
+        if schedule is None:
+            break
+        update_state(state, schedule)
+        out.append((y, m, schedule, {n: dict(st) for n, st in state.items()}, time.perf_counter() - t0, None))
+        unit["start"], unit["months"] = add_months(y, m, 1), unit["months"] - 1
+    return out
+
+def remember(unit, months):
+    """Сгенерированные месяцы — в кэш; ключ месяца считается от итогов на конец предыдущего."""
+    items, state = [], unit["state"]
+    for y, m, schedule, after, _dt, err in months:
+        if err is not None:
+            break
+        items.append((cache.schedule_key(unit["employees"], y, m, unit["absences"].get((y, m)),
+                                         unit["fixed_events"].get((y, m)), unit["duty"], state), schedule))
+        state = after
+    cache.store(items)
+
+def _engine(name):
+    if name == "np":
+        from logic_np import generate_schedule_np
+        return generate_schedule_np
+    return None     # logic.generate_schedule
+
+def _failed(unit, error):
+    return [add_months(*unit["start"], k) + (None, None, 0.0, error) for k in range(unit["months"])]
+
+def run(jobs, workers=None, chunksize=1, duty="flow", engine="np"):
+    """
+    Генерирует и записывает jobs = [(roster, year, month)]. Возвращает итоги по заданиям:
+    [{"roster", "year", "month", "employees", "generate_s", "write_s", "status", "error"}];
+    status — "ok", "cached" (взят из кэша без генерации) или "failed".
+    """
+    engine = _engine(engine)
+    summary = []
+
+    def report(unit, months, write_s=0.0, write_error=None, cached=0):
+        written = sum(1 for *_x, err in months if err is None)
+        for k, (y, m, _schedule, _state, dt, err) in enumerate(months):
+            error = err or write_error
+            summary.append({"roster": str(unit["roster"]), "year": y, "month": m,
+                            "employees": len(unit.get("employees", ())), "generate_s": round(dt, 4),
+                            "write_s": round(write_s / written, 4) if err is None else 0.0,
+                            "status": "failed" if error else "cached" if k < cached else "ok", "error": error})
+
+    prepared = []
+    for unit in plan_jobs(jobs):
+        try:
+            unit = dict(read_unit(unit), duty=duty, engine=engine)
+            prepared.append((unit, take_cached(unit)))
+        except Exception as e:
+            report(unit, _failed(unit, f"чтение: {e}"))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(run_unit, [unit for unit, _cached in prepared if unit["months"]],
+                           chunksize=max(1, chunksize))
+        broken = None
+        for unit, cached in prepared:
+            months = []
+            if unit["months"] and broken is None:
+                try:
+                    months = next(results)
+                except Exception as e:      # процесс пула упал (BrokenProcessPool): дальше результатов не будет
+                    broken = f"процесс: {e!r}"
+            if unit["months"] and broken is not None:
+                months = _failed(unit, broken)
+            # единственный писатель: месяцы отдела — одной транзакцией
+            db.DB_PATH = _target_db(unit["roster"])
+            ok = [(y, m, schedule, state) for y, m, schedule, state, _dt, err in cached + months if err is None]
+            write_s, write_error = 0.0, None
+            if ok:
+                t0 = time.perf_counter()
+                try:
+                    with prof.span("batch.write"):
+                        db.save_months(ok)
+                        remember(unit, months)
+                except Exception as e:
+                    write_error = f"запись: {e}"
+                write_s = time.perf_counter() - t0
+            report(unit, cached + months, write_s, write_error, len(cached))
+    db.close_all()
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетная генерация графиков: отделы × месяцы в пуле процессов.")
+    parser.add_argument("rosters", nargs="*", help="ростеры отделов: *.db или *.json")
+    parser.add_argument("--start", type=month_arg, help="первый месяц, ГГГГ-ММ")
+    parser.add_argument("--end", type=month_arg, help="последний месяц, ГГГГ-ММ (по умолчанию = start)")
+    parser.add_argument("--jobs", help="JSON со списком {\"roster\", \"year\", \"month\"} вместо rosters/--start")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="процессов (по умолчанию — ядер)")
+    parser.add_argument("--chunksize", type=int, default=1, help="отделов на одну отправку в процесс")
+    parser.add_argument("--duty", choices=("flow", "greedy"), default="flow")
+    parser.add_argument("--engine", choices=("np", "py"), default="np", help="np — logic_np, py — logic")
+    parser.add_argument("--summary", help="куда записать итоги по заданиям (JSON)")
+    prof.add_cli_flags(parser)
+    args = parser.parse_args(argv)
+    prof.apply_cli_flags(args)
+
+    if args.jobs:
+        jobs = [(j["roster"], int(j["year"]), int(j["month"]))
+                for j in json.loads(Path(args.jobs).read_text(encoding="utf-8"))]
+    else:
+        if not args.rosters or not args.start:
+            parser.error("нужны ростеры и --start (или --jobs)")
+        end = args.end or args.start
+        if end < args.start:
+            parser.error("последний месяц раньше первого")
+        jobs = [(r, y, m) for r in args.rosters for y, m in iter_months(args.start, end)]
+
+    t0 = time.perf_counter()
+    summary = run(jobs, args.workers, args.chunksize, args.duty, args.engine)
+    total = time.perf_counter() - t0
+
+    failed = [s for s in summary if s["status"] == "failed"]
+    for s in summary:
+        line = f"{s['roster']:<32} {s['year']}-{s['month']:02d} {s['employees']:>6} сотр. " \
+               f"генерация {s['generate_s']*1000:8.1f} мс, запись {s['write_s']*1000:8.1f} мс  {s['status']}"
+        print(line + (f": {s['error'].strip().splitlines()[-1]}" if s["error"] else ""))
+    print(f"Заданий: {len(summary)}, ошибок: {len(failed)}, всего {total:.2f} с.")
+    if args.summary:
+        Path(args.summary).write_text(json.dumps({"total_s": round(total, 3), "jobs": summary},
+                                                 ensure_ascii=False, indent=2), encoding="utf-8")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
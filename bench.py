@@ -0,0 +1,204 @@
+# bench.py — замеры скорости: генерация, SQLite, экспорт Excel, заполнение таблицы (Qt offscreen).
+# Запуск: python bench.py [--sizes 15,200,2000,10000] [--out bench.json]
+#                         [--baseline bench_baseline.json --threshold 0.25] [--save-baseline bench_baseline.json]
+# С --baseline код выхода 1, если какой-то замер медленнее базового больше чем на threshold.
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import db
+import prof
+from logic import generate_schedule, month_days
+
+DEFAULT_SIZES = (15, 200, 2000, 10000)
+BIG_ROSTER = 10000      # от этого размера каждый замер делается один раз
+EDIT_SHARE = 0.05       # db_save_diff: доля ячеек, изменённых с прошлого сохранения (как после ручных правок)
+
+def make_roster(n: int, part_time_ratio: float = 0.15, can_duty_ratio: float = 0.85, seed: int = 0):
+    """Синтетический ростер в формате db.load_employees() (без id)."""
+    rnd = random.Random(seed)
+    roster = []
+    for i in range(n):
+        part_time = rnd.random() < part_time_ratio
+        roster.append({
+            "name": f"Сотрудник {i+1:05d}",
+            "part_time": part_time,
+            "can_duty": not part_time and rnd.random() < can_duty_ratio,
+            "can_support": not part_time,
+        })
+    return roster
+
+def edited_copies(schedule, share: float, count: int, seed: int = 0):
+    """
+    count копий графика подряд: каждая отличается от предыдущей (первая — от schedule) ровно share ячеек
+    (переключено дежурство). Готовятся заранее, чтобы в замер попала только запись.
+    """
+    rnd = random.Random(seed)
+    cells = [(r, d) for r in range(len(schedule.names)) for d in range(1, schedule.num_days + 1)]
+    k = max(1, round(len(cells) * share))
+    copies, cur = [], schedule
+    for _ in range(count):
+        cur = cur.copy()
+        for r, d in rnd.sample(cells, k):
+            cur.set_cell(r, d, duty=not cur.duty_at(r, d))
+        copies.append(cur)
+    return copies
+
+def timeit(fn, repeat: int):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return {"min": min(times), "median": statistics.median(times), "repeat": repeat}
+
+def _optional(module):
+    try:
+        return __import__(module)
+    except ImportError:
+        return None
+
+class QtApp:
+    """Offscreen QApplication создаётся один раз на весь прогон."""
+    app = None
+
+    @classmethod
+    def ready(cls):
+        if cls.app is None:
+            os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+            try:
+                from PySide6.QtWidgets import QApplication
+            except ImportError:
+                return False
+            cls.app = QApplication.instance() or QApplication([])
+        return True
+
+def bench_size(n: int, year: int, month: int, repeat: int, args, workdir: Path):
+    results = {}
+    roster = make_roster(n, args.part_time_ratio, args.can_duty_ratio, args.seed)
+    if n >= BIG_ROSTER:
+        repeat = 1
+
+    results[f"generate/{n}"] = timeit(lambda: generate_schedule(roster, year, month), repeat)
+    if _optional("numpy"):
+        from logic_np import generate_schedule_np
+        results[f"generate_np/{n}"] = timeit(lambda: generate_schedule_np(roster, year, month), repeat)
+    schedule = generate_schedule(roster, year, month)
+
+    # SQLite: отдельный файл на размер, ростер вставляется заранее
+    db.DB_PATH = workdir / f"bench_{n}.db"
+    db.init_db()
+    with db.get_conn() as conn:
+        conn.execute("DELETE FROM employees")
+        conn.executemany(
+            "INSERT INTO employees(name,part_time,can_duty,can_support) VALUES (?,?,?,?)",
+            [(e["name"], int(e["part_time"]), int(e["can_duty"]), int(e["can_support"])) for e in roster]
+        )
+    names = [e["name"] for e in roster]
+    results[f"db_save_full/{n}"] = timeit(lambda: db.save_month_schedule(year, month, schedule), repeat)
+    results[f"db_save_unchanged/{n}"] = timeit(lambda: db.save_month_schedule(year, month, schedule, diff=True), repeat)
+    edited = iter(edited_copies(schedule, EDIT_SHARE, repeat, args.seed))
+    results[f"db_save_diff/{n}"] = timeit(lambda: db.save_month_schedule(year, month, next(edited), diff=True), repeat)
+    results[f"db_load/{n}"] = timeit(lambda: db.load_month_schedule(year, month, names), repeat)
+    db.close_all()
+
+    if _optional("openpyxl"):
+        import export_xlsx
+        out = workdir / f"bench_{n}.xlsx"
+        results[f"export_xlsx/{n}"] = timeit(lambda: export_xlsx.export_schedules(out, [schedule]), repeat)
+
+    if QtApp.ready():
+        from PySide6.QtWidgets import QTableView
+        from ui_model import ScheduleModel, ScheduleDelegate
+        days = month_days(year, month)
+        model = ScheduleModel()
+        view = QTableView()
+        view.setModel(model)
+        view.setItemDelegate(ScheduleDelegate(view))
+        view.resize(1200, 700)
+
+        def populate():
+            model.set_schedule(schedule, days)
+            view.grab()     # отрисовка видимой части
+        results[f"ui_populate/{n}"] = timeit(populate, repeat)
+    return results
+
+def compare(results, baseline, threshold: float):
+    """Список (ключ, база, сейчас, отношение) для замеров медленнее базы более чем на threshold."""
+    regressions = []
+    for key, cur in results.items():
+        base = baseline.get(key)
+        if not base or not base["min"]:
+            continue
+        ratio = cur["min"] / base["min"]
+        if ratio > 1 + threshold:
+            regressions.append((key, base["min"], cur["min"], ratio))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры скорости генерации, БД, экспорта и таблицы.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="размеры ростеров через запятую")
+    parser.add_argument("--month", default="2025-03", help="месяц ГГГГ-ММ")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--part-time-ratio", type=float, default=0.15)
+    parser.add_argument("--can-duty-ratio", type=float, default=0.85)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="куда записать результаты (JSON)")
+    parser.add_argument("--baseline", help="JSON с базовыми результатами для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.25, help="допустимое замедление (0.25 = +25%%)")
+    parser.add_argument("--save-baseline", help="сохранить результаты как новую базу")
+    prof.add_cli_flags(parser)
+    args = parser.parse_args(argv)
+    prof.apply_cli_flags(args)
+
+    # база читается до замеров: --save-baseline в тот же файл не должен подменить её раньше сравнения
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))["results"] if args.baseline else None
+    year, month = (int(p) for p in args.month.split("-"))
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    saved_path = db.DB_PATH
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            for n in sizes:
+                print(f"— {n} сотрудников", flush=True)
+                for key, r in bench_size(n, year, month, args.repeat, args, Path(tmp)).items():
+                    results[key] = r
+                    print(f"  {key:<24} {r['min']*1000:10.1f} мс (медиана {r['median']*1000:.1f})", flush=True)
+        finally:
+            db.close_all()
+            db.DB_PATH = saved_path
+
+    report = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "month": args.month,
+            "part_time_ratio": args.part_time_ratio,
+            "can_duty_ratio": args.can_duty_ratio,
+        },
+        "results": results,
+    }
+    regressions = []
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for key, base, cur, ratio in regressions:
+            print(f"РЕГРЕССИЯ {key}: {base*1000:.1f} → {cur*1000:.1f} мс (×{ratio:.2f})")
+        if not regressions:
+            print(f"Регрессий нет (порог +{args.threshold:.0%}).")
+
+    for path in (args.out, args.save_baseline):
+        if path:
+            Path(path).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+# cache.py — кэш сгенерированных графиков по содержимому входов: LRU в памяти + schedule_cache в SQLite.
+# generate_schedule детерминирован: сотрудники (в порядке строк), месяц, отсутствия, события, режим дежурств
+# и итоги прошлых месяцев (state) однозначно задают результат — их хэш и есть ключ. Движок (logic/logic_np)
+# в ключ не входит: результат у них одинаковый. Смена состава (db.upsert_employee/remove_employee)
+# очищает оба уровня; изменившиеся отсутствия/события дают другой ключ сами.
+# Доводка (optimize.py) ограничена временем и от запуска к запуску может дать разное: её бюджет и seed
+# входят в ключ, а в кэше остаётся первый результат для этих входов.
+import calendar
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import db
+from logic import generate_schedule, absence_days, update_state
+from matrix import ScheduleMatrix
+from optimize import optimize_schedule
+from prof import count, timed
+
+VERSION = 3             # поднять при изменении алгоритма генерации — старые записи перестанут находиться
+MEMORY_ITEMS = 256      # графиков в памяти (месяц на 10 тыс. человек — ~300 КБ)
+
+_lock = threading.Lock()
+_memory = OrderedDict()     # key -> bytes, последний — самый свежий
+_memory_version = None      # db.roster_version, при котором заполнялась _memory
+
+def schedule_key(employees, year: int, month: int, absences=None, fixed_events=None, duty: str = "greedy", state=None,
+                 optimize: float = 0.0, seed: int = 0) -> str:
+    """Стабильный хэш нормализованных входов generate_schedule (аргументы — как у него и generate_cached)."""
+    names = [e["name"] for e in employees]
+    roster = set(names)
+    payload = {
+        "v": VERSION, "y": year, "m": month, "duty": duty,
+        "employees": [[e["name"], bool(e.get("part_time", False)), bool(e.get("can_duty", True)),
+                       bool(e.get("can_support", True))] for e in employees],
+        "absences": sorted((day, sorted(codes.items())) for day, codes in absence_days(absences, names).items()),
+        "events": sorted((day, sorted(json.dumps(ev, sort_keys=True, ensure_ascii=False) for ev in evs))
+                         for day, evs in (fixed_events or {}).items() if evs),
+        "state": sorted((name, sorted(st.items())) for name, st in (state or {}).items() if name in roster),
+    }
+    if optimize > 0:
+        payload["optimize"] = [optimize, seed]
+    text = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def _pack(schedule: ScheduleMatrix) -> bytes:
+    return b"".join(schedule.row_bytes(r) for r in range(len(schedule.names)))
+
+def _unpack(data: bytes, names, year: int, month: int) -> ScheduleMatrix:
+    nd = calendar.monthrange(year, month)[1]
+    return ScheduleMatrix(names, year, month, [bytearray(data[r*nd:(r+1)*nd]) for r in range(len(names))])
+
+def _check_roster():
+    """Состав поменялся с прошлого обращения — всё, что в памяти, посчитано не для него."""
+    global _memory_version
+    if _memory_version != db.roster_version:
+        _memory.clear()
+        _memory_version = db.roster_version
+
+def _remember(key, data):
+    _memory[key] = data
+    _memory.move_to_end(key)
+    while len(_memory) > MEMORY_ITEMS:
+        _memory.popitem(last=False)
+
+def lookup(key: str, names, year: int, month: int, disk: bool = True):
+    """ScheduleMatrix из кэша (новый объект, можно менять) или None. Попадание на диске поднимается в память."""
+    with _lock:
+        _check_roster()
+        data = _memory.get(key)
+        if data is not None:
+            _memory.move_to_end(key)
+    if data is None and disk:
+        data = db.cache_get(key)
+        if data is not None:
+            with _lock:
+                _remember(key, data)
+            count("cache.disk_hits")
+    elif data is not None:
+        count("cache.memory_hits")
+    if data is None or len(data) != len(names) * calendar.monthrange(year, month)[1]:
+        count("cache.misses")
+        return None
+    return _unpack(data, names, year, month)
+
+def store(items, disk: bool = True):
+    """items — [(key, ScheduleMatrix)]; на диск одной транзакцией (db.cache_put)."""
+    packed = [(key, _pack(schedule)) for key, schedule in items]
+    with _lock:
+        _check_roster()
+        for key, data in packed:
+            _remember(key, data)
+    if disk and packed:
+        db.cache_put(packed)
+
+def clear(disk: bool = True):
+    with _lock:
+        _memory.clear()
+    if disk:
+        db.cache_clear()
+
+@timed("cache.generate")
+def generate_cached(employees, year: int, month: int, absences=None, fixed_events=None, progress=None,
+                    duty: str = "greedy", state=None, engine=None, disk: bool = True,
+                    optimize: float = 0.0, seed: int = 0) -> ScheduleMatrix:
+    """
+    generate_schedule (или engine с той же сигнатурой, напр. logic_np.generate_schedule_np) через кэш.
+    state, как и у generate_schedule, дополняется итогами месяца — и при попадании тоже.
+    disk=False — только память (без обращений к SQLite, напр. в процессах пула batch.py).
+    optimize > 0 — затем столько секунд optimize.optimize_schedule (с этим seed); в кэше — доведённый график,
+    жадный — под своим ключом.
+    """
+    key = schedule_key(employees, year, month, absences, fixed_events, duty, state, optimize, seed)
+    schedule = lookup(key, [e["name"] for e in employees], year, month, disk)
+    if schedule is not None:
+        if state is not None:
+            update_state(state, schedule)
+        return schedule
+    if optimize > 0:
+        carried = None if state is None else {n: dict(st) for n, st in state.items()}
+        greedy = generate_cached(employees, year, month, absences, fixed_events, progress, duty, carried, engine, disk)
+        schedule, _info = optimize_schedule(employees, greedy, optimize, seed, progress=progress, state=state)
+        if state is not None:
+            update_state(state, schedule)
+    else:
+        schedule = (engine or generate_schedule)(employees, year, month, absences, fixed_events, progress=progress,
+                                                 duty=duty, state=state)
+    store([(key, schedule)], disk)
+    return schedule
@@ -1,13 +1,44 @@
 # db.py — простая обёртка над SQLite для сотрудников и расписаний
+import calendar
+import os
 import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
+
+from logic import add_months, iter_months
+from matrix import ScheduleMatrix, SHIFT_INDEX, DUTY_BIT, ABSENCE_CODES
+from prof import timed, count
 
 DB_PATH = Path(__file__).with_name("scheduler.db")
 
+# Раскладка графика записана в самой базе (meta.storage, см. storage()):
+# "rows"   — таблица schedule, строка на (сотрудник, день);
+# "packed" — таблица schedule_packed, строка на (сотрудник, месяц) с байтом на день (см. matrix.py).
+# Перевести базу: python db.py pack. SCHEDULER_STORAGE — раскладка, которую ждёт запуск: новая база
+# создаётся в ней, с базой в другой раскладке работа не начинается.
+STORAGE = os.environ.get("SCHEDULER_STORAGE") or None
+STORAGE_LAYOUTS = ("rows", "packed")
+
+# предел дискового кэша графиков (schedule_cache), байт данных
+CACHE_BYTES = int(os.environ.get("SCHEDULER_CACHE_BYTES", 32 * 1024 * 1024))
+
+# растёт при каждом изменении состава сотрудников: по нему cache.py сбрасывает кэш в памяти
+roster_version = 0
+
 SCHEMA = """
 PRAGMA journal_mode=WAL;
 
+-- свойства базы: storage — раскладка графика ("rows" | "packed")
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+) WITHOUT ROWID;
+
 CREATE TABLE IF NOT EXISTS employees (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     name TEXT NOT NULL UNIQUE,
@@ -28,6 +59,57 @@ CREATE TABLE IF NOT EXISTS schedule (
     FOREIGN KEY(emp_id) REFERENCES employees(id) ON DELETE CASCADE
 );
 
+-- упакованный вариант schedule: cells[d-1] = код смены | 0x80 при дежурстве (как ScheduleMatrix)
+CREATE TABLE IF NOT EXISTS schedule_packed (
+    emp_id INTEGER NOT NULL,
+    y INTEGER NOT NULL,
+    m INTEGER NOT NULL,
+    cells BLOB NOT NULL,
+    PRIMARY KEY(emp_id, y, m),
+    FOREIGN KEY(emp_id) REFERENCES employees(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+-- журнал ручных правок: только дописывается (отмена — тоже новая запись); compact_journal переносит
+-- последние значения ячеек в schedule/schedule_packed и удаляет свёрнутое, загрузка месяца видит и несвёрнутое
+CREATE TABLE IF NOT EXISTS edit_journal (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    emp_id INTEGER NOT NULL,
+    y INTEGER NOT NULL,
+    m INTEGER NOT NULL,
+    d INTEGER NOT NULL,
+    old_shift TEXT,
+    old_duty INTEGER NOT NULL,
+    new_shift TEXT,
+    new_duty INTEGER NOT NULL,
+    FOREIGN KEY(emp_id) REFERENCES employees(id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_edit_journal_month ON edit_journal(y, m);
+
+-- закреплённые вручную ячейки: при перегенерации они остаются как есть (logic.repair_schedule)
+CREATE TABLE IF NOT EXISTS pins (
+    emp_id INTEGER NOT NULL,
+    y INTEGER NOT NULL,
+    m INTEGER NOT NULL,
+    d INTEGER NOT NULL,
+    PRIMARY KEY(emp_id, y, m, d),
+    FOREIGN KEY(emp_id) REFERENCES employees(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+-- накопленные итоги сотрудника на конец месяца (y, m) и его последний день: с них продолжается
+-- генерация следующего месяца (logic.update_state), без перечитывания прошлых графиков
+CREATE TABLE IF NOT EXISTS emp_summary (
+    emp_id INTEGER NOT NULL,
+    y INTEGER NOT NULL,
+    m INTEGER NOT NULL,
+    shift2 INTEGER NOT NULL,
+    duty INTEGER NOT NULL,
+    support INTEGER NOT NULL,
+    last_shift TEXT,
+    last_duty INTEGER NOT NULL,
+    PRIMARY KEY(emp_id, y, m),
+    FOREIGN KEY(emp_id) REFERENCES employees(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
 CREATE TABLE IF NOT EXISTS absences (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     emp_id INTEGER NOT NULL,
@@ -43,6 +125,19 @@ CREATE TABLE IF NOT EXISTS fixed_events (
     type TEXT NOT NULL, -- 'ОБЕС' и т.п.
     required_count INTEGER NOT NULL DEFAULT 1
 );
+
+-- выборки за месяц/год идут диапазоном по dt (строки YYYY-MM-DD сравниваются как даты)
+CREATE INDEX IF NOT EXISTS idx_absences_emp_dt ON absences(emp_id, dt);
+CREATE INDEX IF NOT EXISTS idx_absences_dt ON absences(dt);
+CREATE INDEX IF NOT EXISTS idx_fixed_events_dt ON fixed_events(dt);
+
+-- кэш сгенерированных графиков (cache.py): ключ — хэш входов, data — байты ячеек построчно
+CREATE TABLE IF NOT EXISTS schedule_cache (
+    key TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    used REAL NOT NULL      -- time.time() последнего обращения; вытесняются самые давние
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_schedule_cache_used ON schedule_cache(used);
 """
 
 SEED_EMPLOYEES = [
@@ -63,94 +158,667 @@ SEED_EMPLOYEES = [
     ("Кузьмина А.А.", 1, 0, 0),
 ]
 
-def get_conn():
-    conn = sqlite3.connect(DB_PATH)
+# Настройки, которые SQLite хранит per-connection: выставляются один раз при открытии
+CONN_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-16000",   # ~16 МБ страничного кэша
+    "PRAGMA foreign_keys=ON",     # иначе ON DELETE CASCADE не срабатывает
+)
+STATEMENT_CACHE_SIZE = 256
+
+_local = threading.local()
+_lock = threading.Lock()
+_open_conns = []        # все открытые соединения (для close_all)
+_generation = 0         # растёт в close_all: соединения потоков из прошлых поколений уже закрыты
+_initialized = set()    # пути, для которых SCHEMA уже применена в этом процессе
+_storage = {}           # путь -> раскладка из meta (общая для потоков)
+
+def get_conn() -> sqlite3.Connection:
+    """
+    Постоянное соединение текущего потока с DB_PATH (открывается при первом обращении).
+    Закрывать его не нужно; транзакции — через `with conn:` или commit()/rollback().
+    Соединение используется только своим потоком; check_same_thread=False — чтобы close_all мог закрыть
+    его из другого потока, когда работа пулов уже закончена.
+    """
+    path = str(DB_PATH)
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.path == path and _local.generation == _generation:
+        return conn
+    if conn is not None:
+        _close(conn)
+    conn = sqlite3.connect(path, cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False)
+    count("db.connections")
+    for pragma in CONN_PRAGMAS:
+        conn.execute(pragma)
+    _local.conn, _local.path, _local.generation = conn, path, _generation
+    with _lock:
+        _open_conns.append(conn)
     return conn
 
-def init_db():
+def _close(conn):
+    with _lock:
+        if conn in _open_conns:
+            _open_conns.remove(conn)
+    conn.close()
+
+def close_conn():
+    """Закрыть соединение текущего потока (следующий get_conn() откроет новое)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        _local.conn = None
+        _close(conn)
+
+def close_all():
+    """
+    Закрыть соединения всех потоков — при выходе из приложения, когда фоновые задачи уже завершены.
+    Поток, обратившийся к базе после этого, откроет новое соединение.
+    """
+    global _generation
+    with _lock:
+        conns, _open_conns[:] = list(_open_conns), []
+        _initialized.clear()
+        _storage.clear()
+        _generation += 1
+    for conn in conns:
+        conn.close()
+    _local.conn = None
+
+@timed("db.init_db")
+def init_db(seed: bool = True):
+    """seed=False — пустую базу не заполнять демо-сотрудниками (ростер придёт извне, см. batch.py)."""
+    path = str(DB_PATH)
+    if path in _initialized:
+        return
     conn = get_conn()
-    try:
+    with conn:
         conn.executescript(SCHEMA)
         # если нет сотрудников — посеять демо
         cur = conn.execute("SELECT COUNT(*) FROM employees")
-        if cur.fetchone()[0] == 0:
+        if seed and cur.fetchone()[0] == 0:
             conn.executemany(
                 "INSERT INTO employees(name,part_time,can_duty,can_support) VALUES (?,?,?,?)",
                 SEED_EMPLOYEES
             )
-        conn.commit()
-    finally:
-        conn.close()
+        if conn.execute("SELECT 1 FROM meta WHERE key='storage'").fetchone() is None:
+            conn.execute("INSERT INTO meta(key,value) VALUES ('storage',?)", (_detect_storage(conn),))
+    storage()       # база не в той раскладке, что ждёт SCHEDULER_STORAGE, — отказ сразу
+    _initialized.add(path)
+
+def _detect_storage(conn) -> str:
+    """Раскладка базы без записи в meta: упакованная старым `db.py pack`, новая (по SCHEDULER_STORAGE) или rows."""
+    has_rows = conn.execute("SELECT EXISTS(SELECT 1 FROM schedule)").fetchone()[0]
+    has_packed = conn.execute("SELECT EXISTS(SELECT 1 FROM schedule_packed)").fetchone()[0]
+    if has_packed and not has_rows:
+        return "packed"
+    if not has_packed and not has_rows and STORAGE in STORAGE_LAYOUTS:
+        return STORAGE
+    return "rows"
+
+def _set_storage(conn, layout: str):
+    conn.execute("INSERT INTO meta(key,value) VALUES ('storage',?) "
+                 "ON CONFLICT(key) DO UPDATE SET value=excluded.value", (layout,))
 
+def storage() -> str:
+    """
+    Раскладка графика в DB_PATH ("rows" | "packed") — по ней идут чтение и запись месяцев.
+    RuntimeError, если SCHEDULER_STORAGE задан и с базой не совпадает (перевести: python db.py pack).
+    """
+    path = str(DB_PATH)
+    layout = _storage.get(path)
+    if layout is None:
+        row = get_conn().execute("SELECT value FROM meta WHERE key='storage'").fetchone()
+        layout = row[0] if row else "rows"
+        if STORAGE is not None and STORAGE != layout:
+            hint = "перевести базу: python db.py pack" if layout == "rows" else "уберите SCHEDULER_STORAGE"
+            raise RuntimeError(f"SCHEDULER_STORAGE={STORAGE}, а база {path} хранит график как {layout!r}; {hint}")
+        with _lock:
+            _storage[path] = layout
+    return layout
+
+@timed("db.load_employees")
 def load_employees() -> List[Dict[str, Any]]:
     conn = get_conn()
-    try:
-        cur = conn.execute("SELECT id, name, part_time, can_duty, can_support FROM employees ORDER BY id")
-        rows = cur.fetchall()
-        return [
-            {
-                "id": r[0], "name": r[1],
-                "part_time": bool(r[2]),
-                "can_duty": bool(r[3]),
-                "can_support": bool(r[4]),
-            } for r in rows
-        ]
-    finally:
-        conn.close()
+    cur = conn.execute("SELECT id, name, part_time, can_duty, can_support FROM employees ORDER BY id")
+    rows = cur.fetchall()
+    return [
+        {
+            "id": r[0], "name": r[1],
+            "part_time": bool(r[2]),
+            "can_duty": bool(r[3]),
+            "can_support": bool(r[4]),
+        } for r in rows
+    ]
+
+# строки, где ничего не поменялось, не переписываются (и не сбрасывают кэш графиков)
+UPSERT_EMPLOYEE = (
+    "INSERT INTO employees(name,part_time,can_duty,can_support) VALUES (?,?,?,?) "
+    "ON CONFLICT(name) DO UPDATE SET part_time=excluded.part_time, can_duty=excluded.can_duty, can_support=excluded.can_support "
+    "WHERE (part_time, can_duty, can_support) IS NOT (excluded.part_time, excluded.can_duty, excluded.can_support)"
+)
 
+@timed("db.upsert_employee")
 def upsert_employee(name: str, part_time: bool=False, can_duty: bool=True, can_support: bool=True):
-    conn = get_conn()
-    try:
+    with get_conn() as conn:
+        before = conn.total_changes
         conn.execute(
-            "INSERT INTO employees(name,part_time,can_duty,can_support) VALUES (?,?,?,?) "
-            "ON CONFLICT(name) DO UPDATE SET part_time=excluded.part_time, can_duty=excluded.can_duty, can_support=excluded.can_support",
+            UPSERT_EMPLOYEE,
             (name, int(part_time), int(can_duty), int(can_support))
         )
-        conn.commit()
-    finally:
-        conn.close()
+        if conn.total_changes != before:
+            _roster_changed(conn)
 
+@timed("db.upsert_employees")
+def upsert_employees(employees: List[Dict[str, Any]]):
+    """Ростер целиком одной транзакцией (формат load_employees, id не нужен)."""
+    with get_conn() as conn:
+        before = conn.total_changes
+        conn.executemany(
+            UPSERT_EMPLOYEE,
+            [(e["name"], int(e.get("part_time", False)), int(e.get("can_duty", True)), int(e.get("can_support", True)))
+             for e in employees]
+        )
+        if conn.total_changes != before:
+            _roster_changed(conn)
+
+@timed("db.remove_employee")
 def remove_employee(name: str):
-    conn = get_conn()
-    try:
+    with get_conn() as conn:
         emp_id = conn.execute("SELECT id FROM employees WHERE name=?", (name,)).fetchone()
         if emp_id:
             conn.execute("DELETE FROM employees WHERE id=?", (emp_id[0],))
-            conn.commit()
-    finally:
-        conn.close()
+            _roster_changed(conn)
+
+def _roster_changed(conn):
+    """Состав сменился — сгенерированные по старому составу графики больше не нужны (в той же транзакции)."""
+    global roster_version
+    conn.execute("DELETE FROM schedule_cache")
+    roster_version += 1
+
+UPSERT_CELL = (
+    "INSERT INTO schedule(emp_id,y,m,d,shift,duty) VALUES (?,?,?,?,?,?) "
+    "ON CONFLICT(emp_id,y,m,d) DO UPDATE SET shift=excluded.shift, duty=excluded.duty"
+)
 
-def save_month_schedule(y: int, m: int, schedule: Dict[str, Dict[int, Dict[str, any]]]):
-    """schedule[emp_name][day] = {'shift': '1'|'2'|'В'|'ОТП'|'БОЛ'|'КМД'|'ОБЕС'|'' , 'duty': bool}"""
+@timed("db.save_month_schedule")
+def save_month_schedule(y: int, m: int, schedule, diff: bool = False):
+    """
+    schedule — ScheduleMatrix или schedule[emp_name][day] = {'shift': '1'|'2'|'В'|'ОТП'|'БОЛ'|'КМД'|'ОБЕС'|'' , 'duty': bool}
+    diff=True — читает сохранённый месяц один раз и пишет только изменившиеся ячейки
+    одним executemany в одной транзакции; возвращает {"inserted", "updated", "unchanged"}.
+    """
+    if not isinstance(schedule, ScheduleMatrix):
+        schedule = ScheduleMatrix.from_mapping(list(schedule), y, m, schedule)
+    if storage() == "packed":
+        stats = save_month_packed(y, m, schedule)
+        return stats if diff else None
+    if diff:
+        return _save_month_diff(y, m, schedule)
+    with get_conn() as conn:
+        _drop_journal(conn, y, m)
+        # соответствие имя -> id
+        map_ids = {nm: rid for rid, nm in conn.execute("SELECT id, name FROM employees")}
+        for row, emp_name in enumerate(schedule.names):
+            emp_id = map_ids.get(emp_name)
+            if not emp_id:
+                continue
+            for d, shift, duty in schedule.iter_row(row):
+                conn.execute(UPSERT_CELL, (emp_id, y, m, d, shift or None, int(duty)))
+                count("db.rows_written")
+
+@timed("db.save_month_diff")
+def _save_month_diff(y: int, m: int, schedule: ScheduleMatrix) -> Dict[str, int]:
     conn = get_conn()
+    # IMMEDIATE: сохранённое состояние не изменится между чтением и записью
+    conn.execute("BEGIN IMMEDIATE")
     try:
-        # соответствие имя -> id
-        map_ids = {r["name"]: r["id"] for r in load_employees()}
-        for emp_name, days in schedule.items():
+        map_ids = {nm: rid for rid, nm in conn.execute("SELECT id, name FROM employees")}
+        stored = {
+            (emp_id, d): (shift, duty)
+            for emp_id, d, shift, duty in conn.execute(
+                "SELECT emp_id, d, shift, duty FROM schedule WHERE y=? AND m=?", (y, m))
+        }
+        changed = []
+        stats = {"inserted": 0, "updated": 0, "unchanged": 0}
+        for row, emp_name in enumerate(schedule.names):
             emp_id = map_ids.get(emp_name)
             if not emp_id:
                 continue
-            for d, payload in days.items():
-                shift = payload.get("shift") or None
-                duty = 1 if payload.get("duty") else 0
-                conn.execute(
-                    "INSERT INTO schedule(emp_id,y,m,d,shift,duty) VALUES (?,?,?,?,?,?) "
-                    "ON CONFLICT(emp_id,y,m,d) DO UPDATE SET shift=excluded.shift, duty=excluded.duty",
-                    (emp_id, y, m, d, shift, duty)
-                )
+            for d, shift, duty in schedule.iter_row(row):
+                new = (shift or None, int(duty))
+                old = stored.get((emp_id, d))
+                if old is None:
+                    # пустую ячейку без строки в базе не пишем: при загрузке это и так пусто
+                    if new == (None, 0):
+                        stats["unchanged"] += 1
+                        continue
+                    stats["inserted"] += 1
+                elif (old[0] or None, int(old[1] or 0)) != new:
+                    stats["updated"] += 1
+                else:
+                    stats["unchanged"] += 1
+                    continue
+                changed.append((emp_id, y, m, d) + new)
+        conn.executemany(UPSERT_CELL, changed)
+        count("db.rows_written", len(changed))
+        _drop_journal(conn, y, m)
         conn.commit()
-    finally:
-        conn.close()
+    except Exception:
+        conn.rollback()
+        raise
+    return stats
 
-def load_month_schedule(y: int, m: int) -> Dict[str, Dict[int, Dict[str, any]]]:
+@timed("db.save_months")
+def save_months(months):
+    """
+    Несколько месяцев одной транзакцией — для пакетной записи (batch.py): months — [(y, m, ScheduleMatrix, state)].
+    Месяц пишется целиком (в schedule или schedule_packed по storage()), state (если не None) — в emp_summary.
+    """
+    packed = storage() == "packed"
     conn = get_conn()
+    conn.execute("BEGIN IMMEDIATE")
     try:
-        id2name = {rid: nm for rid, nm in conn.execute("SELECT id, name FROM employees")}
-        cur = conn.execute("SELECT emp_id, d, shift, duty FROM schedule WHERE y=? AND m=?", (y, m))
-        result = {}
-        for emp_id, d, shift, duty in cur.fetchall():
-            name = id2name.get(emp_id, f"emp#{emp_id}")
-            result.setdefault(name, {})[d] = {"shift": shift or "", "duty": bool(duty)}
-        return result
+        map_ids = {nm: rid for rid, nm in conn.execute("SELECT id, name FROM employees")}
+        for y, m, schedule, state in months:
+            ids = [(r, map_ids[name]) for r, name in enumerate(schedule.names) if name in map_ids]
+            if packed:
+                rows = [(emp_id, y, m, schedule.row_bytes(r)) for r, emp_id in ids]
+                conn.executemany(UPSERT_PACKED, rows)
+            else:
+                rows = [(emp_id, y, m, d, shift or None, int(duty))
+                        for r, emp_id in ids for d, shift, duty in schedule.iter_row(r)]
+                conn.executemany(UPSERT_CELL, rows)
+            count("db.rows_written", len(rows))
+            _drop_journal(conn, y, m)
+            if state is not None:
+                conn.executemany(UPSERT_SUMMARY, _summary_rows(map_ids, y, m, state))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+@timed("db.load_month_schedule")
+def load_month_schedule(y: int, m: int, names: Optional[List[str]] = None) -> ScheduleMatrix:
+    """
+    names=None — строки только для сотрудников, у которых есть записи за месяц (в порядке id).
+    names задан — строки ровно в этом порядке, незаполненные дни пустые (см. ScheduleMatrix.is_empty).
+    """
+    if storage() == "packed":
+        return load_month_packed(y, m, names)
+    conn = get_conn()
+    id2name = {rid: nm for rid, nm in conn.execute("SELECT id, name FROM employees")}
+    # сохранённое и несвёрнутые правки журнала одним запросом (один снимок); правки — после, по порядку
+    rows = conn.execute(
+        "SELECT emp_id, d, shift, duty, 0 AS seq FROM schedule WHERE y=? AND m=? "
+        "UNION ALL SELECT emp_id, d, new_shift, new_duty, seq FROM edit_journal WHERE y=? AND m=? "
+        "ORDER BY seq, emp_id", (y, m, y, m)).fetchall()
+    if names is None:
+        names = list(dict.fromkeys(id2name.get(emp_id, f"emp#{emp_id}") for emp_id, *_ in rows))
+    count("db.rows_read", len(rows))
+    result = ScheduleMatrix(names, y, m)
+    for emp_id, d, shift, duty, _seq in rows:
+        name = id2name.get(emp_id, f"emp#{emp_id}")
+        if name in result:
+            result.set_cell(result.index(name), d, shift or "", bool(duty))
+    return result
+
+# -------- закрепления
+@timed("db.load_pins")
+def load_pins(y: int, m: int, names: List[str]) -> set:
+    """Закреплённые ячейки месяца как {(row, day)}, row — позиция в names."""
+    conn = get_conn()
+    pos = {n: i for i, n in enumerate(names)}
+    row_of = {rid: pos[nm] for rid, nm in conn.execute("SELECT id, name FROM employees") if nm in pos}
+    rows = conn.execute("SELECT emp_id, d FROM pins WHERE y=? AND m=?", (y, m)).fetchall()
+    count("db.rows_read", len(rows))
+    return {(row_of[emp_id], d) for emp_id, d in rows if emp_id in row_of}
+
+@timed("db.save_pins")
+def save_pins(y: int, m: int, names: List[str], pins):
+    """Заменяет закрепления месяца на pins ({(row, day)}) одной транзакцией."""
+    with get_conn() as conn:
+        map_ids = {nm: rid for rid, nm in conn.execute("SELECT id, name FROM employees")}
+        conn.execute("DELETE FROM pins WHERE y=? AND m=?", (y, m))
+        rows = [(map_ids[names[r]], y, m, d) for r, d in pins if names[r] in map_ids]
+        conn.executemany("INSERT INTO pins(emp_id,y,m,d) VALUES (?,?,?,?)", rows)
+        count("db.rows_written", len(rows))
+
+# -------- итоги по сотрудникам (перенос состояния между месяцами)
+@timed("db.load_summary")
+def load_summary(y: int, m: int) -> Dict[str, Dict[str, Any]]:
+    """Итоги на конец месяца (y, m) в формате logic.update_state; кого нет — начинают с нуля."""
+    conn = get_conn()
+    rows = conn.execute(
+        "SELECT e.name, s.shift2, s.duty, s.support, s.last_shift, s.last_duty "
+        "FROM emp_summary s JOIN employees e ON e.id = s.emp_id WHERE s.y=? AND s.m=?", (y, m)).fetchall()
+    count("db.rows_read", len(rows))
+    return {
+        name: {"shift2": s2, "duty": duty, "support": sup, "last_shift": last, "last_duty": bool(last_duty)}
+        for name, s2, duty, sup, last, last_duty in rows
+    }
+
+@timed("db.save_summary")
+def save_summary(y: int, m: int, state: Dict[str, Dict[str, Any]]):
+    """
+    Итоги на конец месяца (y, m). Итоги следующих месяцев не пересчитываются — они обновятся,
+    когда эти месяцы сгенерируют или сохранят заново.
+    """
+    with get_conn() as conn:
+        map_ids = {nm: rid for rid, nm in conn.execute("SELECT id, name FROM employees")}
+        rows = _summary_rows(map_ids, y, m, state)
+        conn.executemany(UPSERT_SUMMARY, rows)
+        count("db.rows_written", len(rows))
+
+UPSERT_SUMMARY = (
+    "INSERT INTO emp_summary(emp_id,y,m,shift2,duty,support,last_shift,last_duty) VALUES (?,?,?,?,?,?,?,?) "
+    "ON CONFLICT(emp_id,y,m) DO UPDATE SET shift2=excluded.shift2, duty=excluded.duty, support=excluded.support, "
+    "last_shift=excluded.last_shift, last_duty=excluded.last_duty"
+)
+
+def _summary_rows(map_ids, y, m, state):
+    return [(map_ids[name], y, m, st["shift2"], st["duty"], st["support"], st["last_shift"], int(st["last_duty"]))
+            for name, st in state.items() if name in map_ids]
+
+# -------- отсутствия и события (ОТП/БОЛ/КМД, ОБЕС)
+def _dt_bounds(start, end) -> Tuple[str, str]:
+    """[первое число start, первое число месяца после end) строками YYYY-MM-DD."""
+    after = add_months(*end, 1)
+    return f"{start[0]:04d}-{start[1]:02d}-01", f"{after[0]:04d}-{after[1]:02d}-01"
+
+@timed("db.load_absences_range")
+def load_absences_range(start, end, names: Optional[List[str]] = None) -> Dict[Tuple[int, int], ScheduleMatrix]:
+    """
+    Отсутствия за месяцы start..end ((y, m) включительно) одним запросом по индексу dt:
+    {(y, m): ScheduleMatrix}, строка сотрудника — маска дней (код ОТП/БОЛ/КМД или пусто).
+    names=None — все сотрудники в порядке id. Это готовый absences для logic.generate_schedule.
+    """
+    conn = get_conn()
+    id2name = {rid: nm for rid, nm in conn.execute("SELECT id, name FROM employees ORDER BY id")}
+    if names is None:
+        names = list(id2name.values())
+    result = {(y, m): ScheduleMatrix(names, y, m) for y, m in iter_months(start, end)}
+    lo, hi = _dt_bounds(start, end)
+    rows = conn.execute("SELECT emp_id, dt, type FROM absences WHERE dt >= ? AND dt < ?", (lo, hi)).fetchall()
+    count("db.rows_read", len(rows))
+    pos = {n: i for i, n in enumerate(names)}
+    row_of = {rid: pos[nm] for rid, nm in id2name.items() if nm in pos}
+    for emp_id, dt, kind in rows:
+        if kind not in ABSENCE_CODES:
+            raise ValueError(f"Неизвестный тип отсутствия: {kind!r}")
+        row = row_of.get(emp_id)
+        if row is not None:
+            result[(int(dt[:4]), int(dt[5:7]))].set_cell(row, int(dt[8:10]), kind)
+    return result
+
+def load_absences(y: int, m: int, names: Optional[List[str]] = None) -> ScheduleMatrix:
+    return load_absences_range((y, m), (y, m), names)[(y, m)]
+
+@timed("db.load_fixed_events_range")
+def load_fixed_events_range(start, end) -> Dict[Tuple[int, int], Dict[int, List[Dict[str, Any]]]]:
+    """
+    События за месяцы start..end одним запросом по индексу dt:
+    {(y, m): {day: [{"shift": 1|2|None, "type": str, "required_count": int}, ...]}}.
+    """
+    conn = get_conn()
+    result = {key: {} for key in iter_months(start, end)}
+    lo, hi = _dt_bounds(start, end)
+    rows = conn.execute(
+        "SELECT dt, shift, type, required_count FROM fixed_events WHERE dt >= ? AND dt < ? ORDER BY dt, id",
+        (lo, hi)).fetchall()
+    count("db.rows_read", len(rows))
+    for dt, shift, kind, required in rows:
+        days = result[(int(dt[:4]), int(dt[5:7]))]
+        days.setdefault(int(dt[8:10]), []).append({"shift": shift, "type": kind, "required_count": required})
+    return result
+
+def load_fixed_events(y: int, m: int) -> Dict[int, List[Dict[str, Any]]]:
+    return load_fixed_events_range((y, m), (y, m))[(y, m)]
+
+@timed("db.set_absence")
+def set_absence(name: str, start: date, end: date, kind: Optional[str]):
+    """Отсутствие kind на дни start..end включительно (прежние записи за эти дни заменяются); kind=None — снять."""
+    if kind is not None and kind not in ABSENCE_CODES:
+        raise ValueError(f"Неизвестный тип отсутствия: {kind!r}")
+    with get_conn() as conn:
+        emp_id = conn.execute("SELECT id FROM employees WHERE name=?", (name,)).fetchone()
+        if not emp_id:
+            return
+        conn.execute("DELETE FROM absences WHERE emp_id=? AND dt BETWEEN ? AND ?",
+                     (emp_id[0], start.isoformat(), end.isoformat()))
+        if kind is not None:
+            days = ((start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1))
+            conn.executemany("INSERT INTO absences(emp_id,dt,type) VALUES (?,?,?)",
+                             ((emp_id[0], dt, kind) for dt in days))
+
+@timed("db.add_fixed_event")
+def add_fixed_event(dt: date, kind: str = "ОБЕС", shift: Optional[int] = None, required_count: int = 1):
+    with get_conn() as conn:
+        conn.execute("INSERT INTO fixed_events(dt,shift,type,required_count) VALUES (?,?,?,?)",
+                     (dt.isoformat(), shift, kind, required_count))
+
+# -------- кэш сгенерированных графиков (schedule_cache, см. cache.py)
+@timed("db.cache_get")
+def cache_get(key: str) -> Optional[bytes]:
+    with get_conn() as conn:
+        row = conn.execute("SELECT data FROM schedule_cache WHERE key=?", (key,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE schedule_cache SET used=? WHERE key=?", (time.time(), key))
+    return row[0]
+
+@timed("db.cache_put")
+def cache_put(items):
+    """items — [(key, bytes)] одной транзакцией; затем вытеснение давних, пока данных больше CACHE_BYTES."""
+    now = time.time()
+    with get_conn() as conn:
+        conn.executemany("INSERT OR REPLACE INTO schedule_cache(key,data,used) VALUES (?,?,?)",
+                         [(key, data, now) for key, data in items])
+        evicted = conn.execute(
+            "DELETE FROM schedule_cache WHERE key IN (SELECT key FROM (SELECT key, "
+            "SUM(length(data)) OVER (ORDER BY used DESC, key) AS total FROM schedule_cache) WHERE total > ?)",
+            (CACHE_BYTES,)).rowcount
+    count("db.cache_evicted", evicted)
+
+def cache_clear():
+    with get_conn() as conn:
+        conn.execute("DELETE FROM schedule_cache")
+
+# -------- журнал правок (edit_journal)
+@timed("db.append_journal")
+def append_journal(y: int, m: int, names: List[str], edits):
+    """
+    Дописать правки месяца одной транзакцией: edits — [(row, day, old_shift, old_duty, new_shift, new_duty)],
+    row — позиция в names. Пишется только журнал, месяц целиком не переписывается.
+    """
+    with get_conn() as conn:
+        map_ids = {nm: rid for rid, nm in conn.execute("SELECT id, name FROM employees")}
+        rows = [(map_ids[names[r]], y, m, d, old_shift or None, int(old_duty), new_shift or None, int(new_duty))
+                for r, d, old_shift, old_duty, new_shift, new_duty in edits if names[r] in map_ids]
+        conn.executemany(
+            "INSERT INTO edit_journal(emp_id,y,m,d,old_shift,old_duty,new_shift,new_duty) VALUES (?,?,?,?,?,?,?,?)", rows)
+        count("db.journal_appended", len(rows))
+
+def _journal_cells(conn, y: int, m: int) -> Dict[Tuple[int, int], Tuple[Optional[str], int]]:
+    """Несвёрнутые правки месяца: {(emp_id, d): (shift, duty)} — последнее значение каждой ячейки."""
+    rows = conn.execute("SELECT emp_id, d, new_shift, new_duty FROM edit_journal WHERE y=? AND m=? ORDER BY seq",
+                        (y, m)).fetchall()
+    count("db.rows_read", len(rows))
+    return {(emp_id, d): (shift, duty) for emp_id, d, shift, duty in rows}
+
+def _drop_journal(conn, y: int, m: int):
+    """Месяц записан целиком (в нём уже все правки) — его записи журнала больше не нужны."""
+    conn.execute("DELETE FROM edit_journal WHERE y=? AND m=?", (y, m))
+
+@contextmanager
+def _read_snapshot(conn):
+    """Несколько SELECT — как один снимок базы (в WAL чтение писателя не блокирует)."""
+    if conn.in_transaction:
+        yield
+        return
+    conn.execute("BEGIN")
+    try:
+        yield
     finally:
-        conn.close()
+        conn.commit()
+
+@timed("db.compact_journal")
+def compact_journal() -> int:
+    """
+    Свернуть журнал: последнее значение каждой правленой ячейки — в schedule (или schedule_packed по storage()),
+    свёрнутые записи — удалить. Одна транзакция; правки, дописанные параллельно, ждут следующего раза.
+    Возвращает число записанных ячеек.
+    """
+    layout = storage()
+    conn = get_conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        last = {}
+        top = 0
+        for seq, emp_id, y, m, d, shift, duty in conn.execute(
+                "SELECT seq, emp_id, y, m, d, new_shift, new_duty FROM edit_journal ORDER BY seq"):
+            last[(emp_id, y, m, d)] = (shift, duty)
+            top = seq
+        if layout == "packed":
+            packed = {}
+            for (emp_id, y, m, d), (shift, duty) in last.items():
+                key = (emp_id, y, m)
+                cells = packed.get(key)
+                if cells is None:
+                    old = conn.execute("SELECT cells FROM schedule_packed WHERE emp_id=? AND y=? AND m=?", key).fetchone()
+                    cells = packed[key] = bytearray(old[0]) if old else bytearray(calendar.monthrange(y, m)[1])
+                cells[d-1] = SHIFT_INDEX[shift or ""] | (DUTY_BIT if duty else 0)
+            conn.executemany(UPSERT_PACKED, [key + (bytes(cells),) for key, cells in packed.items()])
+            count("db.rows_written", len(packed))
+        else:
+            conn.executemany(UPSERT_CELL, [key + value for key, value in last.items()])
+            count("db.rows_written", len(last))
+        conn.execute("DELETE FROM edit_journal WHERE seq <= ?", (top,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(last)
+
+# -------- упакованное хранение (schedule_packed)
+UPSERT_PACKED = (
+    "INSERT INTO schedule_packed(emp_id,y,m,cells) VALUES (?,?,?,?) "
+    "ON CONFLICT(emp_id,y,m) DO UPDATE SET cells=excluded.cells"
+)
+
+@timed("db.save_month_packed")
+def save_month_packed(y: int, m: int, schedule) -> Dict[str, int]:
+    """
+    Месяц в schedule_packed: одна строка на сотрудника, переписываются только изменившиеся.
+    Возвращает {"inserted", "updated", "unchanged"} по ячейкам — как save_month_schedule(diff=True).
+    """
+    if not isinstance(schedule, ScheduleMatrix):
+        schedule = ScheduleMatrix.from_mapping(list(schedule), y, m, schedule)
+    conn = get_conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        map_ids = {nm: rid for rid, nm in conn.execute("SELECT id, name FROM employees")}
+        stored = dict(conn.execute("SELECT emp_id, cells FROM schedule_packed WHERE y=? AND m=?", (y, m)))
+        changed = []
+        stats = {"inserted": 0, "updated": 0, "unchanged": 0}
+        for row, emp_name in enumerate(schedule.names):
+            emp_id = map_ids.get(emp_name)
+            if not emp_id:
+                continue
+            new = schedule.row_bytes(row)
+            old = stored.get(emp_id)
+            if old is None:
+                filled = len(new) - new.count(0)
+                if not filled:
+                    stats["unchanged"] += len(new)
+                    continue
+                stats["inserted"] += filled
+                stats["unchanged"] += len(new) - filled
+            elif old == new:
+                stats["unchanged"] += len(new)
+                continue
+            else:
+                diff = sum(1 for a, b in zip(old, new) if a != b)
+                stats["updated"] += diff
+                stats["unchanged"] += len(new) - diff
+            changed.append((emp_id, y, m, new))
+        conn.executemany(UPSERT_PACKED, changed)
+        count("db.rows_written", len(changed))
+        _drop_journal(conn, y, m)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return stats
+
+@timed("db.load_month_packed")
+def load_month_packed(y: int, m: int, names: Optional[List[str]] = None) -> ScheduleMatrix:
+    """То же, что load_month_schedule, но одна строка на сотрудника из schedule_packed."""
+    conn = get_conn()
+    id2name = {rid: nm for rid, nm in conn.execute("SELECT id, name FROM employees")}
+    with _read_snapshot(conn):
+        stored = {
+            id2name.get(emp_id, f"emp#{emp_id}"): cells
+            for emp_id, cells in conn.execute(
+                "SELECT emp_id, cells FROM schedule_packed WHERE y=? AND m=? ORDER BY emp_id", (y, m))
+        }
+        journal = _journal_cells(conn, y, m)
+    count("db.rows_read", len(stored))
+    if names is None:
+        names = list(dict.fromkeys(list(stored) + [id2name.get(emp_id, f"emp#{emp_id}") for emp_id, _d in journal]))
+    nd = calendar.monthrange(y, m)[1]
+    rows = [bytearray(stored[n]) if n in stored else bytearray(nd) for n in names]
+    result = ScheduleMatrix(names, y, m, rows)
+    for (emp_id, d), (shift, duty) in journal.items():
+        name = id2name.get(emp_id, f"emp#{emp_id}")
+        if name in result:
+            result.set_cell(result.index(name), d, shift or "", bool(duty))
+    return result
+
+@timed("db.migrate_to_packed")
+def migrate_to_packed(drop_rows: bool = True) -> int:
+    """
+    Переносит всё из schedule в schedule_packed одной транзакцией (поверх уже упакованных месяцев)
+    и записывает в базу раскладку "packed". drop_rows=True — очищает schedule и делает VACUUM.
+    Возвращает число упакованных строк.
+    """
+    conn = get_conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        packed = {}
+        for emp_id, y, m, d, shift, duty in conn.execute("SELECT emp_id, y, m, d, shift, duty FROM schedule"):
+            key = (emp_id, y, m)
+            cells = packed.get(key)
+            if cells is None:
+                old = conn.execute("SELECT cells FROM schedule_packed WHERE emp_id=? AND y=? AND m=?", key).fetchone()
+                cells = packed[key] = bytearray(old[0]) if old else bytearray(calendar.monthrange(y, m)[1])
+            code = SHIFT_INDEX.get(shift or "")
+            if code is None:
+                raise ValueError(f"Неизвестный код смены в schedule: {shift!r}")
+            cells[d-1] = code | (DUTY_BIT if duty else 0)
+        conn.executemany(UPSERT_PACKED, [key + (bytes(cells),) for key, cells in packed.items()])
+        if drop_rows:
+            conn.execute("DELETE FROM schedule")
+        _set_storage(conn, "packed")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    with _lock:
+        _storage[str(DB_PATH)] = "packed"
+    if drop_rows:
+        conn.execute("VACUUM")
+    return len(packed)
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["pack"]:
+        if STORAGE not in (None, "packed"):
+            sys.exit(f"SCHEDULER_STORAGE={STORAGE}: pack переводит базу только в packed")
+        STORAGE = None      # раскладку базы и меняем — сверять её с целью незачем
+        init_db()
+        print(f"Упаковано строк: {migrate_to_packed()}. Раскладка записана в базе.")
+    elif sys.argv[1:] == ["compact"]:
+        init_db()
+        print(f"Из журнала правок перенесено ячеек: {compact_journal()}.")
+    else:
+        print("Использование: python db.py pack | compact")
@@ -0,0 +1,154 @@
+# duty_flow.py — дежурства на весь месяц сразу (задача о назначениях), когда смены уже расставлены.
+# Строки — слоты (день, смена), столбцы — копии сотрудников: k-я копия стоит 2(c+k)−1, так что по
+# человеку набегает квадрат числа дежурств и минимум — у самого ровного распределения.
+# Дежурства подряд — штраф на пару дней; 1-я после дежурства во 2-ю, как и в logic.py, запрещена: она
+# дороже любой ровности и достаётся слоту, только если его больше некому закрыть. Поэтому дни делятся
+# на чётные и нечётные: сначала решаются одни (соседей среди них нет), потом другие — уже с известными
+# соседями, и так по очереди, пока стоимость падает: каждый проход точен при зафиксированном другом.
+# Без внешних решателей.
+import math
+
+import numpy as np
+
+from matrix import ScheduleMatrix, SHIFT_INDEX, SHIFT_MASK
+from prof import span, timed
+
+S1, S2 = SHIFT_INDEX["1"], SHIFT_INDEX["2"]
+W_B2B = 10.0        # дежурство в соседний день
+W_AFTER2 = 1e6      # 1-я после дежурства во 2-ю накануне: больше суммы остальных стоимостей прохода
+MAX_ROUNDS = 4      # пар проходов (чётные/нечётные дни) не больше
+_NO_EDGE = 1e9      # сотрудник не в этой смене
+_CLEAR_DUTY = bytes(b & SHIFT_MASK for b in range(256))     # bytes.translate: снять бит дежурства
+
+def _lap(cost):
+    """
+    Назначение строк столбцам минимальной суммарной стоимости (строк не больше, чем столбцов):
+    для каждой строки — индекс столбца. Венгерский алгоритм с потенциалами (кратчайший
+    увеличивающий путь); проход по столбцам векторизован, поэтому O(строк²) операций NumPy.
+    """
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=np.int64)     # p[j] — строка (с 1), занявшая столбец j; 0 — свободен
+    way = np.zeros(m + 1, dtype=np.int64)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            cur = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (cur < minv[1:])
+            minv[1:][better] = cur[better]
+            way[1:][better] = j0
+            masked = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(masked)) + 1
+            delta = masked[j1 - 1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[~used] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    taken = np.flatnonzero(p[1:])
+    result = np.empty(n, dtype=np.int64)
+    result[p[1:][taken] - 1] = taken
+    return result
+
+def _total_cost(duty, counts, last) -> float:
+    """То, что минимизируют проходы: сумма квадратов числа дежурств + штрафы за соседние дни."""
+    duty = np.concatenate([last[:, None], duty], axis=1)
+    on = duty != 0
+    after2 = (duty[:, :-1] == S2) & (duty[:, 1:] == S1)
+    return float((counts ** 2).sum() + W_B2B * (on[:, :-1] & on[:, 1:]).sum() + W_AFTER2 * after2.sum())
+
+def _solve_pass(codes, duty, counts, last, day_idx):
+    """
+    Дежурные для дней day_idx (попарно не соседних) при остальных днях как есть; пишет в duty и counts.
+    last — дежурства последнего дня прошлого месяца (сосед первого дня).
+    """
+    nd = codes.shape[1]
+    day_idx = list(day_idx)
+    counts -= (duty[:, day_idx] != 0).sum(axis=1)
+    duty[:, day_idx] = 0
+    slots = [(j, s) for j in day_idx for s in (S1, S2) if (codes[:, j] == s).any()]
+    if not slots:
+        return
+    sj = np.array([j for j, _s in slots])
+    ss = np.array([s for _j, s in slots])
+    elig = codes[:, sj].T == ss[:, None]                     # [слоты, сотрудники]
+    cand = np.flatnonzero(elig.any(axis=0))
+    elig = elig[:, cand]
+
+    # соседние дни уже решены (во втором проходе) — штрафы линейны по слоту
+    base = np.zeros(elig.shape)
+    prev = np.where(sj > 0, sj - 1, 0)
+    nxt = np.where(sj < nd - 1, sj + 1, 0)
+    prev_duty = np.where((sj > 0)[:, None], duty[cand][:, prev].T, last[cand][None, :])
+    next_duty = duty[cand][:, nxt].T * (sj < nd - 1)[:, None]
+    base += W_B2B * ((prev_duty != 0).astype(float) + (next_duty != 0))
+    base += W_AFTER2 * (((ss == S1)[:, None] & (prev_duty == S2)) | ((ss == S2)[:, None] & (next_duty == S1)))
+    base[~elig] = _NO_EDGE
+
+    # копий на человека хватает с запасом для ровного распределения; если слоту не досталось
+    # никого или пришлось взять запрещённое «1-я после 2-й» — решаем заново со всеми копиями
+    # (столько, сколько у человека подходящих слотов): тогда запрет нарушается, только если иначе нельзя
+    per_emp = elig.sum(axis=0)
+    full = int(per_emp.max())
+    k = min(full, math.ceil(len(slots) / len(cand)) + 2)
+    while True:
+        marginal = 2 * (counts[cand][:, None] + np.arange(k)[None, :]) + 1     # [сотрудники, копии]
+        cost = (base[:, :, None] + marginal[None, :, :]).reshape(len(slots), len(cand) * k)
+        cols = _lap(cost)
+        if k == full or (cost[np.arange(len(slots)), cols] < W_AFTER2).all():
+            break
+        k = full
+    for s, col in enumerate(cols):
+        if cost[s, col] < _NO_EDGE:
+            e = cand[col // k]
+            duty[e, sj[s]] = ss[s]
+            counts[e] += 1
+
+@timed("duty_flow")
+def assign_duties(employees, schedule: ScheduleMatrix, state=None) -> ScheduleMatrix:
+    """
+    Копия schedule (строки — в порядке employees) с теми же сменами и заново расставленными
+    дежурствами: по одному на (день, смена), где работает «регуляр» с can_duty.
+    state (logic.update_state) — дежурства прошлых месяцев считаются в ровности, их последний день — в соседях.
+    """
+    nd = schedule.num_days
+    names = schedule.names
+    result = ScheduleMatrix(names, schedule.year, schedule.month,
+                            [bytearray(schedule.row_bytes(r).translate(_CLEAR_DUTY)) for r in range(len(names))])
+    rows = [r for r, e in enumerate(employees) if not e.get("part_time", False) and e.get("can_duty", True)]
+    if not rows:
+        return result
+    codes = np.frombuffer(b"".join(schedule.row_bytes(r) for r in rows), dtype=np.uint8).reshape(len(rows), nd) & SHIFT_MASK
+    duty = np.zeros((len(rows), nd), dtype=np.uint8)        # код смены дежурства, 0 — нет
+    counts = np.zeros(len(rows), dtype=np.int64)
+    last = np.zeros(len(rows), dtype=np.uint8)
+    for e, r in enumerate(rows):
+        st = (state or {}).get(names[r])
+        if st:
+            counts[e] = st["duty"]
+            if st["last_duty"] and st["last_shift"] in ("1", "2"):
+                last[e] = SHIFT_INDEX[st["last_shift"]]
+    best = None
+    for _round in range(MAX_ROUNDS):
+        for parity in (0, 1):
+            with span("duty_flow.pass"):
+                _solve_pass(codes, duty, counts, last, range(parity, nd, 2))
+        total = _total_cost(duty, counts, last)
+        if best is not None and total >= best - 1e-9:
+            break
+        best = total
+    for e, j in zip(*np.nonzero(duty)):
+        result.set_cell(rows[e], int(j) + 1, duty=True)
+    return result
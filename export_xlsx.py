@@ -0,0 +1,121 @@
+# export_xlsx.py — экспорт графика в Excel без GUI: потоковая запись (write-only) и именованные стили.
+# Запуск: python export_xlsx.py 2026-01 [2026-12] [-o График_2026.xlsx] [--db scheduler.db]
+import argparse
+import sys
+from datetime import date
+from pathlib import Path
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import NamedStyle, PatternFill, Font, Alignment
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.cell_range import CellRange
+
+import db
+import prof
+from logic import iter_months, month_arg
+from matrix import ScheduleMatrix
+
+# имя стиля -> (заливка, белый жирный шрифт); стили регистрируются в книге один раз
+STYLES = {
+    "График: выходной": ("EEEEEE", False),
+    "График: 1": ("DCEBFF", False),
+    "График: 2": ("7FA8F8", True),
+    "График: В": ("F0F0F0", False),
+    "График: Д": ("555555", True),
+}
+SHIFT_STYLE = {"1": "График: 1", "2": "График: 2", "В": "График: В"}
+
+def _add_styles(wb):
+    for name, (color, white) in STYLES.items():
+        style = NamedStyle(name=name, fill=PatternFill("solid", fgColor=color), alignment=Alignment(horizontal="center"))
+        if white:
+            style.font = Font(color="FFFFFF", bold=True)
+        wb.add_named_style(style)
+
+def _cell(ws, value, style):
+    c = WriteOnlyCell(ws, value)
+    c.style = style
+    return c
+
+@prof.timed("export.write_month")
+def write_month(wb, schedule: ScheduleMatrix, title=None):
+    """Лист на месяц: строки пишутся сразу в файл, в памяти держится только текущая."""
+    y, m = schedule.year, schedule.month
+    ws = wb.create_sheet(title or f"{y}-{m:02d}")
+    days = [date(y, m, d) for d in range(1, schedule.num_days + 1)]
+
+    # ширины и объединения задаются до первой строки
+    ws.column_dimensions["A"].width = 24
+    for col in range(2, 2 + len(days)*2):
+        ws.column_dimensions[get_column_letter(col)].width = 6
+    ws.merged_cells.add(CellRange(min_col=1, min_row=1, max_col=1, max_row=2))
+    for i in range(len(days)):
+        ws.merged_cells.add(CellRange(min_col=2 + i*2, min_row=1, max_col=3 + i*2, max_row=1))
+
+    top, sub = ["Сотрудник"], [None]
+    for d in days:
+        style = "График: выходной" if d.weekday() >= 5 else None
+        if style:
+            top += [_cell(ws, d.day, style), _cell(ws, None, style)]
+            sub += [_cell(ws, "Смена", style), _cell(ws, "Деж.", style)]
+        else:
+            top += [d.day, None]
+            sub += ["Смена", "Деж."]
+    ws.append(top)
+    ws.append(sub)
+
+    for row, name in enumerate(schedule.names):
+        out = [name]
+        for _day, sh, dj in schedule.iter_row(row):
+            style = SHIFT_STYLE.get(sh)
+            # пустые ячейки — None: write-only их вовсе не пишет
+            out.append(_cell(ws, sh, style) if style else (sh or None))
+            out.append(_cell(ws, "Д", "График: Д") if dj else None)
+        ws.append(out)
+    return ws
+
+def export_schedules(path, schedules):
+    """schedules — любой итерируемый набор ScheduleMatrix (генератор — чтобы не держать все месяцы)."""
+    wb = Workbook(write_only=True)
+    _add_styles(wb)
+    sheets = 0
+    for schedule in schedules:
+        write_month(wb, schedule)
+        sheets += 1
+    if not sheets:
+        wb.create_sheet("График")   # пустая книга без листов не сохраняется
+    with prof.span("export.save"):
+        wb.save(path)
+    return sheets
+
+def export_range(path, start, end):
+    """Месяцы start..end из базы (по одному в памяти), строки — все сотрудники в порядке id."""
+    names = [e["name"] for e in db.load_employees()]
+    return export_schedules(path, (db.load_month_schedule(y, m, names) for y, m in iter_months(start, end)))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Экспорт графика из базы в Excel (лист на месяц).")
+    parser.add_argument("start", type=month_arg, help="первый месяц, ГГГГ-ММ")
+    parser.add_argument("end", type=month_arg, nargs="?", help="последний месяц, ГГГГ-ММ (по умолчанию = start)")
+    parser.add_argument("-o", "--output", help="файл .xlsx (по умолчанию График_<start>[_<end>].xlsx)")
+    parser.add_argument("--db", help="путь к базе (по умолчанию scheduler.db рядом с db.py)")
+    prof.add_cli_flags(parser)
+    args = parser.parse_args(argv)
+    prof.apply_cli_flags(args)
+
+    end = args.end or args.start
+    if end < args.start:
+        parser.error("последний месяц раньше первого")
+    if args.db:
+        db.DB_PATH = Path(args.db)
+    suffix = f"{args.start[0]}_{args.start[1]:02d}" + ("" if end == args.start else f"_{end[0]}_{end[1]:02d}")
+    output = args.output or f"График_{suffix}.xlsx"
+
+    db.init_db()
+    sheets = export_range(output, args.start, end)
+    print(f"Файл сохранён: {output} (листов: {sheets})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
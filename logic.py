@@ -1,27 +1,28 @@
 # logic.py — генератор графика (минимально жизнеспособный, без внешних библиотек оптимизации)
-from datetime import date, timedelta
+from datetime import date, timedelta, MINYEAR, MAXYEAR
+import argparse
 import calendar
 from collections import Counter
 
+from matrix import ScheduleMatrix, SHIFT_CODES, SHIFT_INDEX, SHIFT_MASK, DUTY_BIT, ABSENCE_CODES
+from prof import span, count, timed
+
 WD_NAMES = ["Пн","Вт","Ср","Чт","Пт","Сб","Вс"]
 
 def month_days(year: int, month: int):
     cal = calendar.Calendar(firstweekday=0)
     return [d for d in cal.itermonthdates(year, month) if d.month == month]
 
-def generate_schedule(employees, year: int, month: int, absences=None, fixed_events=None):
+PAIR_PATTERNS = [(5,6),(6,0),(1,2),(3,4),(0,1),(2,3),(4,5)]
+
+def off_patterns(year: int, month: int):
     """
-    employees: list of dicts: {"name": str, "part_time": bool, "can_duty": bool, "can_support": bool}
-    return: schedule[name][day] = {"shift": '1'|'2'|'В'|..., "duty": bool}
+    Наборы выходных для каждого из PAIR_PATTERNS: сотрудник с порядковым номером i
+    получает off_patterns(...)[i % len(PAIR_PATTERNS)] — от имени набор не зависит.
     """
     days = month_days(year, month)
     num_weekend_days = len([d for d in days if d.weekday()>=5])
 
-    names = [e["name"] for e in employees]
-    part_time = {e["name"]: e.get("part_time", False) for e in employees}
-    can_duty = {e["name"]: e.get("can_duty", True) for e in employees}
-
-    # назначаем выходные: у каждого ровно столько, сколько суббот+воскресений в месяце
     # стараемся давать парами, разносим по неделям
     weeks = []
     d0 = date(year, month, 1)
@@ -32,76 +33,359 @@ def generate_schedule(employees, year: int, month: int, absences=None, fixed_eve
         weeks.append([cur + timedelta(days=i) for i in range(7)])
         cur += timedelta(days=7)
 
-    pair_patterns = [(5,6),(6,0),(1,2),(3,4),(0,1),(2,3),(4,5)]
-    off = {n: set() for n in names}
-    for i, n in enumerate(names):
+    patterns = []
+    for pattern_idx in range(len(PAIR_PATTERNS)):
+        off = set()
         pairs_needed = num_weekend_days // 2
-        pattern_idx = i % len(pair_patterns)
         assigned_pairs = 0
         for w in weeks:
             if assigned_pairs >= pairs_needed: break
-            dow1, dow2 = pair_patterns[(pattern_idx + assigned_pairs) % len(pair_patterns)]
+            dow1, dow2 = PAIR_PATTERNS[(pattern_idx + assigned_pairs) % len(PAIR_PATTERNS)]
             d1, d2 = w[dow1], w[dow2]
             if d1.month == month and d2.month == month:
-                off[n].add(d1); off[n].add(d2)
+                off.add(d1); off.add(d2)
                 assigned_pairs += 1
         # добить недостающее
-        if len(off[n]) < num_weekend_days:
-            need = num_weekend_days - len(off[n])
-            candidates = [d for d in days if d not in off[n]]
+        if len(off) < num_weekend_days:
+            need = num_weekend_days - len(off)
+            candidates = [d for d in days if d not in off]
             candidates.sort(key=lambda d: (d.weekday()>=5, d.day))
-            off[n].update(candidates[:need])
+            off.update(candidates[:need])
         # подрезать излишки
-        if len(off[n]) > num_weekend_days:
-            off[n] = set(sorted(off[n])[:num_weekend_days])
+        if len(off) > num_weekend_days:
+            off = set(sorted(off)[:num_weekend_days])
+        patterns.append(frozenset(off))
+    return patterns
+
+SUPPORT = "ОБЕС"
+_S1, _S2 = SHIFT_INDEX["1"], SHIFT_INDEX["2"]
+_DUTY_BYTES = tuple(code | DUTY_BIT for code in range(len(SHIFT_CODES)))
+
+def absence_days(absences, names):
+    """
+    absences — ScheduleMatrix (db.load_absences) или {name: {day: "ОТП"|"БОЛ"|"КМД"}}.
+    Возвращает {day: {name: код}} только по тем, кто есть в names.
+    """
+    by_day = {}
+    if not absences:
+        return by_day
+    if isinstance(absences, ScheduleMatrix):
+        for name in names:
+            if name not in absences:
+                continue
+            for i, b in enumerate(absences.row_bytes(absences.index(name)), start=1):
+                if b & SHIFT_MASK:
+                    by_day.setdefault(i, {})[name] = SHIFT_CODES[b & SHIFT_MASK]
+    else:
+        wanted = set(names)
+        for name, days in absences.items():
+            if name not in wanted:
+                continue
+            for day, code in days.items():
+                by_day.setdefault(day, {})[name] = code
+    for day in by_day.values():
+        for code in day.values():
+            if code not in ABSENCE_CODES:
+                raise ValueError(f"Неизвестный тип отсутствия: {code!r}")
+    return by_day
+
+def add_months(year: int, month: int, k: int):
+    """(year, month) через k месяцев (k < 0 — назад)."""
+    t = year * 12 + month - 1 + k
+    return t // 12, t % 12 + 1
+
+YEARS = range(MINYEAR + 1, MAXYEAR)     # у месяца есть соседние (итоги прошлого, границы дат следующего)
+
+def parse_month(text):
+    """"ГГГГ-ММ" -> (y, m); ValueError с сообщением для пользователя."""
+    try:
+        y, m = (int(p) for p in text.split("-"))
+        if not 1 <= m <= 12 or y not in YEARS:
+            raise ValueError
+    except (ValueError, AttributeError):
+        raise ValueError(f"ожидается ГГГГ-ММ, получено {text!r}") from None
+    return y, m
+
+def month_arg(text):
+    """parse_month для argparse (type=month_arg)."""
+    try:
+        return parse_month(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def iter_months(start, end):
+    """(y, m) от start до end включительно; end раньше start — ни одного."""
+    ym = tuple(start)
+    while ym <= tuple(end):
+        yield ym
+        ym = add_months(*ym, 1)
+
+def update_state(state, schedule: ScheduleMatrix):
+    """
+    Переносимое между месяцами состояние: {name: {"shift2", "duty", "support", "last_shift", "last_duty"}} —
+    накопленные итоги и последний день. Добавляет к state итоги schedule (на месте) и возвращает state.
+    """
+    sup = SHIFT_INDEX[SUPPORT]
+    for r, name in enumerate(schedule.names):
+        row = schedule.row_bytes(r)
+        st = state.setdefault(name, {"shift2": 0, "duty": 0, "support": 0, "last_shift": None, "last_duty": False})
+        st["shift2"] += row.count(_S2) + row.count(_S2 | DUTY_BIT)
+        st["duty"] += sum(row.count(b) for b in _DUTY_BYTES)
+        st["support"] += row.count(sup)
+        if row:
+            st["last_shift"] = SHIFT_CODES[row[-1] & SHIFT_MASK] or None
+            st["last_duty"] = bool(row[-1] & DUTY_BIT)
+    return state
+
+def support_needed(fixed_events, day: int, shift=None) -> int:
+    """
+    Сколько человек нужно на ОБЕС в день day; fixed_events — {day: [событие]} (db.load_fixed_events).
+    shift=None — события на весь день, 1|2 — события этой смены.
+    """
+    return sum(ev.get("required_count", 1) for ev in (fixed_events or {}).get(day, ())
+               if ev.get("type") == SUPPORT and (int(ev["shift"]) if ev.get("shift") else None) == shift)
+
+@timed("generate")
+def generate_schedule(employees, year: int, month: int, absences=None, fixed_events=None, progress=None,
+                      duty: str = "greedy", state=None):
+    """
+    employees: list of dicts: {"name": str, "part_time": bool, "can_duty": bool, "can_support": bool}
+    absences: см. absence_days — ОТП/БОЛ/КМД: в этот день ни смены, ни дежурства, ни ОБЕС
+    fixed_events: {day: [{"shift", "type", "required_count"}]} (db.load_fixed_events) — на ОБЕС ставятся
+                  required_count человек с can_support, у кого обеспечений меньше всего: при shift=None —
+                  из всех, кто на месте (до распределения по сменам), при shift 1|2 — из людей этой смены
+    duty: "greedy" — дежурные по дням (меньше всего дежурств, не в 1-ю после 2-й);
+          "flow" — после смен на весь месяц сразу, duty_flow.assign_duties
+    state: см. update_state — итоги прошлых месяцев и их последний день: с них начинаются счётчики
+           справедливости и правило «не в 1-ю после 2-й»; после генерации в state добавляется этот месяц
+    progress: необязательный progress(done_days, total_days) после каждого дня;
+              исключение из него прерывает генерацию (так фоновые задачи делают отмену)
+    return: ScheduleMatrix (строки в порядке employees);
+            по-прежнему читается как schedule[name][day] = {"shift": '1'|'2'|'В'|..., "duty": bool}
+    """
+    if duty not in ("greedy", "flow"):
+        raise ValueError(f"Неизвестный режим дежурств: {duty!r}")
+    days = month_days(year, month)
+
+    names = [e["name"] for e in employees]
+    part_time = {e["name"]: e.get("part_time", False) for e in employees}
+    can_duty = {e["name"]: e.get("can_duty", True) for e in employees}
+    can_support = {e["name"]: e.get("can_support", True) for e in employees}
+    away = absence_days(absences, names)
+
+    # назначаем выходные: у каждого ровно столько, сколько суббот+воскресений в месяце
+    with span("generate.weekends"):
+        patterns = off_patterns(year, month)
+        off = {n: set(patterns[i % len(patterns)]) for i, n in enumerate(names)}
+    count("generate.cells", len(names) * len(days))
 
     # результат
-    result = {n: {d.day: {"shift":"", "duty":False} for d in days} for n in names}
-
-    shift2_count = Counter()
-    duty_count = Counter()
-    prev_shift = {n: None for n in names}
-    prev_duty2 = {n: False for n in names}
-
-    for d in days:
-        available = [n for n in names if d not in off[n]]
-        regs = [n for n in available if not part_time.get(n, False)]
-        parts = [n for n in available if part_time.get(n, False)]
-
-        # целим ~45% во 2-ю смену, минимум 2 (если регуляров меньше — сколько есть)
-        target_s2 = min(len(regs), max(2, round(0.45 * len(available)))) if regs else 0
-        regs_sorted = sorted(regs, key=lambda n: (shift2_count[n], 1 if prev_shift[n]=="2" else 0))
-        s2 = regs_sorted[:target_s2]
-        s1 = [n for n in regs if n not in s2] + parts
-
-        # если во 2-й 1 человек — перекинем из первой
-        if len(s2) == 1 and len(s1) > 1:
-            s1_regs = [n for n in s1 if n in regs]
-            if s1_regs:
-                move = sorted(s1_regs, key=lambda n: shift2_count[n])[0]
-                s2.append(move); s1.remove(move)
-
-        # смены
-        for n in s1: result[n][d.day]["shift"] = "1"
-        for n in s2: result[n][d.day]["shift"] = "2"; shift2_count[n]+=1
-        for n in names:
-            if d in off[n]: result[n][d.day]["shift"] = "В"
-
-        # дежурства: по одному на смену среди «регуляров»
-        duty1_candidates = [n for n in s1 if (n in regs) and can_duty.get(n, True) and not prev_duty2[n]]
-        duty1_candidates.sort(key=lambda n: (duty_count[n], 1 if prev_shift[n]=="2" else 0))
-        if duty1_candidates:
-            n1 = duty1_candidates[0]
-            result[n1][d.day]["duty"] = True; duty_count[n1]+=1
-
-        duty2_candidates = [n for n in s2 if (n in regs) and can_duty.get(n, True)]
-        duty2_candidates.sort(key=lambda n: (duty_count[n], 1 if prev_shift[n]=="2" else 0))
-        if duty2_candidates:
-            n2 = duty2_candidates[0]
-            result[n2][d.day]["duty"] = True; duty_count[n2]+=1
-            prev_duty2 = {k: False for k in prev_duty2}
-            prev_duty2[n2] = True
-
-        for n in names: prev_shift[n] = result[n][d.day]["shift"]
+    result = ScheduleMatrix(names, year, month)
+    row = {n: i for i, n in enumerate(names)}
+
+    seed = {n: state[n] for n in names if n in state} if state else {}
+    shift2_count = Counter({n: st["shift2"] for n, st in seed.items()})
+    duty_count = Counter({n: st["duty"] for n, st in seed.items()})
+    support_count = Counter({n: st["support"] for n, st in seed.items()})
+    prev_shift = {n: seed[n]["last_shift"] if n in seed else None for n in names}
+    prev_duty2 = {n: n in seed and seed[n]["last_shift"] == "2" and bool(seed[n]["last_duty"]) for n in names}
+
+    for day_no, d in enumerate(days, start=1):
+        with span("generate.shifts"):
+            away_today = away.get(d.day, {})
+            available = [n for n in names if d not in off[n] and n not in away_today]
+
+            # ОБЕС на весь день — до распределения по сменам: эти люди в смены не попадают
+            support = []
+            need = support_needed(fixed_events, d.day)
+            if need:
+                support = sorted((n for n in available if can_support[n]), key=lambda n: support_count[n])[:need]
+                for n in support: support_count[n] += 1
+                if support:
+                    taken = set(support)
+                    available = [n for n in available if n not in taken]
+            regs = [n for n in available if not part_time.get(n, False)]
+            parts = [n for n in available if part_time.get(n, False)]
+
+            # целим ~45% во 2-ю смену, минимум 2 (если регуляров меньше — сколько есть)
+            target_s2 = min(len(regs), max(2, round(0.45 * len(available)))) if regs else 0
+            regs_sorted = sorted(regs, key=lambda n: (shift2_count[n], 1 if prev_shift[n]=="2" else 0))
+            s2 = regs_sorted[:target_s2]
+            s1 = [n for n in regs if n not in s2] + parts
+
+            # если во 2-й 1 человек — перекинем из первой
+            if len(s2) == 1 and len(s1) > 1:
+                s1_regs = [n for n in s1 if n in regs]
+                if s1_regs:
+                    move = sorted(s1_regs, key=lambda n: shift2_count[n])[0]
+                    s2.append(move); s1.remove(move)
 
+            # ОБЕС на смену — из людей этой смены: смену они не работают
+            for shift_no, pool in ((1, s1), (2, s2)):
+                need = support_needed(fixed_events, d.day, shift_no)
+                if need:
+                    taken = sorted((n for n in pool if can_support[n]), key=lambda n: support_count[n])[:need]
+                    for n in taken: support_count[n] += 1
+                    support += taken
+                    pool[:] = [n for n in pool if n not in taken]
+
+            # смены
+            for n in s1: result.set_cell(row[n], d.day, "1")
+            for n in s2: result.set_cell(row[n], d.day, "2"); shift2_count[n]+=1
+            for n in names:
+                if d in off[n]: result.set_cell(row[n], d.day, "В")
+            for n, code in away_today.items(): result.set_cell(row[n], d.day, code)
+            for n in support: result.set_cell(row[n], d.day, SUPPORT)
+
+        if duty == "greedy":
+            with span("generate.duty"):
+                # дежурства: по одному на смену среди «регуляров»
+                duty1_candidates = [n for n in s1 if (n in regs) and can_duty.get(n, True) and not prev_duty2[n]]
+                duty1_candidates.sort(key=lambda n: (duty_count[n], 1 if prev_shift[n]=="2" else 0))
+                if duty1_candidates:
+                    n1 = duty1_candidates[0]
+                    result.set_cell(row[n1], d.day, duty=True); duty_count[n1]+=1
+
+                duty2_candidates = [n for n in s2 if (n in regs) and can_duty.get(n, True)]
+                duty2_candidates.sort(key=lambda n: (duty_count[n], 1 if prev_shift[n]=="2" else 0))
+                if duty2_candidates:
+                    n2 = duty2_candidates[0]
+                    result.set_cell(row[n2], d.day, duty=True); duty_count[n2]+=1
+                    prev_duty2 = {k: False for k in prev_duty2}
+                    prev_duty2[n2] = True
+
+        for n in names: prev_shift[n] = result.shift_at(row[n], d.day)
+        if progress: progress(day_no, len(days))
+
+    if duty == "flow":
+        from duty_flow import assign_duties     # NumPy нужен только здесь
+        result = assign_duties(employees, result, state)
+    if state is not None:
+        update_state(state, result)
     return result
+
+def generate_horizon(employees, start, months: int, state=None, absences=None, fixed_events=None,
+                     duty: str = "greedy", engine=None):
+    """
+    months месяцев подряд начиная с start = (y, m), по одному: yield (y, m, ScheduleMatrix).
+    Состояние (update_state) переходит из месяца в месяц: state — итоги на конец месяца перед start
+    (db.load_summary), после каждого yield в нём итоги по только что выданный месяц включительно.
+    absences / fixed_events — {(y, m): ...} как у db.load_absences_range / db.load_fixed_events_range.
+    engine — generate_schedule (по умолчанию) или logic_np.generate_schedule_np.
+    """
+    engine = engine or generate_schedule
+    state = {} if state is None else state
+    for k in range(months):
+        y, m = add_months(*start, k)
+        with span("generate_horizon.month"):
+            schedule = engine(employees, y, m, (absences or {}).get((y, m)), (fixed_events or {}).get((y, m)),
+                              duty=duty, state=state)
+        yield y, m, schedule
+
+@timed("repair")
+def repair_schedule(employees, schedule: ScheduleMatrix, days, pins=frozenset(), state=None):
+    """
+    Починка после ручных правок без полной генерации. Пересобираются только дни days и следующий
+    за каждым (правило «не в 1-ю после дежурства во 2-ю»), и в них — только незакреплённые 1/2:
+      - число людей во 2-й возвращается к цели generate_schedule (~45%, минимум 2);
+      - в каждой смене ровно один дежурный (лишние незакреплённые снимаются, недостающий назначается).
+    Кого двигать, решают итоги по людям (меньше 2-х смен/дежурств — первым).
+    pins — {(row, day)}; строки schedule — в порядке employees. schedule не меняется.
+    state — итоги на конец прошлого месяца (db.load_summary): их счётчики прибавляются к итогам месяца,
+    а последний день — сосед 1-го, как в generate_schedule.
+    Возвращает [(row, day, shift, duty)] — изменённые ячейки в новом виде.
+    """
+    nd = schedule.num_days
+    grid = {}       # row -> bytearray (копируются только тронутые строки)
+    regular = [not e.get("part_time", False) for e in employees]
+    duty_ok = [regular[r] and e.get("can_duty", True) for r, e in enumerate(employees)]
+    shift2_count, duty_count = {}, {}
+    past = [(state or {}).get(name) or {} for name in schedule.names]
+    # день 0 — последний день прошлого месяца
+    last = [SHIFT_INDEX.get(st.get("last_shift") or "", 0) | (DUTY_BIT if st.get("last_duty") else 0) for st in past]
+
+    def cell(r, i):
+        if i < 0:
+            return last[r]
+        row = grid.get(r)
+        return row[i] if row is not None else schedule.row_bytes(r)[i]
+
+    def put(r, i, b):
+        row = grid.get(r)
+        if row is None:
+            row = grid[r] = bytearray(schedule.row_bytes(r))
+        old, row[i] = row[i], b
+        if r in shift2_count:
+            shift2_count[r] += ((b & SHIFT_MASK) == _S2) - ((old & SHIFT_MASK) == _S2)
+        if r in duty_count:
+            duty_count[r] += bool(b & DUTY_BIT) - bool(old & DUTY_BIT)
+
+    def s2_total(r):
+        if r not in shift2_count:
+            row = grid.get(r) or schedule.row_bytes(r)
+            shift2_count[r] = row.count(_S2) + row.count(_S2 | DUTY_BIT) + past[r].get("shift2", 0)
+        return shift2_count[r]
+
+    def duty_total(r):
+        if r not in duty_count:
+            row = grid.get(r) or schedule.row_bytes(r)
+            duty_count[r] = sum(row.count(b) for b in _DUTY_BYTES) + past[r].get("duty", 0)
+        return duty_count[r]
+
+    n = len(schedule.names)
+    touched = sorted({d for day in days for d in (day, day + 1) if 1 <= d <= nd})
+    with span("repair.days"):
+        for day in touched:
+            i = day - 1
+            codes = [cell(r, i) for r in range(n)]
+
+            def assign(r, b):
+                put(r, i, b)
+                codes[r] = b
+
+            def was2(r):
+                return cell(r, i - 1) & SHIFT_MASK == _S2
+
+            def bad(r, shift):
+                return not duty_ok[r] or (shift == _S1 and cell(r, i - 1) == _S2 | DUTY_BIT)
+
+            # 2-я смена: двигаем свободных «регуляров», дежурных — в последнюю очередь
+            work = [r for r in range(n) if codes[r] & SHIFT_MASK in (_S1, _S2)]
+            regs = sum(1 for r in work if regular[r])
+            in_s2 = sum(1 for r in work if codes[r] & SHIFT_MASK == _S2)
+            target = min(regs, max(2, round(0.45 * len(work)))) if regs else 0
+            free = [r for r in work if regular[r] and (r, day) not in pins]
+            if in_s2 < target:
+                cand = [r for r in free if codes[r] & SHIFT_MASK == _S1]
+                cand.sort(key=lambda r: (bool(codes[r] & DUTY_BIT), s2_total(r), was2(r), r))
+                for r in cand[:target - in_s2]:
+                    assign(r, _S2 | (codes[r] & DUTY_BIT))
+            elif in_s2 > target:
+                cand = [r for r in free if codes[r] & SHIFT_MASK == _S2]
+                cand.sort(key=lambda r: (bool(codes[r] & DUTY_BIT), -s2_total(r), not was2(r), r))
+                for r in cand[:in_s2 - target]:
+                    assign(r, _S1 | (codes[r] & DUTY_BIT))
+
+            # дежурства: закреплённые остаются, иначе один подходящий; пусто — назначаем
+            for shift in (_S1, _S2):
+                holders = [r for r in work if codes[r] == shift | DUTY_BIT]
+                keep = [r for r in holders if (r, day) in pins] or [r for r in holders if not bad(r, shift)][:1]
+                cand = [] if keep else [r for r in work if codes[r] == shift and (r, day) not in pins and not bad(r, shift)]
+                if not keep and not cand:
+                    keep = holders[:1]      # заменить некем — пусть лучше дежурит «неподходящий», чем никто
+                for r in holders:
+                    if r not in keep:
+                        assign(r, shift)
+                if cand:
+                    def near(r):
+                        return sum(1 for j in (i - 1, i + 1) if j < nd and cell(r, j) & DUTY_BIT)
+                    assign(min(cand, key=lambda r: (near(r), duty_total(r), r)), shift | DUTY_BIT)
+
+    changes = []
+    for r, row in sorted(grid.items()):
+        base = schedule.row_bytes(r)
+        for i, b in enumerate(row):
+            if b != base[i]:
+                changes.append((r, i + 1, SHIFT_CODES[b & SHIFT_MASK], bool(b & DUTY_BIT)))
+    count("repair.cells", len(changes))
+    return changes
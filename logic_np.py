@@ -0,0 +1,149 @@
+# logic_np.py — векторизованный движок генератора (NumPy).
+# Та же эвристика, что logic.generate_schedule, но состояние «сотрудники × дни» хранится в массивах,
+# а выбор смен и дежурных делается argpartition/argmin без питоновских сортировок.
+import numpy as np
+
+from duty_flow import assign_duties
+from logic import month_days, off_patterns, absence_days, support_needed, update_state, SUPPORT
+from matrix import ScheduleMatrix, SHIFT_INDEX, DUTY_BIT
+from prof import span, timed
+
+# коды смен в массиве shifts совпадают с кодами matrix.SHIFT_CODES
+S_NONE, S_1, S_2, S_OFF = SHIFT_INDEX[""], SHIFT_INDEX["1"], SHIFT_INDEX["2"], SHIFT_INDEX["В"]
+S_SUPPORT = SHIFT_INDEX[SUPPORT]
+
+@timed("generate_np")
+def generate_arrays(employees, year: int, month: int, progress=None, absences=None, fixed_events=None, state=None):
+    """
+    Возвращает (days, shifts, duty): shifts — int8[сотрудники, дни] с кодами matrix.SHIFT_CODES,
+    duty — bool[сотрудники, дни]. Порядок строк совпадает с employees.
+    progress, absences, fixed_events, state — как в logic.generate_schedule (state здесь только читается).
+    """
+    days = month_days(year, month)
+    n, nd = len(employees), len(days)
+    pos = np.arange(n, dtype=np.int64)
+    part_time = np.fromiter((bool(e.get("part_time", False)) for e in employees), dtype=bool, count=n)
+    can_duty = np.fromiter((bool(e.get("can_duty", True)) for e in employees), dtype=bool, count=n)
+    can_support = np.fromiter((bool(e.get("can_support", True)) for e in employees), dtype=bool, count=n)
+
+    # отсутствия: код ОТП/БОЛ/КМД по дням, 0 — на месте
+    away = np.zeros((n, nd), dtype=np.int8)
+    pos_of = {e["name"]: i for i, e in enumerate(employees)}
+    for day, who in absence_days(absences, list(pos_of)).items():
+        for name, code in who.items():
+            away[pos_of[name], day - 1] = SHIFT_INDEX[code]
+
+    # выходные зависят только от номера сотрудника по модулю числа шаблонов
+    with span("generate_np.weekends"):
+        patterns = off_patterns(year, month)
+        pattern_mask = np.array([[d in p for d in days] for p in patterns], dtype=bool).reshape(len(patterns), nd)
+        off = pattern_mask[pos % len(patterns)]
+
+    shifts = np.where(away != 0, away, np.where(off, S_OFF, S_NONE)).astype(np.int8)
+    duty = np.zeros((n, nd), dtype=bool)
+
+    shift2_count = np.zeros(n, dtype=np.int64)
+    duty_count = np.zeros(n, dtype=np.int64)
+    support_count = np.zeros(n, dtype=np.int64)
+    prev2 = np.zeros(n, dtype=np.int64)       # 1, если вчера была 2-я смена
+    prev_duty2 = np.zeros(n, dtype=bool)
+    for i, e in enumerate(employees):
+        st = (state or {}).get(e["name"])
+        if st:
+            shift2_count[i], duty_count[i], support_count[i] = st["shift2"], st["duty"], st["support"]
+            prev2[i] = st["last_shift"] == "2"
+            prev_duty2[i] = st["last_shift"] == "2" and bool(st["last_duty"])
+    regular = ~part_time
+
+    for j in range(nd):
+        available = ~off[:, j] & (away[:, j] == 0)
+
+        # ОБЕС на весь день — до распределения по сменам; ключ (обеспечений, позиция) — как устойчивая сортировка
+        need = support_needed(fixed_events, j + 1)
+        if need:
+            cand = np.flatnonzero(available & can_support)
+            if cand.size > need:
+                cand = cand[np.argpartition(support_count[cand] * n + cand, need - 1)[:need]]
+            shifts[cand, j] = S_SUPPORT
+            support_count[cand] += 1
+            available[cand] = False
+
+        regs_mask = available & regular
+        regs = np.flatnonzero(regs_mask)
+        n_regs = regs.size
+
+        # целим ~45% во 2-ю смену, минимум 2 (если регуляров меньше — сколько есть)
+        target_s2 = min(n_regs, max(2, round(0.45 * int(available.sum())))) if n_regs else 0
+        # ключ (shift2_count, вчера во 2-й, позиция) уникален — повторяет устойчивую сортировку
+        key = (shift2_count[regs] * 2 + prev2[regs]) * n + regs
+        if 0 < target_s2 < n_regs:
+            sel = np.argpartition(key, target_s2 - 1)[:target_s2]
+        else:
+            sel = np.arange(target_s2)
+        s2 = regs[sel[np.argsort(key[sel], kind="stable")]]
+
+        in_s2 = np.zeros(n, dtype=bool)
+        in_s2[s2] = True
+        s1_mask = available & ~in_s2
+
+        # если во 2-й 1 человек — перекинем из первой
+        if s2.size == 1 and int(s1_mask.sum()) > 1:
+            s1_regs = np.flatnonzero(s1_mask & regular)
+            if s1_regs.size:
+                move = s1_regs[np.argmin(shift2_count[s1_regs])]
+                s2 = np.append(s2, move)
+                in_s2[move] = True; s1_mask[move] = False
+
+        # ОБЕС на смену — из людей этой смены, в порядке списков logic.py (1-я: регуляры, потом остальные)
+        for shift_no in (1, 2):
+            need = support_needed(fixed_events, j + 1, shift_no)
+            if need:
+                pool = (np.concatenate([np.flatnonzero(s1_mask & regular), np.flatnonzero(s1_mask & ~regular)])
+                        if shift_no == 1 else s2)
+                cand = pool[can_support[pool]]
+                taken = cand[np.argsort(support_count[cand], kind="stable")[:need]]
+                shifts[taken, j] = S_SUPPORT
+                support_count[taken] += 1
+                s1_mask[taken] = False
+                s2 = s2[~np.isin(s2, taken)]
+
+        # смены
+        shifts[s1_mask, j] = S_1
+        shifts[s2, j] = S_2
+        shift2_count[s2] += 1
+
+        # дежурства: по одному на смену среди «регуляров»; argmin берёт первого при равенстве
+        duty1 = np.flatnonzero(s1_mask & regular & can_duty & ~prev_duty2)
+        if duty1.size:
+            n1 = duty1[np.argmin(duty_count[duty1] * 2 + prev2[duty1])]
+            duty[n1, j] = True; duty_count[n1] += 1
+
+        duty2 = s2[can_duty[s2]]   # в порядке списка 2-й смены, как в logic.py
+        if duty2.size:
+            n2 = duty2[np.argmin(duty_count[duty2] * 2 + prev2[duty2])]
+            duty[n2, j] = True; duty_count[n2] += 1
+            prev_duty2[:] = False
+            prev_duty2[n2] = True
+
+        prev2 = (shifts[:, j] == S_2).astype(np.int64)
+        if progress: progress(j + 1, nd)
+
+    return days, shifts, duty
+
+def to_matrix(names, year: int, month: int, shifts, duty) -> ScheduleMatrix:
+    """Упаковывает массивы в ScheduleMatrix одним проходом по строкам, без словарей на ячейку."""
+    packed = shifts.astype(np.uint8) | (duty.astype(np.uint8) * np.uint8(DUTY_BIT))
+    return ScheduleMatrix(names, year, month, [bytearray(r.tobytes()) for r in packed])
+
+def generate_schedule_np(employees, year: int, month: int, absences=None, fixed_events=None, progress=None,
+                         duty: str = "greedy", state=None):
+    """Замена logic.generate_schedule: тот же ScheduleMatrix с тем же графиком (и тем же duty)."""
+    if duty not in ("greedy", "flow"):
+        raise ValueError(f"Неизвестный режим дежурств: {duty!r}")
+    _days, shifts, duty_arr = generate_arrays(employees, year, month, progress, absences, fixed_events, state)
+    result = to_matrix([e["name"] for e in employees], year, month, shifts, duty_arr)
+    if duty == "flow":
+        result = assign_duties(employees, result, state)
+    if state is not None:
+        update_state(state, result)
+    return result
@@ -0,0 +1,202 @@
+# matrix.py — компактный график месяца: один bytearray на сотрудника вместо словаря на каждую ячейку
+import calendar
+from collections import Counter
+from collections.abc import Mapping
+
+SHIFT_CODES = ("", "1", "2", "В", "ОТП", "БОЛ", "КМД", "ОБЕС")   # индекс = код в байте
+OFF_CODES = frozenset(("В", "ОТП", "БОЛ", "КМД"))                 # человек не работает
+ABSENCE_CODES = frozenset(("ОТП", "БОЛ", "КМД"))                 # отсутствия: в эти дни никуда не ставим
+SHIFT_INDEX = {s: i for i, s in enumerate(SHIFT_CODES)}
+DUTY_BIT = 0x80
+SHIFT_MASK = 0x7F
+
+class ScheduleMatrix(Mapping):
+    """
+    График на месяц. Строка = сотрудник (по позиции в names), байт = день:
+    младшие 7 бит — индекс в SHIFT_CODES, старший бит — дежурство.
+    Для старого кода это Mapping только для чтения: m[name][day] -> {"shift": str, "duty": bool}.
+    Менять ячейки — через set_cell().
+    """
+    __slots__ = ("year", "month", "names", "_rows", "_index")
+
+    def __init__(self, names, year: int, month: int, rows=None):
+        self.year = year
+        self.month = month
+        self.names = list(names)
+        nd = calendar.monthrange(year, month)[1]
+        self._rows = rows if rows is not None else [bytearray(nd) for _ in self.names]
+        self._index = {n: i for i, n in enumerate(self.names)}
+
+    @classmethod
+    def from_mapping(cls, names, year: int, month: int, mapping):
+        """Строит матрицу из schedule[name][day] = {"shift", "duty"}; чего нет в mapping — пустые ячейки."""
+        m = cls(names, year, month)
+        for r, name in enumerate(m.names):
+            days = mapping.get(name)
+            if not days:
+                continue
+            for day, payload in days.items():
+                m.set_cell(r, day, payload.get("shift") or "", bool(payload.get("duty")))
+        return m
+
+    # -------- доступ по позиции
+    @property
+    def num_days(self) -> int:
+        return calendar.monthrange(self.year, self.month)[1]
+
+    def index(self, name) -> int:
+        return self._index[name]
+
+    def shift_at(self, row: int, day: int) -> str:
+        return SHIFT_CODES[self._rows[row][day-1] & SHIFT_MASK]
+
+    def duty_at(self, row: int, day: int) -> bool:
+        return bool(self._rows[row][day-1] & DUTY_BIT)
+
+    def set_cell(self, row: int, day: int, shift=None, duty=None):
+        """shift/duty = None — оставить как есть."""
+        b = self._rows[row][day-1]
+        if shift is not None:
+            code = SHIFT_INDEX.get(shift or "")
+            if code is None:
+                raise ValueError(f"Неизвестный код смены: {shift!r}")
+            b = (b & DUTY_BIT) | code
+        if duty is not None:
+            b = (b | DUTY_BIT) if duty else (b & SHIFT_MASK)
+        self._rows[row][day-1] = b
+
+    def row_bytes(self, row: int) -> bytes:
+        return bytes(self._rows[row])
+
+    def iter_row(self, row: int):
+        """(day, shift, duty) по дням строки."""
+        for i, b in enumerate(self._rows[row], start=1):
+            yield i, SHIFT_CODES[b & SHIFT_MASK], bool(b & DUTY_BIT)
+
+    def is_empty(self) -> bool:
+        return not any(any(r) for r in self._rows)
+
+    def copy(self):
+        return ScheduleMatrix(self.names, self.year, self.month, [bytearray(r) for r in self._rows])
+
+    def to_dict(self):
+        return {name: dict(self[name]) for name in self.names}
+
+    # -------- Mapping (только чтение)
+    def __getitem__(self, name):
+        return _RowView(self, self._index[name])
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def __repr__(self):
+        return f"ScheduleMatrix({self.year}-{self.month:02d}, {len(self.names)} сотр.)"
+
+class _RowView(Mapping):
+    """Строка матрицы как {day: {"shift", "duty"}}; словари ячеек создаются при обращении."""
+    __slots__ = ("_m", "_row")
+
+    def __init__(self, m: ScheduleMatrix, row: int):
+        self._m = m
+        self._row = row
+
+    def __getitem__(self, day):
+        if not isinstance(day, int) or not 1 <= day <= len(self._m._rows[self._row]):
+            raise KeyError(day)
+        b = self._m._rows[self._row][day-1]
+        return {"shift": SHIFT_CODES[b & SHIFT_MASK], "duty": bool(b & DUTY_BIT)}
+
+    def __iter__(self):
+        return iter(range(1, len(self._m._rows[self._row]) + 1))
+
+    def __len__(self):
+        return len(self._m._rows[self._row])
+
+class ScheduleStats:
+    """
+    Счётчики поверх ScheduleMatrix, которые пересчитываются по одной ячейке (update) за O(1):
+    сколько людей в 1-й/2-й смене и не работает в каждый день, кто дежурит в (день, смена),
+    сколько у каждого 2-х смен и дежурств. Строится один раз за O(ячеек).
+    employees (флаги part_time/can_duty по именам) — разброс 2-х смен считается среди штатных,
+    дежурств — среди штатных с can_duty, как их раздаёт logic; None — среди всех строк.
+    """
+    __slots__ = ("s1", "s2", "off", "duty", "emp_shift2", "emp_duty", "_regular", "_duty_ok",
+                 "_shift2_hist", "_duty_hist")
+
+    def __init__(self, m: ScheduleMatrix, employees=None):
+        nd = m.num_days
+        self.s1 = [0]*nd
+        self.s2 = [0]*nd
+        self.off = [0]*nd
+        self.duty = {}                          # (day, shift) -> set(row)
+        self.emp_shift2 = [0]*len(m.names)
+        self.emp_duty = [0]*len(m.names)
+        for row in range(len(m.names)):
+            for day, shift, duty in m.iter_row(row):
+                self._apply(row, day, shift, duty, 1)
+        flags = {e["name"]: e for e in employees or ()}
+        self._regular = [not flags.get(name, {}).get("part_time", False) for name in m.names]
+        self._duty_ok = [reg and flags.get(name, {}).get("can_duty", True) for reg, name in zip(self._regular, m.names)]
+        # распределения «значение -> число сотрудников» для мин/макс без прохода по всем
+        self._shift2_hist = Counter(v for v, ok in zip(self.emp_shift2, self._regular) if ok)
+        self._duty_hist = Counter(v for v, ok in zip(self.emp_duty, self._duty_ok) if ok)
+
+    def _apply(self, row, day, shift, duty, sign):
+        i = day - 1
+        if shift == "1":
+            self.s1[i] += sign
+        elif shift == "2":
+            self.s2[i] += sign
+            self.emp_shift2[row] += sign
+        elif shift in OFF_CODES:
+            self.off[i] += sign
+        if duty:
+            self.emp_duty[row] += sign
+            holders = self.duty.setdefault((day, shift), set())
+            if sign > 0:
+                holders.add(row)
+            else:
+                holders.discard(row)
+
+    def update(self, row: int, day: int, old_shift: str, old_duty: bool, new_shift: str, new_duty: bool):
+        """Ячейка (row, day) сменилась с old_* на new_*."""
+        s2_before, duty_before = self.emp_shift2[row], self.emp_duty[row]
+        self._apply(row, day, old_shift, old_duty, -1)
+        self._apply(row, day, new_shift, new_duty, 1)
+        if self._regular[row]:
+            _move(self._shift2_hist, s2_before, self.emp_shift2[row])
+        if self._duty_ok[row]:
+            _move(self._duty_hist, duty_before, self.emp_duty[row])
+
+    def duty_holder(self, day: int, shift: str, exclude=None):
+        """Строка дежурного в (day, shift), кроме exclude; None — дежурного нет."""
+        for row in self.duty.get((day, shift), ()):
+            if row != exclude:
+                return row
+        return None
+
+    def shift2_range(self):
+        """(мин, макс) 2-х смен у штатных."""
+        return _range(self._shift2_hist)
+
+    def duty_range(self):
+        """(мин, макс) дежурств у тех, кто может дежурить."""
+        return _range(self._duty_hist)
+
+def _move(hist: Counter, old: int, new: int):
+    if old == new:
+        return
+    hist[old] -= 1
+    if not hist[old]:
+        del hist[old]
+    hist[new] += 1
+
+def _range(hist: Counter):
+    """(мин, макс) по распределению; (0, 0) для пустого графика."""
+    return (min(hist), max(hist)) if hist else (0, 0)
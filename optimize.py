@@ -0,0 +1,298 @@
+# optimize.py — доводка графика локальным поиском (имитация отжига) поверх жадного generate_schedule.
+# Каждый ход меняет 1–4 ячейки (1–2 дня); стоимость пересчитывается по затронутым ячейкам и
+# накопленным суммам (O(1) на ход), а не по всему месяцу.
+import math
+import random
+import time
+
+from logic import generate_schedule, update_state
+from matrix import ScheduleMatrix, SHIFT_INDEX, DUTY_BIT, SHIFT_MASK
+from prof import timed, count
+
+S1, S2 = SHIFT_INDEX["1"], SHIFT_INDEX["2"]
+
+# вес каждого слагаемого стоимости
+DEFAULT_WEIGHTS = {
+    "coverage": 4.0,    # (людей во 2-й − цель дня)², цель как в logic: ~45%, минимум 2
+    "shift2": 1.0,      # разброс числа 2-х смен у «регуляров» (сумма квадратов отклонений)
+    "duty": 2.0,        # разброс числа дежурств у тех, кто может дежурить
+    "duty_b2b": 3.0,    # дежурства два дня подряд
+    "shift2_run": 0.5,  # 2-я смена два дня подряд
+}
+
+class _State:
+    """
+    Сетка кодов (bytearray на сотрудника, индекс = день-1) и агрегаты, из которых стоимость
+    собирается за O(1): суммы и суммы квадратов по сотрудникам, люди во 2-й по дням, число пар подряд.
+    state (logic.update_state) — итоги прошлых месяцев: счётчики 2-х смен и дежурств начинаются с них,
+    последний день прошлого месяца (self.prev) — сосед первого дня в парах подряд.
+    """
+    def __init__(self, employees, schedule: ScheduleMatrix, weights, state=None):
+        self.w = weights
+        n = len(schedule.names)
+        self.nd = schedule.num_days
+        self.grid = [bytearray(schedule.row_bytes(r)) for r in range(n)]
+        self.regular = [not e.get("part_time", False) for e in employees]
+        self.duty_ok = [self.regular[r] and e.get("can_duty", True) for r, e in enumerate(employees)]
+        self.regs = [r for r in range(n) if self.regular[r]]
+        self.duty_rows = [r for r in range(n) if self.duty_ok[r]]
+
+        carried = [(state or {}).get(name) or {} for name in schedule.names]
+        self.s2_emp = [st.get("shift2", 0) for st in carried]
+        self.duty_emp = [st.get("duty", 0) for st in carried]
+        self.prev = [SHIFT_INDEX.get(st.get("last_shift") or "", 0) | (DUTY_BIT if st.get("last_duty") else 0)
+                     for st in carried]
+        self.s2_day = [0]*self.nd
+        self.holder = {}            # (day_idx, shift_code) -> row дежурного
+        self.b2b = 0
+        self.run2 = 0
+        for r, row in enumerate(self.grid):
+            for i, b in enumerate(row):
+                code = b & SHIFT_MASK
+                if code == S2:
+                    self.s2_emp[r] += 1
+                    self.s2_day[i] += 1
+                if b & DUTY_BIT:
+                    self.duty_emp[r] += 1
+                    self.holder[(i, code)] = r
+                before = row[i-1] if i else self.prev[r]
+                if b & DUTY_BIT and before & DUTY_BIT:
+                    self.b2b += 1
+                if code == S2 and before & SHIFT_MASK == S2:
+                    self.run2 += 1
+
+        # цель по 2-й смене на день — по тем, кто в этот день работает (как в logic.generate_schedule)
+        self.target = []
+        for i in range(self.nd):
+            working = [r for r in range(n) if self.grid[r][i] & SHIFT_MASK in (S1, S2)]
+            regs = sum(1 for r in working if self.regular[r])
+            self.target.append(min(regs, max(2, round(0.45 * len(working)))) if regs else 0)
+        self.cov = sum((s - t) ** 2 for s, t in zip(self.s2_day, self.target))
+        self.s2_sum = sum(self.s2_emp[r] for r in self.regs)
+        self.s2_sq = sum(self.s2_emp[r] ** 2 for r in self.regs)
+        self.d_sum = sum(self.duty_emp[r] for r in self.duty_rows)
+        self.d_sq = sum(self.duty_emp[r] ** 2 for r in self.duty_rows)
+
+    def cost(self) -> float:
+        w = self.w
+        s2_var = self.s2_sq - self.s2_sum ** 2 / len(self.regs) if self.regs else 0.0
+        d_var = self.d_sq - self.d_sum ** 2 / len(self.duty_rows) if self.duty_rows else 0.0
+        return (w["coverage"] * self.cov + w["shift2"] * s2_var + w["duty"] * d_var
+                + w["duty_b2b"] * self.b2b + w["shift2_run"] * self.run2)
+
+    def at(self, r, i):
+        """Байт ячейки; i = -1 — последний день прошлого месяца."""
+        return self.grid[r][i] if i >= 0 else self.prev[r]
+
+    def _pairs(self, r, i):
+        """(дежурства подряд, 2-я подряд) в парах сотрудника r, куда входит день i."""
+        row, b2b, run2 = self.grid[r], 0, 0
+        for j in (i-1, i+1):
+            if -1 <= j < self.nd:
+                other = self.at(r, j)
+                if row[i] & DUTY_BIT and other & DUTY_BIT:
+                    b2b += 1
+                if row[i] & SHIFT_MASK == S2 and other & SHIFT_MASK == S2:
+                    run2 += 1
+        return b2b, run2
+
+    def set(self, r, i, new):
+        """Записать байт new в (r, i), обновив все агрегаты."""
+        old = self.grid[r][i]
+        if old == new:
+            return
+        b_old, run_old = self._pairs(r, i)
+        old_s2, new_s2 = old & SHIFT_MASK == S2, new & SHIFT_MASK == S2
+        if old_s2 != new_s2:
+            delta = 1 if new_s2 else -1
+            t = self.target[i]
+            self.cov += (self.s2_day[i] + delta - t) ** 2 - (self.s2_day[i] - t) ** 2
+            self.s2_day[i] += delta
+            x = self.s2_emp[r]
+            self.s2_emp[r] = x + delta
+            if self.regular[r]:
+                self.s2_sum += delta
+                self.s2_sq += (x + delta) ** 2 - x ** 2
+        if old & DUTY_BIT:
+            if self.holder.get((i, old & SHIFT_MASK)) == r:
+                del self.holder[(i, old & SHIFT_MASK)]
+        if (old & DUTY_BIT) != (new & DUTY_BIT):
+            delta = 1 if new & DUTY_BIT else -1
+            x = self.duty_emp[r]
+            self.duty_emp[r] = x + delta
+            if self.duty_ok[r]:
+                self.d_sum += delta
+                self.d_sq += (x + delta) ** 2 - x ** 2
+        self.grid[r][i] = new
+        if new & DUTY_BIT:
+            self.holder[(i, new & SHIFT_MASK)] = r
+        b_new, run_new = self._pairs(r, i)
+        self.b2b += b_new - b_old
+        self.run2 += run_new - run_old
+
+def _swappable(st: _State, a, b, ba, bb) -> bool:
+    """a в 1-й, b во 2-й, и дежурство (если есть) переходит к тому, кто может дежурить."""
+    if ba & SHIFT_MASK != S1 or bb & SHIFT_MASK != S2:
+        return False
+    return not (bb & DUTY_BIT and not st.duty_ok[a]) and not (ba & DUTY_BIT and not st.duty_ok[b])
+
+_D1, _D2 = S1 | DUTY_BIT, S2 | DUTY_BIT
+
+def _after2(st: _State, change) -> bool:
+    """После хода у кого-то из затронутых 1-я с дежурством наутро после дежурства во 2-й (в logic это запрещено)."""
+    new = {(r, i): b for r, i, b in change}
+    for r, i, _b in change:
+        for a in (i - 1, i):
+            if a + 1 < st.nd:
+                if new.get((r, a), st.at(r, a)) == _D2 and new.get((r, a + 1), st.at(r, a + 1)) == _D1:
+                    return True
+    return False
+
+def _propose(st: _State, rnd: random.Random):
+    """Случайный допустимый ход: список (row, day_idx, новый байт) или None."""
+    change = _move(st, rnd)
+    return None if change is None or _after2(st, change) else change
+
+def _move(st: _State, rnd: random.Random):
+    i = rnd.randrange(st.nd)
+    kind = rnd.random()
+    if kind < 0.6 and st.regs:
+        # обмен ячейками между 1-й и 2-й сменой (вместе с дежурством)
+        a, b = rnd.choice(st.regs), rnd.choice(st.regs)
+        ga, gb = st.grid[a], st.grid[b]
+        if not _swappable(st, a, b, ga[i], gb[i]):
+            return None
+        if kind < 0.3:
+            return [(a, i, gb[i]), (b, i, ga[i])]
+        # встречный обмен в другой день: число 2-х смен у обоих не меняется, меняются только серии
+        start = rnd.randrange(st.nd)
+        for k in range(st.nd):
+            j = (start + k) % st.nd
+            if j != i and _swappable(st, b, a, gb[j], ga[j]):
+                return [(a, i, gb[i]), (b, i, ga[i]), (a, j, gb[j]), (b, j, ga[j])]
+        return None
+    if kind < 0.85 and st.duty_rows:
+        # передать дежурство другому в той же смене
+        shift = S1 if rnd.random() < 0.5 else S2
+        h = st.holder.get((i, shift))
+        e = rnd.choice(st.duty_rows)
+        if h is None or e == h or st.grid[e][i] != shift:
+            return None
+        return [(h, i, shift), (e, i, shift | DUTY_BIT)]
+    if st.regs:
+        # перевести «регуляра» без дежурства между 1-й и 2-й
+        e = rnd.choice(st.regs)
+        b = st.grid[e][i]
+        if b not in (S1, S2):
+            return None
+        return [(e, i, S2 if b == S1 else S1)]
+    return None
+
+START_ACCEPT = 0.02     # с какой вероятностью на старте принимается самое «дешёвое» ухудшение
+
+def _initial_temperature(st: _State, rnd: random.Random, samples: int = 200) -> float:
+    """
+    Начальная температура по пробным ходам. Жадный график уже близок к локальному минимуму:
+    при «горячем» старте отжиг уходит от него и за секунду бюджета не возвращается.
+    """
+    smallest = None
+    for _ in range(samples * 5):
+        change = _propose(st, rnd)
+        if change is None:
+            continue
+        before = st.cost()
+        undo = [(r, i, st.grid[r][i]) for r, i, _b in change]
+        for r, i, b in change:
+            st.set(r, i, b)
+        delta = st.cost() - before
+        for r, i, b in reversed(undo):
+            st.set(r, i, b)
+        if delta > 1e-9 and (smallest is None or delta < smallest):
+            smallest = delta
+    return (smallest or 1.0) / -math.log(START_ACCEPT)
+
+@timed("optimize")
+def optimize_schedule(employees, schedule: ScheduleMatrix, budget: float = 1.0, seed: int = 0,
+                      max_moves=None, weights=None, progress=None, state=None):
+    """
+    Имитация отжига от готового графика (строки schedule — в порядке employees).
+    Не трогает выходные/отсутствия, частично занятых держит в 1-й без дежурств, число дежурных
+    в (день, смена) не меняет, дежурство в 1-й наутро после дежурства во 2-й не ставит.
+    budget — секунды; max_moves — предел ходов (для воспроизводимости).
+    progress(сделано_мс, всего_мс) — как в logic.generate_schedule (исключение = отмена).
+    state — итоги на конец прошлого месяца (db.load_summary), как у generate_schedule: ровность считается
+    по накопленным итогам, последний день прошлого месяца — сосед первого. state не меняется.
+    Возвращает (новый ScheduleMatrix, {"moves", "accepted", "cost_before", "cost_after", "seconds"}).
+    """
+    w = dict(DEFAULT_WEIGHTS, **(weights or {}))
+    st = _State(employees, schedule, w, state)
+    rnd = random.Random(seed)
+    cost = start_cost = st.cost()
+    best_cost, best_grid = cost, [bytearray(r) for r in st.grid]
+    t0 = time.perf_counter()
+    deadline = t0 + budget
+    t_start = _initial_temperature(st, rnd)
+    t_end = t_start / 1000
+    temp = t_start
+    moves = accepted = 0
+    while max_moves is None or moves < max_moves:
+        if moves % 512 == 0:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            frac = (now - t0) / budget
+            temp = t_start * (t_end / t_start) ** frac
+            if progress: progress(int((now - t0) * 1000), int(budget * 1000))
+        moves += 1
+        change = _propose(st, rnd)
+        if change is None:
+            continue
+        undo = [(r, i, st.grid[r][i]) for r, i, _b in change]
+        for r, i, b in change:
+            st.set(r, i, b)
+        new_cost = st.cost()
+        delta = new_cost - cost
+        if delta <= 0 or rnd.random() < math.exp(-delta / temp):
+            cost = new_cost
+            accepted += 1
+            if cost < best_cost - 1e-9:
+                best_cost = cost
+                best_grid = None    # лучшая — текущая; копия снимется, когда начнём уходить от неё
+        else:
+            for r, i, b in reversed(undo):
+                st.set(r, i, b)
+            continue
+        if best_grid is None and cost > best_cost + 1e-9:
+            # только что ушли от лучшей: откатить этот ход, снять копию, повторить ход
+            for r, i, b in reversed(undo):
+                st.set(r, i, b)
+            best_grid = [bytearray(r) for r in st.grid]
+            for r, i, b in change:
+                st.set(r, i, b)
+    if best_grid is None or cost <= best_cost:
+        best_grid, best_cost = st.grid, cost
+    count("optimize.moves", moves)
+    result = ScheduleMatrix(schedule.names, schedule.year, schedule.month, best_grid)
+    return result, {
+        "moves": moves, "accepted": accepted,
+        "cost_before": start_cost, "cost_after": best_cost,
+        "seconds": time.perf_counter() - t0,
+    }
+
+def schedule_cost(employees, schedule: ScheduleMatrix, weights=None, state=None) -> float:
+    """Стоимость графика в тех же единицах, что минимизирует optimize_schedule."""
+    return _State(employees, schedule, dict(DEFAULT_WEIGHTS, **(weights or {})), state).cost()
+
+def generate_optimized(employees, year: int, month: int, absences=None, fixed_events=None, progress=None,
+                       duty: str = "greedy", state=None, budget: float = 1.0, seed: int = 0):
+    """
+    generate_schedule с теми же входами, затем optimize_schedule в пределах budget секунд.
+    Отсутствия и ОБЕС доводка не трогает; state, как у generate_schedule, дополняется итогами
+    доведённого графика.
+    """
+    carried = None if state is None else {n: dict(st) for n, st in state.items()}
+    greedy = generate_schedule(employees, year, month, absences, fixed_events, progress, duty=duty, state=carried)
+    result, _info = optimize_schedule(employees, greedy, budget, seed, progress=progress, state=state)
+    if state is not None:
+        update_state(state, result)
+    return result
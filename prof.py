@@ -0,0 +1,128 @@
+# prof.py — лёгкие замеры по фазам: именованные интервалы и счётчики, выключенные ничего не стоят.
+# Включение: SCHEDULER_PROFILE=1 (отчёт в stderr при выходе) или SCHEDULER_PROFILE=report.txt;
+# SCHEDULER_CPROFILE=out.prof — дополнительно cProfile всего процесса. Из кода/CLI — prof.enable().
+import atexit
+import os
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+_NOOP = nullcontext()
+_lock = threading.Lock()
+
+class _State:
+    enabled = False
+    report_path = None
+    profiler = None
+    cprofile_path = None
+    spans = {}      # name -> [calls, total, max]
+    counters = {}   # name -> value
+
+def enabled() -> bool:
+    return _State.enabled
+
+def enable(report_path=None, cprofile_path=None):
+    """Включить замеры; отчёт (и cProfile, если задан путь) пишется при выходе из процесса."""
+    if not _State.enabled:
+        atexit.register(dump)
+    _State.enabled = True
+    _State.report_path = report_path
+    if cprofile_path and _State.profiler is None:
+        import cProfile
+        _State.cprofile_path = cprofile_path
+        _State.profiler = cProfile.Profile()
+        _State.profiler.enable()
+
+def reset():
+    with _lock:
+        _State.spans.clear()
+        _State.counters.clear()
+
+class _Span:
+    __slots__ = ("name", "t0")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _add(self.name, time.perf_counter() - self.t0)
+        return False
+
+def _add(name, dt):
+    with _lock:
+        rec = _State.spans.get(name)
+        if rec is None:
+            _State.spans[name] = [1, dt, dt]
+        else:
+            rec[0] += 1; rec[1] += dt
+            if dt > rec[2]: rec[2] = dt
+
+def span(name: str):
+    """with span("generate.duty"): ... — при выключенных замерах общий пустой контекст."""
+    return _Span(name) if _State.enabled else _NOOP
+
+def count(name: str, n: int = 1):
+    if _State.enabled:
+        with _lock:
+            _State.counters[name] = _State.counters.get(name, 0) + n
+
+def timed(name: str):
+    """Декоратор: весь вызов функции — интервал name."""
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _State.enabled:
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _add(name, time.perf_counter() - t0)
+        return wrapper
+    return deco
+
+def report() -> str:
+    with _lock:
+        spans = sorted(_State.spans.items(), key=lambda kv: -kv[1][1])
+        counters = sorted(_State.counters.items())
+    lines = [f"{'фаза':<32}{'вызовов':>9}{'всего, мс':>12}{'среднее, мс':>13}{'макс, мс':>10}"]
+    for name, (calls, total, worst) in spans:
+        lines.append(f"{name:<32}{calls:>9}{total*1000:>12.1f}{total*1000/calls:>13.2f}{worst*1000:>10.1f}")
+    if counters:
+        lines.append("")
+        lines += [f"{name:<32}{value:>9}" for name, value in counters]
+    return "\n".join(lines)
+
+def dump():
+    if _State.profiler is not None:
+        _State.profiler.disable()
+        _State.profiler.dump_stats(_State.cprofile_path)
+        _State.profiler = None
+    if not _State.spans and not _State.counters:
+        return
+    text = report()
+    if _State.report_path:
+        with open(_State.report_path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text, file=sys.stderr)
+
+def add_cli_flags(parser):
+    """--profile [ФАЙЛ] и --cprofile ФАЙЛ для argparse-скриптов."""
+    parser.add_argument("--profile", nargs="?", const="", metavar="ФАЙЛ",
+                        help="замеры по фазам; отчёт в ФАЙЛ или в stderr")
+    parser.add_argument("--cprofile", metavar="ФАЙЛ", help="записать cProfile в ФАЙЛ")
+
+def apply_cli_flags(args):
+    if args.profile is not None or args.cprofile:
+        enable(args.profile or None, args.cprofile)
+
+_env = os.environ.get("SCHEDULER_PROFILE", "")
+if _env or os.environ.get("SCHEDULER_CPROFILE"):
+    enable(None if _env in ("", "1") else _env, os.environ.get("SCHEDULER_CPROFILE"))
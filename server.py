@@ -0,0 +1,294 @@
+# server.py — локальный HTTP-сервис на asyncio (без внешних зависимостей): генерация, графики, справедливость, Excel.
+# Запуск: python server.py [--host 127.0.0.1] [--port 8765] [--db scheduler.db] [--workers N]
+#   POST /generate   {"year": 2026, "month": 3, "duty": "flow", "save": false} -> график месяца
+#   GET  /schedule?from=2026-01[&to=2026-12]     -> сохранённые месяцы (потоком: месяц — кусок ответа)
+#   GET  /fairness?from=2026-01[&to=2026-12]     -> 2-е смены, дежурства, ОБЕС по сотрудникам за период
+#   GET  /export.xlsx?from=2026-01[&to=2026-12]  -> книга Excel (лист на месяц)
+# Генерация — в пуле процессов; все обращения к SQLite — из одного потока, одним соединением (db.get_conn).
+# Одинаковые одновременные запросы генерации считаются один раз, результат получают все (и кэш, см. cache.py).
+import argparse
+import asyncio
+import io
+import json
+import multiprocessing
+import signal
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from http import HTTPStatus
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+
+import cache
+import db
+import prof
+from logic import add_months, iter_months, parse_month, update_state, YEARS
+from logic_np import generate_schedule_np
+from matrix import ScheduleMatrix
+
+MAX_MONTHS = 60         # месяцев в одном запросе не больше
+MAX_BODY = 1 << 20      # байт тела запроса
+
+class HttpError(Exception):
+    """Ошибка запроса — уходит клиенту как {"error": ...} с кодом status."""
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+def _period(query):
+    """?from=ГГГГ-ММ[&to=ГГГГ-ММ] -> [(y, m), ...]."""
+    if "from" not in query:
+        raise HttpError(400, "нужен параметр from=ГГГГ-ММ")
+    try:
+        start = parse_month(query["from"][0])
+        end = parse_month(query["to"][0]) if "to" in query else start
+    except ValueError as e:
+        raise HttpError(400, str(e))
+    if end < start:
+        raise HttpError(400, "последний месяц раньше первого")
+    months = list(islice(iter_months(start, end), MAX_MONTHS + 1))
+    if len(months) > MAX_MONTHS:
+        raise HttpError(400, f"не больше {MAX_MONTHS} месяцев за запрос")
+    return months
+
+def schedule_json(schedule: ScheduleMatrix):
+    return {
+        "year": schedule.year, "month": schedule.month, "days": schedule.num_days,
+        "employees": [{"name": name,
+                       "shift": [shift for _d, shift, _duty in schedule.iter_row(r)],
+                       "duty": [int(duty) for _d, _shift, duty in schedule.iter_row(r)]}
+                      for r, name in enumerate(schedule.names)],
+    }
+
+def _dumps(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+# -------- то, что выполняется вне цикла событий
+def _read_inputs(y: int, m: int):
+    """Входы генерации месяца (в потоке базы)."""
+    employees = [{k: v for k, v in e.items() if k != "id"} for e in db.load_employees()]
+    names = [e["name"] for e in employees]
+    return (employees, db.load_absences(y, m, names), db.load_fixed_events(y, m),
+            db.load_summary(*add_months(y, m, -1)))
+
+def _load_months(months):
+    """Сохранённые месяцы (в потоке базы): строки — все сотрудники в порядке id."""
+    names = [e["name"] for e in db.load_employees()]
+    return [db.load_month_schedule(y, m, names) for y, m in months]
+
+def _generate(employees, y, m, absences, fixed_events, duty, state):
+    """В процессе пула: один месяц (logic_np — тот же результат, что у logic.generate_schedule)."""
+    return generate_schedule_np(employees, y, m, absences, fixed_events, duty=duty, state=state)
+
+def _xlsx(schedules) -> bytes:
+    import export_xlsx      # openpyxl нужен только здесь
+    buf = io.BytesIO()
+    export_xlsx.export_schedules(buf, schedules)
+    return buf.getvalue()
+
+class Service:
+    def __init__(self, workers=None):
+        self.db_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+        # spawn, а не fork: процессы пула запускаются при первой генерации и при fork унаследовали бы
+        # слушающий сокет и соединение клиента — writer.close() его бы уже не закрывал
+        self.cpu = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        self.inflight = {}      # ключ входов (cache.schedule_key) -> Future генерации
+
+    async def db(self, fn, *args):
+        """fn(*args) в потоке базы: одно соединение на весь сервис, запросы — по очереди."""
+        return await asyncio.get_running_loop().run_in_executor(self.db_thread, partial(fn, *args))
+
+    def close(self):
+        self.cpu.shutdown(cancel_futures=True)
+        self.db_thread.submit(db.close_all).result()
+        self.db_thread.shutdown()
+
+    # -------- генерация
+    async def _generate_once(self, key, employees, y, m, absences, fixed_events, duty, state):
+        names = [e["name"] for e in employees]
+        schedule = await self.db(cache.lookup, key, names, y, m)
+        if schedule is None:
+            with prof.span("server.cpu"):
+                schedule = await asyncio.get_running_loop().run_in_executor(
+                    self.cpu, _generate, employees, y, m, absences, fixed_events, duty, state)
+            await self.db(cache.store, [(key, schedule)])
+        return schedule
+
+    async def generate(self, y: int, m: int, duty: str, save: bool):
+        employees, absences, fixed_events, state = await self.db(_read_inputs, y, m)
+        key = cache.schedule_key(employees, y, m, absences, fixed_events, duty, state)
+        future = self.inflight.get(key)
+        coalesced = future is not None
+        if future is None:
+            future = asyncio.ensure_future(
+                self._generate_once(key, employees, y, m, absences, fixed_events, duty, state))
+            self.inflight[key] = future
+            future.add_done_callback(lambda _f: self.inflight.pop(key, None))
+        else:
+            prof.count("server.coalesced")
+        # shield: отключившийся клиент не отменяет генерацию для остальных ожидающих
+        schedule = (await asyncio.shield(future)).copy()
+        if save:
+            await self.db(db.save_months, [(y, m, schedule, update_state(state, schedule))])
+        return schedule, coalesced
+
+    # -------- обработчики
+    async def post_generate(self, writer, query, body):
+        try:
+            req = json.loads(body or b"{}")
+            y, m = int(req["year"]), int(req["month"])
+        except (ValueError, KeyError, TypeError):
+            raise HttpError(400, 'ожидается JSON {"year": ГГГГ, "month": ММ[, "duty": "flow"|"greedy", "save": true]}')
+        duty = req.get("duty", "flow")
+        if duty not in ("flow", "greedy") or not 1 <= m <= 12 or y not in YEARS:
+            raise HttpError(400, "неверный год, месяц или режим дежурств")
+        schedule, coalesced = await self.generate(y, m, duty, bool(req.get("save", False)))
+        await _send(writer, 200, _dumps(dict(schedule_json(schedule), coalesced=coalesced)), "application/json")
+
+    async def get_schedule(self, writer, query, body):
+        months = _period(query)
+        await _start_chunked(writer, "application/json")
+        try:
+            await _chunk(writer, b'{"months":[')
+            for k, (y, m) in enumerate(months):
+                # по месяцу: в памяти один месяц, клиент получает первые месяцы, пока читаются следующие
+                schedule, = await self.db(_load_months, [(y, m)])
+                await _chunk(writer, (b"," if k else b"") + _dumps(schedule_json(schedule)))
+            await _chunk(writer, b"]}")
+            await _chunk(writer, b"")
+        except Exception:
+            # заголовок уже ушёл: оборванный поток без завершающего куска клиент увидит как ошибку
+            writer.transport.abort()
+            prof.count("server.stream_errors")
+
+    async def get_fairness(self, writer, query, body):
+        months = _period(query)
+        state = {}
+        for y, m in months:
+            schedule, = await self.db(_load_months, [(y, m)])
+            update_state(state, schedule)
+        total = await self.db(db.load_summary, *months[-1])
+        rows = [{"name": name, "shift2": st["shift2"], "duty": st["duty"], "support": st["support"],
+                 "total": total.get(name)} for name, st in state.items()]
+        spread = {k: [min((r[k] for r in rows), default=0), max((r[k] for r in rows), default=0)]
+                  for k in ("shift2", "duty", "support")}
+        await _send(writer, 200, _dumps({"from": "%d-%02d" % months[0], "to": "%d-%02d" % months[-1],
+                                         "employees": rows, "range": spread}), "application/json")
+
+    async def get_export(self, writer, query, body):
+        months = _period(query)
+        schedules = await self.db(_load_months, months)
+        data = await asyncio.get_running_loop().run_in_executor(None, _xlsx, schedules)
+        name = "schedule_%d_%02d.xlsx" % months[0]
+        await _send(writer, 200, data, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    [("Content-Disposition", f'attachment; filename="{name}"')])
+
+    ROUTES = {
+        ("POST", "/generate"): post_generate,
+        ("GET", "/schedule"): get_schedule,
+        ("GET", "/fairness"): get_fairness,
+        ("GET", "/export.xlsx"): get_export,
+    }
+
+    async def handle(self, reader, writer):
+        """Один запрос на соединение (Connection: close)."""
+        try:
+            try:
+                method, target, _version = (await reader.readline()).decode("latin-1").split()
+            except ValueError:
+                raise HttpError(400, "неверная строка запроса")
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            try:
+                length = int(headers.get("content-length") or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                raise HttpError(400, "неверный Content-Length")
+            if length > MAX_BODY:
+                raise HttpError(413, "слишком большой запрос")
+            body = await reader.readexactly(length) if length else b""
+            url = urlsplit(target)
+            handler = self.ROUTES.get((method, url.path))
+            if handler is None:
+                known = any(path == url.path for _m, path in self.ROUTES)
+                raise HttpError(405 if known else 404, f"{method} {url.path}: нет такого метода")
+            with prof.span("server" + url.path):
+                await handler(self, writer, parse_qs(url.query), body)
+        except HttpError as e:
+            await _send(writer, e.status, _dumps({"error": str(e)}), "application/json")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass    # клиент ушёл
+        except Exception as e:
+            # обработчики пишут ответ только целиком (кроме потоковых — те обрывают соединение сами)
+            try:
+                await _send(writer, 500, _dumps({"error": str(e)}), "application/json")
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+# -------- ответы
+def _head(status: int, headers):
+    lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}", "Connection: close"]
+    lines += [f"{k}: {v}" for k, v in headers]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+async def _send(writer, status: int, body: bytes, content_type: str, headers=()):
+    writer.write(_head(status, [("Content-Type", content_type), ("Content-Length", len(body)), *headers]) + body)
+    await writer.drain()
+
+async def _start_chunked(writer, content_type: str):
+    writer.write(_head(200, [("Content-Type", content_type), ("Transfer-Encoding", "chunked")]))
+
+async def _chunk(writer, data: bytes):
+    """Кусок chunked-ответа; пустой — конец. drain — чтобы медленный клиент не копил ответ в памяти."""
+    writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+    await writer.drain()
+
+async def serve(host: str, port: int, workers=None):
+    service = Service(workers)
+    await service.db(db.init_db)
+    server = await asyncio.start_server(service.handle, host, port)
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, server.close)
+    except NotImplementedError:
+        pass    # Windows: остановка только по Ctrl+C
+    print(f"Сервис: http://{host}:{port}", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    except asyncio.CancelledError:
+        pass    # server.close() по SIGTERM
+    finally:
+        service.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Локальный HTTP-сервис графиков (JSON).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--db", help="путь к базе (по умолчанию scheduler.db рядом с db.py)")
+    parser.add_argument("--workers", type=int, help="процессов генерации (по умолчанию — ядер)")
+    prof.add_cli_flags(parser)
+    args = parser.parse_args(argv)
+    prof.apply_cli_flags(args)
+    if args.db:
+        db.DB_PATH = Path(args.db)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
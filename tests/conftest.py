@@ -0,0 +1,5 @@
+# conftest.py — модули проекта лежат в корне репозитория, тесты — в tests/
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
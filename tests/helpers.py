@@ -0,0 +1,10 @@
+# helpers.py — общее для тестов: случайный ростер
+def random_roster(rnd, n, part_time=0.15, can_duty=0.8, can_support=None):
+    """n сотрудников с флагами по вероятностям; can_support=None — без флага (по умолчанию True)."""
+    employees = []
+    for i in range(n):
+        e = {"name": f"E{i}", "part_time": rnd.random() < part_time, "can_duty": rnd.random() < can_duty}
+        if can_support is not None:
+            e["can_support"] = rnd.random() < can_support
+        employees.append(e)
+    return employees
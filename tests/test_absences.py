@@ -0,0 +1,79 @@
+# test_absences.py — отсутствия и события ОБЕС: загрузка диапазоном из базы и их соблюдение генератором
+from datetime import date
+
+import pytest
+
+import db
+from logic import generate_horizon, SUPPORT
+from logic_np import generate_schedule_np
+from matrix import ABSENCE_CODES
+
+@pytest.fixture
+def roster(tmp_path, monkeypatch):
+    """База с 12 сотрудниками, отсутствиями и событиями на стыке 2025/2026."""
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "scheduler.db")
+    db.init_db(seed=False)
+    employees = [{"name": f"E{i}", "part_time": i % 6 == 5, "can_duty": i % 4 != 3, "can_support": i % 3 != 2}
+                 for i in range(12)]
+    db.upsert_employees(employees)
+    db.set_absence("E0", date(2025, 12, 28), date(2026, 1, 4), "ОТП")
+    db.set_absence("E1", date(2025, 11, 30), date(2025, 12, 1), "БОЛ")
+    db.set_absence("E2", date(2026, 1, 10), date(2026, 1, 10), "КМД")
+    db.set_absence("E3", date(2026, 2, 1), date(2026, 2, 3), "ОТП")       # вне диапазона
+    db.add_fixed_event(date(2025, 12, 31), SUPPORT, required_count=2)
+    db.add_fixed_event(date(2026, 1, 13), SUPPORT, shift=1, required_count=1)
+    db.add_fixed_event(date(2026, 1, 13), SUPPORT, shift=2, required_count=1)
+    db.add_fixed_event(date(2026, 1, 20), SUPPORT, required_count=3)
+    db.add_fixed_event(date(2025, 11, 30), SUPPORT)                        # вне диапазона
+    yield employees
+    db.close_all()
+
+def test_load_absences_range(roster):
+    names = [e["name"] for e in roster]
+    absences = db.load_absences_range((2025, 12), (2026, 1), names)
+    assert sorted(absences) == [(2025, 12), (2026, 1)]
+    cells = {(ym, name, d): shift
+             for ym, matrix in absences.items() for name in names
+             for d, shift, _duty in matrix.iter_row(matrix.index(name)) if shift}
+    expected = {((2025, 12), "E0", d): "ОТП" for d in range(28, 32)}
+    expected.update({((2026, 1), "E0", d): "ОТП" for d in range(1, 5)})
+    expected[((2025, 12), "E1", 1)] = "БОЛ"
+    expected[((2026, 1), "E2", 10)] = "КМД"
+    assert cells == expected
+    # тот же месяц отдельно и в другом порядке строк
+    single = db.load_absences(2026, 1, names[::-1])
+    assert single.names == names[::-1] and single.shift_at(single.index("E0"), 4) == "ОТП"
+    db.set_absence("E0", date(2026, 1, 1), date(2026, 1, 4), None)
+    assert db.load_absences(2026, 1, names).shift_at(0, 1) == ""
+    assert db.load_absences(2025, 12, names).shift_at(0, 31) == "ОТП"
+
+def test_load_fixed_events_range(roster):
+    events = db.load_fixed_events_range((2025, 12), (2026, 1))
+    assert events == {
+        (2025, 12): {31: [{"shift": None, "type": SUPPORT, "required_count": 2}]},
+        (2026, 1): {13: [{"shift": 1, "type": SUPPORT, "required_count": 1},
+                        {"shift": 2, "type": SUPPORT, "required_count": 1}],
+                    20: [{"shift": None, "type": SUPPORT, "required_count": 3}]},
+    }
+    assert db.load_fixed_events(2026, 2) == {}
+
+@pytest.mark.parametrize("duty", ["greedy", "flow"])
+@pytest.mark.parametrize("engine", [None, generate_schedule_np])
+def test_generation_honours_them(roster, duty, engine):
+    names = [e["name"] for e in roster]
+    start, end = (2025, 12), (2026, 1)
+    absences = db.load_absences_range(start, end, names)
+    events = db.load_fixed_events_range(start, end)
+    for y, m, schedule in generate_horizon(roster, start, 2, {}, absences, events, duty, engine):
+        away = absences[(y, m)]
+        for r, name in enumerate(names):
+            for d, shift, on_duty in schedule.iter_row(r):
+                code = away.shift_at(away.index(name), d)
+                if code:
+                    # отсутствующий — ни смены, ни дежурства, ни ОБЕС
+                    assert code in ABSENCE_CODES and shift == code and not on_duty
+                if shift == SUPPORT:
+                    assert roster[r]["can_support"] and not on_duty
+        for d in range(1, schedule.num_days + 1):
+            need = sum(ev["required_count"] for ev in events[(y, m)].get(d, ()))
+            assert sum(1 for r in range(len(names)) if schedule.shift_at(r, d) == SUPPORT) == need
@@ -0,0 +1,53 @@
+# test_batch.py — пакетная генерация: месяцы подряд, запись в базу отдела, итоги переходят из месяца в месяц
+import json
+
+import pytest
+
+import batch
+import cache
+import db
+from logic import generate_horizon
+from logic_np import generate_schedule_np
+
+EMPLOYEES = [{"name": f"E{i}", "part_time": i == 5, "can_duty": i != 3, "can_support": True} for i in range(8)]
+
+@pytest.fixture
+def roster(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", db.DB_PATH)      # batch.run переключает DB_PATH на базы отделов
+    cache.clear(disk=False)
+    path = tmp_path / "отдел.json"
+    path.write_text(json.dumps({"employees": EMPLOYEES}, ensure_ascii=False), encoding="utf-8")
+    yield path
+    db.close_all()
+
+MONTHS = [(2025, 11), (2025, 12), (2026, 1)]
+
+def test_run_saves_months_and_summary(roster):
+    summary = batch.run([(roster, y, m) for y, m in MONTHS], workers=1)
+    assert [(s["year"], s["month"], s["status"]) for s in summary] == [(y, m, "ok") for y, m in MONTHS]
+
+    state = {}
+    expected = list(generate_horizon(EMPLOYEES, MONTHS[0], len(MONTHS), state, duty="flow", engine=generate_schedule_np))
+    db.DB_PATH = roster.with_suffix(".db")
+    names = [e["name"] for e in EMPLOYEES]
+    for y, m, schedule in expected:
+        assert db.load_month_schedule(y, m, names) == schedule
+    assert db.load_summary(*MONTHS[-1]) == state
+    assert db.load_summary(*MONTHS[0]) != state     # итоги пишутся за каждый месяц, а не только за последний
+
+    # тот же запуск ещё раз — все месяцы из кэша, результат тот же
+    db.close_all()
+    again = batch.run([(roster, y, m) for y, m in MONTHS], workers=1)
+    assert [s["status"] for s in again] == ["cached"] * len(MONTHS)
+    db.DB_PATH = roster.with_suffix(".db")
+    assert db.load_summary(*MONTHS[-1]) == state
+
+def test_plan_jobs_splits_gaps():
+    units = batch.plan_jobs([("a.db", 2026, 3), ("b.db", 2026, 1), ("a.db", 2026, 1), ("a.db", 2026, 2), ("a.db", 2026, 5)])
+    assert [(str(u["roster"]), u["start"], u["months"]) for u in units] == [
+        ("a.db", (2026, 1), 3), ("a.db", (2026, 5), 1), ("b.db", (2026, 1), 1)]
+
+def test_main_rejects_bad_month(capsys):
+    with pytest.raises(SystemExit):
+        batch.main(["x.json", "--start", "2026-13"])
+    assert "ожидается ГГГГ-ММ" in capsys.readouterr().err
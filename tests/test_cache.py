@@ -0,0 +1,26 @@
+# test_cache.py — доведённый график берётся из кэша, а не доводится заново
+import cache
+from logic import generate_schedule, update_state
+
+EMPLOYEES = [{"name": f"E{i}", "part_time": i % 5 == 4, "can_duty": i % 3 != 2} for i in range(10)]
+
+def test_optimized_hit_skips_optimizer(monkeypatch):
+    cache.clear(disk=False)
+    calls = []
+    optimize = cache.optimize_schedule
+    monkeypatch.setattr(cache, "optimize_schedule", lambda *a, **kw: calls.append(a) or optimize(*a, **kw))
+    before = {}
+    update_state(before, generate_schedule(EMPLOYEES, 2026, 4))
+    first_state = {n: dict(st) for n, st in before.items()}
+    first = cache.generate_cached(EMPLOYEES, 2026, 5, duty="flow", state=first_state, disk=False, optimize=0.2)
+    second_state = {n: dict(st) for n, st in before.items()}
+    second = cache.generate_cached(EMPLOYEES, 2026, 5, duty="flow", state=second_state, disk=False, optimize=0.2)
+    assert len(calls) == 1
+    assert second.to_dict() == first.to_dict()
+    assert second_state == first_state == update_state({n: dict(st) for n, st in before.items()}, first)
+
+def test_budget_and_seed_are_part_of_key():
+    keys = {cache.schedule_key(EMPLOYEES, 2026, 5, optimize=budget, seed=seed)
+            for budget, seed in ((0.0, 0), (1.0, 0), (2.0, 0), (1.0, 1))}
+    assert len(keys) == 4
+    assert cache.schedule_key(EMPLOYEES, 2026, 5, optimize=0.0, seed=7) == cache.schedule_key(EMPLOYEES, 2026, 5)
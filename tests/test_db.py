@@ -0,0 +1,96 @@
+# test_db.py — соединения по потокам и целостность связей в базе
+import sqlite3
+import threading
+
+import pytest
+
+import db
+from logic import generate_schedule
+
+@pytest.fixture(params=["rows", "packed"])
+def fresh_db(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "scheduler.db")
+    monkeypatch.setattr(db, "STORAGE", request.param)
+    db.init_db()
+    yield request.param
+    db.close_all()
+
+def in_thread(fn):
+    result = []
+    t = threading.Thread(target=lambda: result.append(fn()))
+    t.start()
+    t.join()
+    return result[0]
+
+def test_connection_reused_within_thread(fresh_db):
+    conn = db.get_conn()
+    assert db.get_conn() is conn
+    other = in_thread(db.get_conn)
+    assert other is not conn
+    db.close_conn()
+    assert db.get_conn() is not conn
+
+def test_close_all_closes_other_threads(fresh_db):
+    worker_started, worker_resume = threading.Event(), threading.Event()
+    seen = {}
+
+    def worker():
+        seen["first"] = db.get_conn()
+        worker_started.set()
+        worker_resume.wait()
+        # после close_all поток не получает закрытое соединение, а открывает новое
+        seen["second"] = db.get_conn()
+        seen["count"] = seen["second"].execute("SELECT COUNT(*) FROM employees").fetchone()[0]
+
+    t = threading.Thread(target=worker)
+    t.start()
+    worker_started.wait()
+    db.close_all()
+    with pytest.raises(sqlite3.ProgrammingError):
+        seen["first"].execute("SELECT 1")
+    worker_resume.set()
+    t.join()
+    assert seen["second"] is not seen["first"]
+    assert seen["count"] == len(db.load_employees())
+
+def test_remove_employee_cascades(fresh_db):
+    employees = db.load_employees()
+    names = [e["name"] for e in employees]
+    db.save_month_schedule(2026, 3, generate_schedule(employees, 2026, 3))
+    table = "schedule" if fresh_db == "rows" else "schedule_packed"
+    conn = db.get_conn()
+    emp_id = conn.execute("SELECT id FROM employees WHERE name=?", (names[0],)).fetchone()[0]
+    assert conn.execute(f"SELECT COUNT(*) FROM {table} WHERE emp_id=?", (emp_id,)).fetchone()[0] > 0
+
+    db.remove_employee(names[0])
+    assert conn.execute(f"SELECT COUNT(*) FROM {table} WHERE emp_id=?", (emp_id,)).fetchone()[0] == 0
+    assert conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] > 0
+    assert names[0] not in db.load_month_schedule(2026, 3).names
+
+def test_diff_save_stats(fresh_db):
+    employees = db.load_employees()
+    names = [e["name"] for e in employees]
+    schedule = generate_schedule(employees, 2026, 3)
+    cells = len(names) * schedule.num_days
+    filled = sum(len(schedule.row_bytes(r)) - schedule.row_bytes(r).count(0) for r in range(len(names)))
+    assert db.save_month_schedule(2026, 3, schedule, diff=True) == {
+        "inserted": filled, "updated": 0, "unchanged": cells - filled}
+
+    # ничего не изменилось — ни одной записи
+    conn = db.get_conn()
+    before = conn.total_changes
+    assert db.save_month_schedule(2026, 3, schedule, diff=True) == {"inserted": 0, "updated": 0, "unchanged": cells}
+    assert conn.total_changes == before
+
+    edited = schedule.copy()
+    edited.set_cell(0, 1, "В", False)
+    edited.set_cell(1, 2, "ОТП", False)
+    edited.set_cell(1, 3, duty=not schedule.duty_at(1, 3))
+    assert db.save_month_schedule(2026, 3, edited, diff=True) == {"inserted": 0, "updated": 3, "unchanged": cells - 3}
+    assert db.load_month_schedule(2026, 3, names) == edited
+
+def test_full_save_returns_nothing(fresh_db):
+    employees = db.load_employees()
+    schedule = generate_schedule(employees, 2026, 3)
+    assert db.save_month_schedule(2026, 3, schedule) is None
+    assert db.load_month_schedule(2026, 3, [e["name"] for e in employees]) == schedule
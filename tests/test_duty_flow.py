@@ -0,0 +1,91 @@
+# test_duty_flow.py — assign_duties: смены не трогает, по дежурному на смену, правила соседних дней
+import random
+
+import pytest
+
+from duty_flow import assign_duties
+from helpers import random_roster
+from logic import generate_schedule, update_state
+from matrix import ScheduleMatrix, SHIFT_INDEX, DUTY_BIT, SHIFT_MASK
+
+S1, S2 = SHIFT_INDEX["1"], SHIFT_INDEX["2"]
+
+def check(employees, source, result, state=None):
+    eligible = [not e["part_time"] and e["can_duty"] for e in employees]
+    nd = source.num_days
+
+    def working(i, code):
+        """Кто может дежурить в смене code дня i (i = -1 — прошлый месяц: там уже не выбрать)."""
+        return [r for r in range(len(employees)) if eligible[r] and result.row_bytes(r)[i] & SHIFT_MASK == code]
+
+    for r in range(len(employees)):
+        got, was = result.row_bytes(r), source.row_bytes(r)
+        assert bytes(b & SHIFT_MASK for b in got) == bytes(b & SHIFT_MASK for b in was)
+        if not eligible[r]:
+            assert not any(b & DUTY_BIT for b in got)
+        last = (state or {}).get(employees[r]["name"]) or {}
+        prev = (SHIFT_INDEX.get(last.get("last_shift") or "", 0) | (DUTY_BIT if last.get("last_duty") else 0))
+        for i, b in enumerate(got):
+            # 1-я после дежурства во 2-ю — только если в обоих слотах больше некому
+            if prev == S2 | DUTY_BIT and b == S1 | DUTY_BIT:
+                assert working(i, S1) == [r] and (i == 0 or working(i - 1, S2) == [r])
+            prev = b
+    for i in range(nd):
+        for code in (S1, S2):
+            on_duty = [r for r in working(i, code) if result.row_bytes(r)[i] & DUTY_BIT]
+            assert len(on_duty) == (1 if working(i, code) else 0)
+
+@pytest.mark.parametrize("seed", range(15))
+def test_assign_duties(seed):
+    rnd = random.Random(seed)
+    employees = random_roster(rnd, rnd.randint(4, 40))
+    source = generate_schedule(employees, 2026, rnd.randint(1, 12))
+    check(employees, source, assign_duties(employees, source))
+
+@pytest.mark.parametrize("seed", range(10))
+def test_assign_duties_with_state(seed):
+    rnd = random.Random(seed)
+    employees = random_roster(rnd, rnd.randint(4, 40))
+    month = rnd.randint(2, 12)
+    state = {}
+    update_state(state, generate_schedule(employees, 2026, month - 1))
+    for st in state.values():
+        if rnd.random() < 0.4:
+            st.update(last_shift="2", last_duty=True)
+    source = generate_schedule(employees, 2026, month, state={n: dict(st) for n, st in state.items()})
+    before = {n: dict(st) for n, st in state.items()}
+    check(employees, source, assign_duties(employees, source, state), state)
+    assert state == before
+
+def test_more_even_than_greedy():
+    rnd = random.Random(7)
+    employees = random_roster(rnd, 30)
+    greedy = generate_schedule(employees, 2026, 5)
+    flow = assign_duties(employees, greedy)
+
+    def spread(schedule):
+        counts = [sum(1 for b in schedule.row_bytes(r) if b & DUTY_BIT)
+                  for r, e in enumerate(employees) if not e["part_time"] and e["can_duty"]]
+        return max(counts) - min(counts)
+    assert spread(flow) <= spread(greedy)
+
+def test_after_shift2_duty_is_hard():
+    """Ровность не перевешивает запрет: у A дежурств намного меньше, но вчера A дежурил во 2-й."""
+    employees = [{"name": n, "part_time": False, "can_duty": True} for n in ("A", "B", "C")]
+    source = ScheduleMatrix([e["name"] for e in employees], 2026, 2)
+    for d in range(1, 29):
+        source.set_cell(0, d, "1")
+        source.set_cell(1, d, "1")
+        source.set_cell(2, d, "2")
+    state = {"A": {"shift2": 0, "duty": 0, "support": 0, "last_shift": "2", "last_duty": True},
+             "B": {"shift2": 0, "duty": 300, "support": 0, "last_shift": "1", "last_duty": False},
+             "C": {"shift2": 0, "duty": 0, "support": 0, "last_shift": "2", "last_duty": False}}
+    result = assign_duties(employees, source, state)
+    assert result.duty_at(1, 1) and not result.duty_at(0, 1)
+    check(employees, source, result, state)
+
+    # в 1-й смене первого дня только A — слот всё же закрывается им
+    source.set_cell(1, 1, "В")
+    result = assign_duties(employees, source, state)
+    assert result.duty_at(0, 1)
+    check(employees, source, result, state)
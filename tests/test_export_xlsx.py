@@ -0,0 +1,74 @@
+# test_export_xlsx.py — книга из export_schedules читается обратно: лист на месяц, шапка и коды ячеек
+import random
+from datetime import date
+
+import pytest
+
+openpyxl = pytest.importorskip("openpyxl")
+
+import db
+import export_xlsx
+from helpers import random_roster
+from logic import generate_horizon
+
+@pytest.fixture
+def months():
+    employees = random_roster(random.Random(5), 9)
+    return list(generate_horizon(employees, (2025, 12), 2))
+
+def read_back(path):
+    return openpyxl.load_workbook(path)
+
+def test_sheet_per_month(tmp_path, months):
+    path = tmp_path / "out.xlsx"
+    assert export_xlsx.export_schedules(path, (s for _y, _m, s in months)) == 2
+    assert read_back(path).sheetnames == ["2025-12", "2026-01"]
+
+def test_header_and_cells(tmp_path, months):
+    path = tmp_path / "out.xlsx"
+    export_xlsx.export_schedules(path, [s for _y, _m, s in months])
+    wb = read_back(path)
+    for _y, _m, schedule in months:
+        ws = wb[f"{schedule.year}-{schedule.month:02d}"]
+        nd = schedule.num_days
+        merged = {str(r) for r in ws.merged_cells.ranges}
+        assert "A1:A2" in merged
+        assert len(merged) == 1 + nd
+        assert ws.cell(1, 1).value == "Сотрудник"
+        for d in range(1, nd + 1):
+            col = 2 + (d - 1) * 2
+            assert ws.cell(1, col).value == d
+            assert (ws.cell(2, col).value, ws.cell(2, col + 1).value) == ("Смена", "Деж.")
+            weekend = date(schedule.year, schedule.month, d).weekday() >= 5
+            assert (ws.cell(1, col).style == "График: выходной") == weekend
+        assert ws.max_row == 2 + len(schedule.names)
+        for row, name in enumerate(schedule.names):
+            r = 3 + row
+            assert ws.cell(r, 1).value == name
+            for d, shift, duty in schedule.iter_row(row):
+                col = 2 + (d - 1) * 2
+                assert (ws.cell(r, col).value or "") == shift
+                assert ws.cell(r, col + 1).value == ("Д" if duty else None)
+                if shift in export_xlsx.SHIFT_STYLE:
+                    assert ws.cell(r, col).style == export_xlsx.SHIFT_STYLE[shift]
+
+def test_empty_export(tmp_path):
+    path = tmp_path / "out.xlsx"
+    assert export_xlsx.export_schedules(path, []) == 0
+    assert read_back(path).sheetnames == ["График"]
+
+def test_export_range_from_db(tmp_path, monkeypatch, months):
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "scheduler.db")
+    db.init_db(seed=False)
+    try:
+        db.upsert_employees(random_roster(random.Random(5), 9))
+        for y, m, schedule in months:
+            db.save_month_schedule(y, m, schedule)
+        path = tmp_path / "range.xlsx"
+        assert export_xlsx.export_range(path, (2025, 11), (2026, 1)) == 3
+        wb = read_back(path)
+        assert wb.sheetnames == ["2025-11", "2025-12", "2026-01"]
+        assert wb["2025-11"].max_row == 2 + 9          # несохранённый месяц — пустые строки сотрудников
+        assert wb["2026-01"].cell(3, 2).value == (months[1][2].shift_at(0, 1) or None)
+    finally:
+        db.close_all()
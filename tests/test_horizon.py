@@ -0,0 +1,64 @@
+# test_horizon.py — генерация на несколько месяцев вперёд и перенос итогов между месяцами
+import copy
+import random
+
+import pytest
+
+import db
+from helpers import random_roster
+from logic import generate_horizon
+from logic_np import generate_schedule_np
+
+@pytest.mark.parametrize("engine", [None, generate_schedule_np])
+@pytest.mark.parametrize("duty", ["greedy", "flow"])
+@pytest.mark.parametrize("split", [1, 2, 3])
+def test_split_equals_single_run(engine, duty, split):
+    employees = random_roster(random.Random(split), 14)
+    start, months = (2025, 11), 4
+    whole_state = {}
+    whole = list(generate_horizon(employees, start, months, whole_state, duty=duty, engine=engine))
+
+    state = {}
+    first = list(generate_horizon(employees, start, split, state, duty=duty, engine=engine))
+    carried = copy.deepcopy(state)
+    second = list(generate_horizon(employees, whole[split][:2], months - split, carried, duty=duty, engine=engine))
+    assert [(y, m) for y, m, _s in first + second] == [(y, m) for y, m, _s in whole]
+    assert [s for _y, _m, s in first + second] == [s for _y, _m, s in whole]
+    assert carried == whole_state
+
+def test_state_accumulates_totals():
+    employees = random_roster(random.Random(7), 10)
+    state = {}
+    months = list(generate_horizon(employees, (2025, 12), 2, state))
+    for e in employees:
+        cells = [(shift, duty) for _y, _m, s in months for _d, shift, duty in s.iter_row(s.index(e["name"]))]
+        st = state[e["name"]]
+        assert st["shift2"] == sum(shift == "2" for shift, _ in cells)
+        assert st["duty"] == sum(duty for _, duty in cells)
+        assert st["last_shift"] == cells[-1][0]
+        assert st["last_duty"] == cells[-1][1]
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "scheduler.db")
+    db.init_db(seed=False)
+    yield
+    db.close_all()
+
+def test_summary_round_trip(fresh_db):
+    employees = random_roster(random.Random(3), 8)
+    db.upsert_employees(employees)
+    state = {}
+    *_, (y, m, _schedule) = generate_horizon(employees, (2026, 1), 2, state, duty="flow")
+    assert any(st["last_duty"] for st in state.values())
+    assert {st["last_shift"] for st in state.values()} >= {"1", "2"}
+
+    db.save_summary(y, m, state)
+    assert db.load_summary(y, m) == state
+    assert db.load_summary(y, m - 1) == {}
+
+    # повторное сохранение перезаписывает итоги, а не добавляет строки
+    name = employees[0]["name"]
+    state[name] = {"shift2": 99, "duty": 0, "support": 5, "last_shift": "ОТП", "last_duty": False}
+    db.save_summary(y, m, state)
+    assert db.load_summary(y, m) == state
@@ -0,0 +1,51 @@
+# test_journal.py — несвёрнутые правки edit_journal видны при загрузке месяца в обеих раскладках
+import pytest
+
+import db
+from logic import generate_schedule
+
+@pytest.fixture(params=["rows", "packed"])
+def layout(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "scheduler.db")
+    monkeypatch.setattr(db, "STORAGE", request.param)
+    db.init_db()
+    yield request.param
+    db.close_all()
+
+def journal_size():
+    return db.get_conn().execute("SELECT COUNT(*) FROM edit_journal").fetchone()[0]
+
+def test_overlay(layout):
+    assert db.storage() == layout
+    employees = db.load_employees()
+    names = [e["name"] for e in employees]
+    schedule = generate_schedule(employees, 2026, 5)
+    db.save_month_schedule(2026, 5, schedule)
+    old = (schedule.shift_at(3, 4), schedule.duty_at(3, 4))
+    # последняя правка ячейки побеждает; правки других месяцев не мешают
+    db.append_journal(2026, 5, names, [(3, 4) + old + ("В", False), (3, 4, "В", False, "КМД", False),
+                                       (5, 31, schedule.shift_at(5, 31), schedule.duty_at(5, 31), "1", True)])
+    db.append_journal(2026, 6, names, [(2, 1, "", False, "2", False)])
+    loaded = db.load_month_schedule(2026, 5, names)
+    expected = generate_schedule(employees, 2026, 5)
+    expected.set_cell(3, 4, "КМД", False)
+    expected.set_cell(5, 31, "1", True)
+    assert loaded.to_dict() == expected.to_dict()
+    # месяц без сохранённого графика: строки — только у тех, кого правили
+    june = db.load_month_schedule(2026, 6)
+    assert june.names == [names[2]] and june.shift_at(0, 1) == "2"
+
+    assert db.compact_journal() == 3
+    assert journal_size() == 0
+    assert db.load_month_schedule(2026, 5, names).to_dict() == expected.to_dict()
+    assert db.load_month_schedule(2026, 6).to_dict() == june.to_dict()
+
+def test_save_absorbs_journal(layout):
+    employees = db.load_employees()
+    names = [e["name"] for e in employees]
+    schedule = generate_schedule(employees, 2026, 5)
+    db.save_month_schedule(2026, 5, schedule)
+    db.append_journal(2026, 5, names, [(3, 4, schedule.shift_at(3, 4), schedule.duty_at(3, 4), "КМД", False)])
+    db.save_month_schedule(2026, 5, schedule, diff=True)
+    assert journal_size() == 0
+    assert db.load_month_schedule(2026, 5, names).to_dict() == schedule.to_dict()
@@ -0,0 +1,43 @@
+# test_logic.py — жадный генератор: отсутствия и события ОБЕС
+import random
+
+import pytest
+
+from helpers import random_roster
+from logic import generate_schedule, add_months, iter_months, parse_month, SUPPORT
+
+@pytest.mark.parametrize("shift", ["1", "2"])
+@pytest.mark.parametrize("seed", range(10))
+def test_shift_support_comes_from_that_shift(seed, shift):
+    rnd = random.Random(seed)
+    employees = random_roster(rnd, rnd.randint(6, 30), can_support=0.6)
+    y, m, day, need = 2026, rnd.randint(1, 12), rnd.randint(1, 28), rnd.randint(1, 3)
+    base = generate_schedule(employees, y, m)
+    result = generate_schedule(employees, y, m, fixed_events={day: [{"shift": int(shift), "type": SUPPORT,
+                                                                     "required_count": need}]})
+    rows = range(len(employees))
+    pool = [r for r in rows if base.shift_at(r, day) == shift and employees[r]["can_support"]]
+    support = [r for r in rows if result.shift_at(r, day) == SUPPORT]
+    assert set(support) <= set(pool) and len(support) == min(need, len(pool))
+    assert not any(result.duty_at(r, day) for r in support)
+    other = "2" if shift == "1" else "1"
+    assert [r for r in rows if result.shift_at(r, day) == other] == [r for r in rows if base.shift_at(r, day) == other]
+    for d in range(1, day):
+        assert [result.shift_at(r, d) for r in rows] == [base.shift_at(r, d) for r in rows]
+
+def test_whole_day_support_before_shifts():
+    employees = random_roster(random.Random(3), 20)
+    result = generate_schedule(employees, 2026, 3, fixed_events={10: [{"shift": None, "type": SUPPORT, "required_count": 3}]})
+    assert sum(1 for r in range(20) if result.shift_at(r, 10) == SUPPORT) == 3
+
+def test_iter_months():
+    assert list(iter_months((2025, 11), (2026, 2))) == [(2025, 11), (2025, 12), (2026, 1), (2026, 2)]
+    assert list(iter_months((2026, 3), (2026, 3))) == [(2026, 3)]
+    assert list(iter_months((2026, 3), (2026, 2))) == []
+    assert list(iter_months((2026, 1), (2026, 12)))[-1] == add_months(2026, 1, 11)
+
+def test_parse_month():
+    assert parse_month("2026-03") == (2026, 3)
+    for text in ("2026-13", "2026-0", "0-01", "2026", "март", None):
+        with pytest.raises(ValueError):
+            parse_month(text)
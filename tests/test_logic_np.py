@@ -0,0 +1,74 @@
+# test_logic_np.py — logic_np даёт тот же график, что logic.generate_schedule
+import calendar
+import random
+
+import pytest
+
+from helpers import random_roster
+from logic import generate_schedule, update_state
+from logic_np import generate_arrays, generate_schedule_np, to_matrix
+import matrix
+from matrix import ScheduleMatrix
+
+ABSENCE_CODES = sorted(matrix.ABSENCE_CODES)
+
+def random_absences(rnd, names, y, m):
+    """{name: {day: код}} — у трети людей один отрезок отсутствия."""
+    nd = calendar.monthrange(y, m)[1]
+    absences = {}
+    for name in names:
+        if rnd.random() < 0.3:
+            start, length, code = rnd.randint(1, nd), rnd.randint(1, 14), rnd.choice(ABSENCE_CODES)
+            absences[name] = {d: code for d in range(start, min(nd, start + length) + 1)}
+    return absences
+
+def as_matrix(absences, names, y, m):
+    """То же в виде db.load_absences."""
+    result = ScheduleMatrix(names, y, m)
+    for name, days in absences.items():
+        for d, code in days.items():
+            result.set_cell(result.index(name), d, code)
+    return result
+
+def random_events(rnd, y, m):
+    nd = calendar.monthrange(y, m)[1]
+    return {d: [{"shift": rnd.choice((None, None, 1, 2)), "type": "ОБЕС", "required_count": rnd.randint(1, 3)}]
+            for d in range(1, nd + 1) if rnd.random() < 0.3}
+
+def random_inputs(seed):
+    rnd = random.Random(seed)
+    employees = random_roster(rnd, rnd.choice((1, 3, 8, 20, 60)), can_support=0.7)
+    y, m = rnd.choice((2024, 2025, 2026)), rnd.randint(1, 12)
+    names = [e["name"] for e in employees]
+    return rnd, employees, y, m, random_absences(rnd, names, y, m), random_events(rnd, y, m)
+
+@pytest.mark.parametrize("duty", ["greedy", "flow"])
+@pytest.mark.parametrize("seed", range(15))
+def test_same_schedule(seed, duty):
+    _rnd, employees, y, m, absences, events = random_inputs(seed)
+    names = [e["name"] for e in employees]
+    expected = generate_schedule(employees, y, m, absences, events, duty=duty)
+    assert generate_schedule_np(employees, y, m, as_matrix(absences, names, y, m), events, duty=duty) == expected
+
+@pytest.mark.parametrize("duty", ["greedy", "flow"])
+@pytest.mark.parametrize("seed", range(10))
+def test_same_schedule_with_state(seed, duty):
+    rnd, employees, y, m, absences, events = random_inputs(seed)
+    before = {}
+    update_state(before, generate_schedule(employees, y, m, duty=duty))
+    for st in before.values():
+        if rnd.random() < 0.3:
+            st.update(last_shift="2", last_duty=True)
+    state_py = {n: dict(st) for n, st in before.items()}
+    state_np = {n: dict(st) for n, st in before.items()}
+    expected = generate_schedule(employees, y, m, absences, events, duty=duty, state=state_py)
+    assert generate_schedule_np(employees, y, m, absences, events, duty=duty, state=state_np) == expected
+    assert state_np == state_py
+
+@pytest.mark.parametrize("seed", range(10))
+def test_to_matrix(seed):
+    _rnd, employees, y, m, absences, events = random_inputs(seed)
+    _days, shifts, duty = generate_arrays(employees, y, m, absences=absences, fixed_events=events)
+    result = to_matrix([e["name"] for e in employees], y, m, shifts, duty)
+    assert result == generate_schedule(employees, y, m, absences, events)
+    assert shifts.shape == duty.shape == (len(employees), calendar.monthrange(y, m)[1])
@@ -0,0 +1,78 @@
+# test_matrix.py — ScheduleMatrix: упаковка ячеек в байты и Mapping-доступ для старого кода
+import pickle
+
+import pytest
+
+from matrix import ScheduleMatrix, SHIFT_CODES, SHIFT_INDEX, DUTY_BIT, SHIFT_MASK
+
+NAMES = ["Аня", "Борис", "Вера"]
+
+@pytest.fixture
+def m():
+    m = ScheduleMatrix(NAMES, 2026, 2)
+    m.set_cell(0, 1, "1", True)
+    m.set_cell(1, 1, "2")
+    m.set_cell(2, 28, "ОБЕС")
+    m.set_cell(1, 14, "ОТП")
+    return m
+
+def test_packing(m):
+    assert m.num_days == 28
+    assert m.row_bytes(0)[0] == SHIFT_INDEX["1"] | DUTY_BIT
+    assert m.row_bytes(1)[0] == SHIFT_INDEX["2"]
+    assert m.row_bytes(2)[27] == SHIFT_INDEX["ОБЕС"]
+    assert all(code & DUTY_BIT == 0 and code <= SHIFT_MASK for code in SHIFT_INDEX.values())
+    assert len(SHIFT_CODES) <= SHIFT_MASK + 1
+
+def test_set_cell_keeps_other_half(m):
+    m.set_cell(0, 1, "2")                   # смена меняется — дежурство остаётся
+    assert (m.shift_at(0, 1), m.duty_at(0, 1)) == ("2", True)
+    m.set_cell(0, 1, duty=False)            # дежурство снимается — смена остаётся
+    assert (m.shift_at(0, 1), m.duty_at(0, 1)) == ("2", False)
+    m.set_cell(0, 1, "", True)
+    assert m.row_bytes(0)[0] == DUTY_BIT
+    with pytest.raises(ValueError):
+        m.set_cell(0, 1, "3")
+
+def test_mapping_view(m):
+    assert list(m) == NAMES and len(m) == 3
+    assert "Борис" in m and "Гена" not in m
+    row = m["Аня"]
+    assert len(row) == 28 and list(row) == list(range(1, 29))
+    assert row[1] == {"shift": "1", "duty": True}
+    assert row[2] == {"shift": "", "duty": False}
+    assert m["Борис"][14]["shift"] == "ОТП"
+    for bad in (0, 29, "1", None):
+        with pytest.raises(KeyError):
+            row[bad]
+    with pytest.raises(KeyError):
+        m["Гена"]
+    assert list(m.iter_row(2))[-1] == (28, "ОБЕС", False)
+
+def test_from_mapping_round_trip(m):
+    again = ScheduleMatrix.from_mapping(NAMES, 2026, 2, m.to_dict())
+    assert again == m
+    partial = ScheduleMatrix.from_mapping(NAMES, 2026, 2, {"Вера": {28: {"shift": "ОБЕС"}}})
+    assert partial.shift_at(2, 28) == "ОБЕС" and partial.row_bytes(0) == bytes(28)
+
+def test_copy_is_independent(m):
+    c = m.copy()
+    assert c == m and c is not m
+    c.set_cell(1, 1, "В", True)
+    assert m["Борис"][1] == {"shift": "2", "duty": False}
+    assert c != m
+
+def test_pickle(m):
+    again = pickle.loads(pickle.dumps(m))
+    assert isinstance(again, ScheduleMatrix)
+    assert (again.year, again.month, again.names) == (2026, 2, NAMES)
+    assert [again.row_bytes(r) for r in range(3)] == [m.row_bytes(r) for r in range(3)]
+    assert again.index("Вера") == 2
+    again.set_cell(2, 1, "1")
+    assert m.shift_at(2, 1) == ""
+
+def test_is_empty():
+    m = ScheduleMatrix(NAMES, 2024, 2)
+    assert m.num_days == 29 and m.is_empty()
+    m.set_cell(1, 29, duty=True)
+    assert not m.is_empty()
@@ -0,0 +1,77 @@
+# test_optimize.py — доводка отжигом не нарушает жёстких правил жадного генератора
+import random
+
+import pytest
+
+from helpers import random_roster
+from logic import generate_schedule, update_state
+from matrix import SHIFT_INDEX, DUTY_BIT
+from optimize import generate_optimized, optimize_schedule, schedule_cost
+
+D1, D2 = SHIFT_INDEX["1"] | DUTY_BIT, SHIFT_INDEX["2"] | DUTY_BIT
+
+def after2_pairs(schedule):
+    """Пары дней «дежурство во 2-й, наутро дежурство в 1-й» у одного сотрудника."""
+    return sum(1 for r in range(len(schedule.names))
+               for a, b in zip(schedule.row_bytes(r), schedule.row_bytes(r)[1:]) if a == D2 and b == D1)
+
+@pytest.mark.parametrize("seed", range(40))
+def test_no_duty1_after_duty2(seed):
+    rnd = random.Random(seed)
+    employees = random_roster(rnd, rnd.randint(6, 20), can_duty=0.85)
+    schedule = generate_schedule(employees, 2026, rnd.randint(1, 12))
+    assert after2_pairs(schedule) == 0
+    result, _info = optimize_schedule(employees, schedule, budget=60, seed=seed, max_moves=100000)
+    assert after2_pairs(result) == 0
+
+def carried_state(employees, rnd, month):
+    """Итоги после сгенерированного прошлого месяца; у части людей последний день — дежурство во 2-й."""
+    state = {}
+    update_state(state, generate_schedule(employees, 2026, month - 1, state={}))
+    for name, st in state.items():
+        if rnd.random() < 0.3:
+            st.update(last_shift="2", last_duty=True)
+    return state
+
+@pytest.mark.parametrize("seed", range(30))
+def test_month_boundary(seed):
+    rnd = random.Random(seed)
+    employees = random_roster(rnd, rnd.randint(6, 20), can_duty=0.85)
+    month = rnd.randint(2, 12)
+    carried = carried_state(employees, rnd, month)
+    state = {n: dict(st) for n, st in carried.items()}
+    schedule = generate_schedule(employees, 2026, month, state={n: dict(st) for n, st in carried.items()})
+    # без штрафа за дежурства подряд правило на стыке месяцев держится только запретом хода
+    weights = {"duty_b2b": 0.0}
+    result, info = optimize_schedule(employees, schedule, budget=60, seed=seed, max_moves=50000,
+                                     weights=weights, state=state)
+    assert state == carried
+    assert info["cost_after"] == pytest.approx(schedule_cost(employees, result, weights, state=carried))
+    for r, name in enumerate(result.names):
+        if carried[name]["last_shift"] == "2" and carried[name]["last_duty"]:
+            assert result.row_bytes(r)[0] != D1
+
+@pytest.mark.parametrize("seed", range(5))
+def test_generate_optimized_keeps_inputs(seed):
+    rnd = random.Random(seed)
+    employees = random_roster(rnd, 15, can_duty=0.85)
+    names = [e["name"] for e in employees]
+    absences = {names[0]: {d: "ОТП" for d in range(3, 10)}, names[1]: {1: "БОЛ", 2: "БОЛ"}}
+    events = {5: [{"type": "ОБЕС", "shift": None, "required_count": 2}],
+              12: [{"type": "ОБЕС", "shift": 2, "required_count": 1}]}
+    carried = carried_state(employees, rnd, 4)
+    state = {n: dict(st) for n, st in carried.items()}
+    result = generate_optimized(employees, 2026, 4, absences, events, state=state, budget=0.2, seed=seed)
+
+    greedy = generate_schedule(employees, 2026, 4, absences, events, state={n: dict(st) for n, st in carried.items()})
+    fixed = ("В", "ОТП", "БОЛ", "КМД", "ОБЕС")
+    for r in range(len(names)):
+        for d in range(1, 31):
+            if greedy.shift_at(r, d) in fixed or result.shift_at(r, d) in fixed:
+                assert result.shift_at(r, d) == greedy.shift_at(r, d)
+    assert [result.shift_at(0, d) for d in range(3, 10)] == ["ОТП"] * 7
+    assert sum(result.shift_at(r, 5) == "ОБЕС" for r in range(len(names))) == 2
+    for r, name in enumerate(names):
+        if carried[name]["last_shift"] == "2" and carried[name]["last_duty"]:
+            assert result.row_bytes(r)[0] != D1
+    assert state == update_state({n: dict(st) for n, st in carried.items()}, result)
@@ -0,0 +1,77 @@
+# test_repair.py — repair_schedule чинит только тронутые дни и не трогает закреплённое
+import random
+
+import pytest
+
+from helpers import random_roster
+from logic import generate_schedule, repair_schedule, update_state
+from matrix import SHIFT_INDEX, DUTY_BIT
+
+D1, D2 = SHIFT_INDEX["1"] | DUTY_BIT, SHIFT_INDEX["2"] | DUTY_BIT
+
+def holders(schedule, day, shift):
+    return [r for r in range(len(schedule.names)) if schedule.shift_at(r, day) == shift and schedule.duty_at(r, day)]
+
+@pytest.mark.parametrize("duty", ["greedy", "flow"])
+def test_consistent_schedule_unchanged(duty):
+    employees = random_roster(random.Random(1), 15)
+    schedule = generate_schedule(employees, 2026, 3, duty=duty)
+    assert repair_schedule(employees, schedule, range(1, schedule.num_days + 1)) == []
+
+@pytest.mark.parametrize("seed", range(15))
+def test_manual_edits(seed):
+    rnd = random.Random(seed)
+    employees = random_roster(rnd, rnd.randint(8, 40))
+    schedule = generate_schedule(employees, 2026, rnd.randint(1, 12))
+    nd = schedule.num_days
+    pins = set()
+    for _ in range(10):
+        r, d = rnd.randrange(len(employees)), rnd.randint(1, nd)
+        shift = schedule.shift_at(r, d)
+        if shift not in ("1", "2") or employees[r]["part_time"]:
+            continue
+        schedule.set_cell(r, d, "2" if shift == "1" else "1")
+        pins.add((r, d))
+        pinned = {(pr, pd): (schedule.shift_at(pr, pd), schedule.duty_at(pr, pd)) for pr, pd in pins}
+        before = schedule.to_dict()
+        changes = repair_schedule(employees, schedule, [d], pins)
+        assert schedule.to_dict() == before       # сам график не меняется
+        for cr, cd, new_shift, new_duty in changes:
+            assert (cr, cd) not in pins
+            assert cd in (d, d + 1)
+            schedule.set_cell(cr, cd, new_shift, new_duty)
+        assert {p: (schedule.shift_at(*p), schedule.duty_at(*p)) for p in pins} == pinned
+        for day in (d, d + 1):
+            if day > nd:
+                continue
+            for shift in ("1", "2"):
+                assert len(holders(schedule, day, shift)) <= 1
+            if day > 1:
+                for row in range(len(employees)):
+                    if (row, day) in pins or (row, day - 1) in pins:
+                        continue
+                    assert not (schedule.row_bytes(row)[day - 2] == D2 and schedule.row_bytes(row)[day - 1] == D1)
+
+@pytest.mark.parametrize("seed", range(5))
+def test_first_day_sees_previous_month(seed):
+    rnd = random.Random(seed)
+    employees = random_roster(rnd, 20, part_time=0.0, can_duty=1.0)
+    state = {}
+    update_state(state, generate_schedule(employees, 2026, 2))
+    schedule = generate_schedule(employees, 2026, 3, state={n: dict(st) for n, st in state.items()})
+    assert repair_schedule(employees, schedule, [1], state=state) == []
+
+    # вчера (28 февраля) r дежурил во 2-й — ставим его дежурным 1-й смены 1 марта
+    r = next(r for r in range(len(employees)) if schedule.shift_at(r, 1) == "1" and not schedule.duty_at(r, 1))
+    name = employees[r]["name"]
+    state[name].update(last_shift="2", last_duty=True)
+    for other in holders(schedule, 1, "1"):
+        schedule.set_cell(other, 1, duty=False)
+    schedule.set_cell(r, 1, duty=True)
+
+    assert repair_schedule(employees, schedule, [1]) == []      # без итогов прошлого месяца не видно
+    changes = {(cr, cd): (shift, duty) for cr, cd, shift, duty in repair_schedule(employees, schedule, [1], state=state)}
+    assert changes[(r, 1)] == ("1", False)
+    for (cr, cd), (shift, duty) in changes.items():
+        schedule.set_cell(cr, cd, shift, duty)
+    assert len(holders(schedule, 1, "1")) == 1 and r not in holders(schedule, 1, "1")
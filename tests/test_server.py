@@ -0,0 +1,200 @@
+# test_server.py — сервис по-настоящему: сервер на свободном порту, ответы читаются до EOF
+import asyncio
+import contextlib
+import io
+import json
+
+import pytest
+
+import cache
+import db
+import server
+
+TIMEOUT = 60    # секунд на ответ: ответ, который не заканчивается EOF, — ошибка, а не зависший тест
+
+@pytest.fixture
+def tmp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "scheduler.db")
+    cache.clear(disk=False)
+    yield
+
+@contextlib.asynccontextmanager
+async def running(workers=1):
+    service = server.Service(workers)
+    await service.db(db.init_db)
+    srv = await asyncio.start_server(service.handle, "127.0.0.1", 0)
+    try:
+        yield service, srv.sockets[0].getsockname()[:2]
+    finally:
+        srv.close()
+        await srv.wait_closed()
+        service.close()
+
+async def raw_request(addr, raw: bytes) -> bytes:
+    reader, writer = await asyncio.open_connection(*addr)
+    try:
+        writer.write(raw)
+        await writer.drain()
+        return await asyncio.wait_for(reader.read(), TIMEOUT)
+    finally:
+        writer.close()
+
+async def request(addr, method, target, payload=None):
+    """(статус, {заголовок: значение}, тело) — ответ, прочитанный до EOF."""
+    body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+    response = await raw_request(addr, f"{method} {target} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(body)}\r\n\r\n"
+                                 .encode("latin-1") + body)
+    head, _, body = response.partition(b"\r\n\r\n")
+    status_line, *lines = head.decode("latin-1").split("\r\n")
+    headers = {k.strip().lower(): v.strip() for k, _, v in (line.partition(":") for line in lines)}
+    return int(status_line.split()[1]), headers, body
+
+def test_first_generate_closes_connection(tmp_db):
+    async def scenario():
+        async with running() as (_service, addr):
+            for _ in range(3):
+                status, headers, body = await request(addr, "POST", "/generate", {"year": 2026, "month": 3})
+                assert status == 200 and headers["content-type"] == "application/json"
+                assert json.loads(body)["year"] == 2026
+    asyncio.run(scenario())
+
+@pytest.mark.parametrize("length", ["abc", "-5", "1.5"])
+def test_bad_content_length(tmp_db, length):
+    async def scenario():
+        async with running() as (_service, addr):
+            return await raw_request(addr, f"POST /generate HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode())
+    response = asyncio.run(scenario())
+    assert response.startswith(b"HTTP/1.1 400 ")
+    assert b"Content-Length" in response.split(b"\r\n\r\n", 1)[1]
+
+def test_body_too_large(tmp_db):
+    async def scenario():
+        async with running() as (_service, addr):
+            return await raw_request(addr, f"POST /generate HTTP/1.1\r\nContent-Length: {server.MAX_BODY + 1}\r\n\r\n"
+                                     .encode())
+    assert asyncio.run(scenario()).startswith(b"HTTP/1.1 413 ")
+
+def decode_chunked(body: bytes):
+    """Куски chunked-ответа; последний должен быть пустым."""
+    chunks = []
+    while True:
+        size, _, rest = body.partition(b"\r\n")
+        n = int(size, 16)
+        chunks.append(rest[:n])
+        assert rest[n:n + 2] == b"\r\n"
+        body = rest[n + 2:]
+        if n == 0:
+            assert body == b""
+            return chunks
+
+class CountingPool:
+    """Пул генерации, который считает отправленные задания."""
+    def __init__(self, pool):
+        self.pool, self.calls = pool, 0
+
+    def submit(self, *args, **kwargs):
+        self.calls += 1
+        return self.pool.submit(*args, **kwargs)
+
+    def shutdown(self, **kwargs):
+        self.pool.shutdown(**kwargs)
+
+@pytest.mark.parametrize("save", [False, True])
+def test_generate_save(tmp_db, save):
+    async def scenario():
+        async with running() as (_service, addr):
+            return await request(addr, "POST", "/generate", {"year": 2026, "month": 4, "save": save})
+    status, _headers, body = asyncio.run(scenario())
+    assert status == 200
+    result = json.loads(body)
+    names = [e["name"] for e in db.load_employees()]
+    assert [e["name"] for e in result["employees"]] == names and result["days"] == 30
+    stored = db.load_month_schedule(2026, 4, names)
+    summary = db.load_summary(2026, 4)
+    db.close_all()
+    if save:
+        assert server.schedule_json(stored) == {k: v for k, v in result.items() if k != "coalesced"}
+        assert sum(st["shift2"] for st in summary.values()) == sum(e["shift"].count("2") for e in result["employees"])
+    else:
+        assert stored.is_empty() and summary == {}
+
+def test_identical_requests_coalesce(tmp_db):
+    async def scenario():
+        async with running() as (service, addr):
+            service.cpu = CountingPool(service.cpu)
+            first, second = await asyncio.gather(
+                request(addr, "POST", "/generate", {"year": 2026, "month": 5}),
+                request(addr, "POST", "/generate", {"year": 2026, "month": 5}))
+            return service.cpu.calls, json.loads(first[2]), json.loads(second[2])
+    calls, first, second = asyncio.run(scenario())
+    assert calls == 1
+    assert sorted([first.pop("coalesced"), second.pop("coalesced")]) == [False, True]
+    assert first == second
+
+def saved_months(months):
+    """Сгенерировать и сохранить months через сервис; вернуть их графики из базы."""
+    async def scenario():
+        async with running() as (_service, addr):
+            for y, m in months:
+                status, _headers, _body = await request(addr, "POST", "/generate", {"year": y, "month": m, "save": True})
+                assert status == 200
+    asyncio.run(scenario())
+    names = [e["name"] for e in db.load_employees()]
+    result = [db.load_month_schedule(y, m, names) for y, m in months]
+    db.close_all()
+    return result
+
+def get(target):
+    async def scenario():
+        async with running() as (_service, addr):
+            return await request(addr, "GET", target)
+    return asyncio.run(scenario())
+
+def test_schedule_streams_months(tmp_db):
+    stored = saved_months([(2026, 11), (2026, 12), (2027, 1)])
+    status, headers, body = get("/schedule?from=2026-11&to=2027-01")
+    assert status == 200 and headers["transfer-encoding"] == "chunked"
+    chunks = decode_chunked(body)
+    assert chunks[-1] == b"" and len(chunks) == 6      # начало, три месяца, конец, пустой
+    assert json.loads(b"".join(chunks)) == {"months": [server.schedule_json(s) for s in stored]}
+
+def test_fairness_ranges(tmp_db):
+    stored = saved_months([(2026, 1), (2026, 2)])
+    status, _headers, body = get("/fairness?from=2026-01&to=2026-02")
+    assert status == 200
+    result = json.loads(body)
+    rows = range(len(stored[0].names))
+    shift2 = [sum(1 for s in stored for _d, shift, _duty in s.iter_row(r) if shift == "2") for r in rows]
+    duty = [sum(1 for s in stored for _d, _shift, on in s.iter_row(r) if on) for r in rows]
+    assert result["range"]["shift2"] == [min(shift2), max(shift2)]
+    assert result["range"]["duty"] == [min(duty), max(duty)]
+    assert [row["shift2"] for row in result["employees"]] == shift2
+    assert all(row["total"]["shift2"] == row["shift2"] for row in result["employees"])
+
+def test_export(tmp_db):
+    openpyxl = pytest.importorskip("openpyxl")
+    saved_months([(2026, 6), (2026, 7)])
+    status, headers, body = get("/export.xlsx?from=2026-06&to=2026-07")
+    assert status == 200 and headers["content-type"].endswith("spreadsheetml.sheet")
+    assert 'filename="schedule_2026_06.xlsx"' in headers["content-disposition"]
+    assert len(openpyxl.load_workbook(io.BytesIO(body), read_only=True).sheetnames) == 2
+
+@pytest.mark.parametrize("payload", [{"year": 0, "month": 1}, {"year": 10000, "month": 1}, {"year": 2026, "month": 13},
+                                     {"year": 2026, "month": 1, "duty": "x"}, {"month": 1}, {"year": "abc", "month": 1}])
+def test_generate_bad_input(tmp_db, payload):
+    async def scenario():
+        async with running() as (_service, addr):
+            return await request(addr, "POST", "/generate", payload)
+    status, _headers, body = asyncio.run(scenario())
+    assert status == 400 and "error" in json.loads(body)
+
+def test_period_limits():
+    assert server._period({"from": ["2026-03"]}) == [(2026, 3)]
+    months = server._period({"from": ["2026-01"], "to": ["2030-12"]})
+    assert len(months) == server.MAX_MONTHS and months[-1] == (2030, 12)
+    for query in ({"from": ["2026-01"], "to": ["2031-01"]},        # MAX_MONTHS + 1
+                  {"from": ["2026-05"], "to": ["2026-04"]},        # конец раньше начала
+                  {"to": ["2026-04"]}, {"from": ["2026-13"]}, {"from": ["0-01"]}, {"from": ["март"]}):
+        with pytest.raises(server.HttpError) as e:
+            server._period(query)
+        assert e.value.status == 400
@@ -0,0 +1,37 @@
+# test_stats.py — ScheduleStats: ровность считается по тем, кому logic раздаёт 2-ю смену и дежурства
+import random
+
+import pytest
+
+from logic import generate_schedule
+from matrix import ScheduleStats
+
+def brute_ranges(schedule, employees):
+    s2 = [sum(1 for _d, shift, _duty in schedule.iter_row(r) if shift == "2")
+          for r, e in enumerate(employees) if not e["part_time"]]
+    duty = [sum(1 for _d, _shift, duty in schedule.iter_row(r) if duty)
+            for r, e in enumerate(employees) if not e["part_time"] and e["can_duty"]]
+    return (min(s2), max(s2)) if s2 else (0, 0), (min(duty), max(duty)) if duty else (0, 0)
+
+@pytest.mark.parametrize("seed", range(10))
+def test_ranges_skip_part_time_and_no_duty(seed):
+    rnd = random.Random(seed)
+    employees = [{"name": f"E{i}", "part_time": rnd.random() < 0.3, "can_duty": rnd.random() < 0.7}
+                 for i in range(rnd.randint(5, 15))]
+    schedule = generate_schedule(employees, 2026, rnd.randint(1, 12))
+    stats = ScheduleStats(schedule, employees)
+    assert (stats.shift2_range(), stats.duty_range()) == brute_ranges(schedule, employees)
+    for _ in range(200):
+        row, day = rnd.randrange(len(employees)), rnd.randint(1, schedule.num_days)
+        old = schedule.shift_at(row, day), schedule.duty_at(row, day)
+        new = rnd.choice(["", "1", "2", "В"])
+        schedule.set_cell(row, day, new, bool(new in ("1", "2") and rnd.random() < 0.3))
+        stats.update(row, day, *old, schedule.shift_at(row, day), schedule.duty_at(row, day))
+        assert (stats.shift2_range(), stats.duty_range()) == brute_ranges(schedule, employees)
+
+def test_without_employees_counts_everyone():
+    employees = [{"name": "A", "part_time": True, "can_duty": False}, {"name": "B", "part_time": False, "can_duty": True}]
+    schedule = generate_schedule(employees, 2026, 2)
+    everyone = [dict(e, part_time=False, can_duty=True) for e in employees]
+    stats = ScheduleStats(schedule)
+    assert (stats.shift2_range(), stats.duty_range()) == brute_ranges(schedule, everyone)
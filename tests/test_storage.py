@@ -0,0 +1,51 @@
+# test_storage.py — раскладка графика записана в базе, а не берётся из окружения
+import pytest
+
+import db
+from logic import generate_schedule
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "scheduler.db")
+    monkeypatch.setattr(db, "STORAGE", None)
+    yield
+    db.close_all()
+
+def reopen():
+    db.close_all()
+    db.init_db()
+
+def test_new_database_is_rows(fresh_db):
+    db.init_db()
+    assert db.storage() == "rows"
+
+def test_new_database_takes_requested_layout(fresh_db, monkeypatch):
+    monkeypatch.setattr(db, "STORAGE", "packed")
+    db.init_db()
+    assert db.storage() == "packed"
+    monkeypatch.setattr(db, "STORAGE", None)
+    reopen()
+    assert db.storage() == "packed"
+
+def test_pack_records_layout(fresh_db):
+    db.init_db()
+    employees = db.load_employees()
+    schedule = generate_schedule(employees, 2026, 3)
+    db.save_month_schedule(2026, 3, schedule)
+    db.migrate_to_packed()
+    assert db.storage() == "packed"
+    reopen()
+    assert db.storage() == "packed"
+    assert db.get_conn().execute("SELECT COUNT(*) FROM schedule").fetchone()[0] == 0
+    names = [e["name"] for e in employees]
+    assert db.load_month_schedule(2026, 3, names).to_dict() == schedule.to_dict()
+    schedule.set_cell(0, 1, "В", False)
+    db.save_months([(2026, 3, schedule, None)])
+    assert db.load_month_schedule(2026, 3, names).to_dict() == schedule.to_dict()
+
+def test_mismatch_refuses(fresh_db, monkeypatch):
+    db.init_db()
+    db.close_all()
+    monkeypatch.setattr(db, "STORAGE", "packed")
+    with pytest.raises(RuntimeError):
+        db.init_db()
@@ -1,18 +1,25 @@
 # ui.py — минималистичный интерфейс (PySide6). Основной файл для запуска.
-import sys, calendar
+import sys, calendar, argparse
+from collections import OrderedDict
 from datetime import date
 from PySide6.QtWidgets import (
-    QApplication, QMainWindow, QWidget, QTableWidget, QTableWidgetItem,
-    QVBoxLayout, QToolBar, QFileDialog, QMessageBox, QLabel
+    QApplication, QMainWindow, QWidget, QTableView, QHeaderView,
+    QVBoxLayout, QToolBar, QFileDialog, QMessageBox, QLabel, QDockWidget, QTabWidget, QProgressBar
 )
-from PySide6.QtCore import Qt
-from PySide6.QtGui import QAction, QBrush, QColor
+from PySide6.QtCore import Qt, QThreadPool, QTimer
+from PySide6.QtGui import QAction, QKeySequence
 
 import db
-from logic import generate_schedule
+import prof
+from matrix import ScheduleMatrix
+from ui_model import ScheduleModel, ScheduleDelegate, CoverageModel, FairnessModel
+from ui_tasks import MonthTask, CompactTask
+from logic import repair_schedule, update_state, add_months
 
-SHIFT_COL_LABEL = "Смена"
-DUTY_COL_LABEL = "Деж."
+OPTIMIZE_BUDGET = 1.0   # секунд доводки графика после «Автографика»
+JOURNAL_FLUSH_MS = 500  # правки копятся и пишутся в журнал одной транзакцией не реже этого
+COMPACT_MS = 30000      # журнал сворачивается в график в фоне не чаще этого
+CACHE_MONTHS = 5        # месяцев в памяти окна; текущий и месяцы с неотменёнными правками не вытесняются
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -24,6 +31,34 @@ class MainWindow(QMainWindow):
         self.year = today.year
         self.month = today.month
 
+        # загрузка/генерация идёт в пуле; готовые месяцы (и соседние, загруженные заранее) — в кэше
+        self.pool = QThreadPool(self)
+        self.cache = OrderedDict()  # (year, month) -> ScheduleMatrix, последним — недавно показанный (LRU)
+        self.tasks = {}     # (year, month) -> MonthTask в работе
+        self.pins = {}      # (year, month) -> {(row, day)}: закрепления (ручные правки), из БД при первом показе
+        self.dirty = {}     # (year, month) -> {day}: дни с правками после последней генерации/починки
+        # правки сохранённых месяцев сразу идут в журнал БД (db.append_journal): пачкой по таймеру,
+        # а в график сворачиваются в фоне; сгенерированный, но не сохранённый месяц пишется целиком по «Сохранить»:
+        # журналу не на что накладывать его правки, до сохранения они есть только в окне (см. update_title)
+        self.journal = {}   # (year, month) -> [(row, day, old_shift, old_duty, new_shift, new_duty)] ещё не записанные
+        self.unsaved = set()    # (year, month) сгенерированных и не сохранённых месяцев
+        # (year, month) -> [(cells, pinned, dirty_before, dirty_after)]: cells — [(row, day_idx, старое, новое)],
+        # dirty_* — дни к починке до и после шага (отмена возвращает и их)
+        self.undo = {}
+        self.redo = {}
+        self.journal_written = False    # в журнал писали после последней свёртки
+        self.compacting = False
+        self.schedule = None
+
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(JOURNAL_FLUSH_MS)
+        self.flush_timer.timeout.connect(self.flush_journal)
+        self.compact_timer = QTimer(self)
+        self.compact_timer.setInterval(COMPACT_MS)
+        self.compact_timer.timeout.connect(self.compact_journal)
+        self.compact_timer.start()
+
         self.setup_ui()
         self.load_or_generate()
 
@@ -36,6 +71,13 @@ class MainWindow(QMainWindow):
         self.gen_act  = QAction("Автографик ⚡", self)
         self.save_act = QAction("Сохранить 💾", self)
         self.export_act = QAction("Экспорт Excel ⤓", self)
+        self.cancel_act = QAction("Отмена ✕", self)
+        self.cancel_act.setEnabled(False)
+        self.unpin_act = QAction("Открепить 📌", self)
+        self.undo_act = QAction("Отменить ↶", self)
+        self.undo_act.setShortcut(QKeySequence.Undo)
+        self.redo_act = QAction("Повторить ↷", self)
+        self.redo_act.setShortcut(QKeySequence.Redo)
 
         toolbar.addAction(self.prev_act)
         self.title_lbl = QLabel("")
@@ -43,82 +85,109 @@ class MainWindow(QMainWindow):
         toolbar.addAction(self.next_act)
         toolbar.addSeparator()
         toolbar.addAction(self.gen_act)
+        toolbar.addAction(self.unpin_act)
+        toolbar.addAction(self.undo_act)
+        toolbar.addAction(self.redo_act)
         toolbar.addAction(self.save_act)
         toolbar.addAction(self.export_act)
+        toolbar.addAction(self.cancel_act)
 
         self.prev_act.triggered.connect(self.prev_month)
         self.next_act.triggered.connect(self.next_month)
         self.gen_act.triggered.connect(self.autogenerate)
+        self.unpin_act.triggered.connect(self.unpin_all)
+        self.undo_act.triggered.connect(self.undo_edit)
+        self.redo_act.triggered.connect(self.redo_edit)
         self.save_act.triggered.connect(self.save_schedule)
         self.export_act.triggered.connect(self.export_excel)
-
-        self.table = QTableWidget()
-        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.table.cellClicked.connect(self.cell_clicked)
+        self.cancel_act.triggered.connect(self.cancel_generation)
+
+        self.progress = QProgressBar()
+        self.progress.setMaximumWidth(200)
+        self.progress.hide()
+        self.statusBar().addPermanentWidget(self.progress)
+
+        # модель/вид: ячейки рисуются по запросу, стоимость — только видимые строки
+        self.model = ScheduleModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setItemDelegate(ScheduleDelegate(self.table))
+        self.table.setEditTriggers(QTableView.NoEditTriggers)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.horizontalHeader().setDefaultSectionSize(48)
+        self.table.clicked.connect(lambda index: self.cell_clicked(index.row(), index.column()))
 
         central = QWidget()
         lay = QVBoxLayout(central)
         lay.addWidget(self.table)
         self.setCentralWidget(central)
 
+        self.setup_side_panel()
+
+    def setup_side_panel(self):
+        # панель покрытия/справедливости: модели читают счётчики ScheduleModel.stats,
+        # правка ячейки обновляет одну строку каждой таблицы
+        self.coverage_model = CoverageModel(self.model, self)
+        self.fairness_model = FairnessModel(self.model, self)
+        tabs = QTabWidget()
+        for model, title in ((self.coverage_model, "Покрытие"), (self.fairness_model, "Справедливость")):
+            view = QTableView()
+            view.setModel(model)
+            view.verticalHeader().hide()
+            view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+            view.horizontalHeader().setSectionResizeMode(QHeaderView.Fixed)
+            view.horizontalHeader().setDefaultSectionSize(44)
+            view.setColumnWidth(0, 140 if model is self.fairness_model else 60)
+            tabs.addTab(view, title)
+        self.fairness_lbl = QLabel("")
+        panel = QWidget()
+        lay = QVBoxLayout(panel)
+        lay.addWidget(self.fairness_lbl)
+        lay.addWidget(tabs)
+        dock = QDockWidget("Панель справедливости", self)
+        dock.setWidget(panel)
+        self.addDockWidget(Qt.RightDockWidgetArea, dock)
+        self.model.modelReset.connect(self.update_fairness_label)
+        self.model.cellChanged.connect(self.update_fairness_label)
+
+    def update_fairness_label(self, *_):
+        s2_min, s2_max = self.model.stats.shift2_range()
+        d_min, d_max = self.model.stats.duty_range()
+        self.fairness_lbl.setText(f"2-я смена: {s2_min}–{s2_max}\nДежурства: {d_min}–{d_max}")
+
+    @prof.timed("ui.build_table")
     def build_table(self):
-        days = [d for d in calendar.Calendar(firstweekday=0).itermonthdates(self.year, self.month) if d.month == self.month]
-        self.days = days
-        cols = 1 + len(days)*2
-        self.table.setColumnCount(cols)
-        self.table.setRowCount(len(self.employees))
-
-        headers = ["Сотрудник"]
-        for d in days:
-            headers += [f"{d.day}\n{SHIFT_COL_LABEL}", f"{d.day}\n{DUTY_COL_LABEL}"]
-        self.table.setHorizontalHeaderLabels(headers)
-
-        self.title_lbl.setText(f"{calendar.month_name[self.month]} {self.year}".capitalize())
-
-        for r, e in enumerate(self.employees):
-            self.table.setItem(r, 0, QTableWidgetItem(e["name"]))
-
-        # затемнение шапки у выходных
-        brush = QBrush(QColor(238,238,238))
-        for i, d in enumerate(days):
-            if d.weekday() >= 5:
-                for sub in (0,1):
-                    item = self.table.horizontalHeaderItem(1 + i*2 + sub)
-                    if item:
-                        item.setBackground(brush)
-
-        self.table.resizeColumnsToContents()
-        self.table.setColumnWidth(0, 180)
+        # шапка и имена берутся из модели (ui_model.ScheduleModel) — здесь только дни и заголовок
+        self.days = [d for d in calendar.Calendar(firstweekday=0).itermonthdates(self.year, self.month) if d.month == self.month]
+        self.update_title()
+
+    def update_title(self):
+        title = f"{calendar.month_name[self.month]} {self.year}".capitalize()
+        if (self.year, self.month) in self.unsaved:
+            title += " — не сохранён"
+        self.title_lbl.setText(title)
 
     def load_or_generate(self):
         self.build_table()
-        loaded = db.load_month_schedule(self.year, self.month)
-        if loaded:
-            self.schedule = self._merge_loaded(loaded)
+        key = (self.year, self.month)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.show_schedule(self.cache[key])
         else:
-            self.autogenerate()
-        self.render_schedule()
+            self.set_busy(True)
+            self.start_task(key)
+        self.prefetch_neighbours()
 
-    def _merge_loaded(self, loaded):
-        result = {}
-        for e in self.employees:
-            name = e["name"]
-            result[name] = {}
-            for d in self.days:
-                day = d.day
-                payload = loaded.get(name, {}).get(day, {"shift":"", "duty":False})
-                result[name][day] = {"shift": payload.get("shift","") or "", "duty": bool(payload.get("duty", False))}
-        return result
+    def show_schedule(self, schedule):
+        self.schedule = schedule
+        self.render_schedule()
+        self.set_busy(False)
 
+    @prof.timed("ui.render_schedule")
     def render_schedule(self):
-        for r, e in enumerate(self.employees):
-            name = e["name"]
-            for i, d in enumerate(self.days):
-                day = d.day
-                shift = self.schedule[name][day]["shift"]
-                duty = self.schedule[name][day]["duty"]
-                self.table.setItem(r, 1 + i*2, QTableWidgetItem(shift))
-                self.table.setItem(r, 1 + i*2 + 1, QTableWidgetItem("Д" if duty else ""))
+        self.model.set_schedule(self.schedule, self.days, self.month_pins(), self.employees)
+        self.table.setColumnWidth(0, 180)
 
     # -------- actions
     def prev_month(self):
@@ -135,29 +204,204 @@ class MainWindow(QMainWindow):
             self.month += 1
         self.load_or_generate()
 
+    def month_pins(self):
+        key = (self.year, self.month)
+        if key not in self.pins:
+            self.pins[key] = db.load_pins(*key, [e["name"] for e in self.employees])
+        return self.pins[key]
+
     def autogenerate(self):
-        self.schedule = generate_schedule(self.employees, self.year, self.month)
-        self.render_schedule()
-        QMessageBox.information(self, "Готово", "График сгенерирован.")
+        key = (self.year, self.month)
+        dirty = self.dirty.pop(key, None)
+        if dirty:
+            # после ручных правок — починка только затронутых дней, закреплённое не трогается
+            changes = repair_schedule(self.employees, self.schedule, dirty, self.model.pins, self.previous_state(key))
+            self.push_undo([self.set_cell(row, day-1, shift, duty) for row, day, shift, duty in changes], (), dirty)
+            self.statusBar().showMessage(f"Пересобрано дней: {len(dirty)}, изменено ячеек: {len(changes)}.", 5000)
+            return
+        self.set_busy(True)
+        self.start_task(key, generate=True, optimize=OPTIMIZE_BUDGET)
 
-    def save_schedule(self):
-        data = {}
-        for r, e in enumerate(self.employees):
-            name = e["name"]
-            data[name] = {}
-            for i, d in enumerate(self.days):
-                sh_item = self.table.item(r, 1 + i*2)
-                dj_item = self.table.item(r, 1 + i*2 + 1)
-                shift = sh_item.text() if sh_item else ""
-                duty  = (dj_item.text() == "Д") if dj_item else False
-                data[name][d.day] = {"shift": shift, "duty": duty}
-        db.save_month_schedule(self.year, self.month, data)
-        QMessageBox.information(self, "Сохранено", "Расписание сохранено в базе.")
+    def unpin_all(self):
+        self.model.clear_pins()
+        self.dirty.pop((self.year, self.month), None)
+
+    def keep_pins(self, key, schedule):
+        """Новый график месяца key: закреплённые ячейки — из прежнего, их дни — починкой вокруг."""
+        pins, old = self.pins.get(key), self.cache.get(key)
+        if not pins or old is None:
+            return
+        for row, day in pins:
+            schedule.set_cell(row, day, old.shift_at(row, day), old.duty_at(row, day))
+        for row, day, shift, duty in repair_schedule(self.employees, schedule, {d for _r, d in pins}, pins,
+                                                     self.previous_state(key)):
+            schedule.set_cell(row, day, shift, duty)
+
+    def previous_state(self, key):
+        """Итоги на конец месяца перед key — с ними repair_schedule видит последний день прошлого месяца."""
+        return db.load_summary(*add_months(*key, -1))
+
+    def cancel_generation(self):
+        task = self.tasks.get((self.year, self.month))
+        if task:
+            task.cancel()
+
+    # -------- фоновые задачи
+    def start_task(self, key, generate=False, priority=0, optimize=0.0):
+        # строки матрицы идут в порядке self.employees — строка таблицы = строка матрицы
+        task = self.tasks.get(key)
+        if task and not generate:
+            return      # уже грузится (например, предзагрузка соседнего месяца)
+        if task:
+            task.cancel()
+        task = MonthTask(self.employees, *key, generate=generate, optimize=optimize)
+        task.signals.progress.connect(self.task_progress)
+        task.signals.finished.connect(self.task_finished)
+        task.signals.cancelled.connect(self.task_cancelled)
+        task.signals.failed.connect(self.task_failed)
+        self.tasks[key] = task
+        self.pool.start(task, priority)
+
+    def prefetch_neighbours(self):
+        y, m = self.year, self.month
+        for key in ((y, m-1) if m > 1 else (y-1, 12), (y, m+1) if m < 12 else (y+1, 1)):
+            if key not in self.cache:
+                self.start_task(key, priority=-1)
+
+    def _take_task(self, token, y, m):
+        """Снимает задачу с учёта; False — сигнал от уже заменённой задачи."""
+        task = self.tasks.get((y, m))
+        if task is None or task.token != token:
+            return False
+        del self.tasks[(y, m)]
+        return True
+
+    def task_progress(self, token, y, m, done, total):
+        task = self.tasks.get((y, m))
+        if (y, m) == (self.year, self.month) and task and task.token == token:
+            self.progress.setRange(0, total)
+            self.progress.setValue(done)
+
+    def task_finished(self, token, y, m, schedule, generated):
+        if not self._take_task(token, y, m):
+            return
+        if generated:
+            self.keep_pins((y, m), schedule)
+            self.dirty.pop((y, m), None)
+            self.unsaved.add((y, m))
+            # отмена правок поверх прежнего графика к новому не применима
+            self.undo.pop((y, m), None)
+            self.redo.pop((y, m), None)
+        self.remember((y, m), schedule)
+        if (y, m) == (self.year, self.month):
+            self.show_schedule(schedule)
+            if generated:
+                self.update_title()
+                self.statusBar().showMessage("График сгенерирован.", 5000)
+
+    def remember(self, key, schedule):
+        """График в кэш окна; сверх CACHE_MONTHS вытесняются давно показанные месяцы без правок."""
+        self.cache[key] = schedule
+        self.cache.move_to_end(key)
+        for old in list(self.cache):
+            if len(self.cache) <= CACHE_MONTHS:
+                break
+            if old != (self.year, self.month) and not self.undo.get(old) and not self.dirty.get(old):
+                self.forget_month(old)
+
+    def forget_month(self, key):
+        """Убрать месяц из памяти: сохранённый перечитается из базы, несохранённый сгенерируется заново."""
+        self.cache.pop(key, None)
+        self.unsaved.discard(key)
+        self.undo.pop(key, None)
+        self.redo.pop(key, None)
+
+    def drop_later_months(self, key):
+        """
+        Итоги месяца key изменились: сгенерированные после него месяцы (предзагрузка) считались от старых —
+        убрать их и остановить их задачи. Месяцы с правками остаются.
+        """
+        for later in [k for k in self.cache if k > key and k in self.unsaved and not self.undo.get(k)]:
+            self.forget_month(later)
+        for later in [k for k in self.tasks if k > key]:
+            self.tasks.pop(later).cancel()
+
+    def task_cancelled(self, token, y, m):
+        if not self._take_task(token, y, m):
+            return
+        if (y, m) == (self.year, self.month):
+            if (y, m) in self.cache:
+                self.show_schedule(self.cache[(y, m)])
+            else:
+                self.show_schedule(ScheduleMatrix([e["name"] for e in self.employees], y, m))
+            self.statusBar().showMessage("Генерация отменена.", 5000)
 
+    def task_failed(self, token, y, m, message):
+        if not self._take_task(token, y, m):
+            return
+        if (y, m) == (self.year, self.month):
+            self.set_busy(False)
+            QMessageBox.critical(self, "Ошибка", f"Не удалось получить график: {message}")
+
+    def set_busy(self, busy):
+        for widget in (self.table, self.gen_act, self.save_act, self.export_act, self.unpin_act,
+                       self.undo_act, self.redo_act):
+            widget.setEnabled(not busy)
+        self.cancel_act.setEnabled(busy)
+        self.progress.setVisible(busy)
+        if busy:
+            self.progress.setRange(0, 0)    # «бегущая» полоса, пока не пришёл первый progress
+
+    def edited_unsaved(self):
+        """
+        Несохранённые месяцы с правками. Без правок терять нечего: тот же график сгенерируется
+        заново (или возьмётся из кэша), в том числе у соседних месяцев, сгенерированных предзагрузкой.
+        """
+        return sorted(key for key in self.unsaved if self.undo.get(key))
+
+    def closeEvent(self, event):
+        edited = self.edited_unsaved()
+        if edited:
+            months = ", ".join(f"{m:02d}.{y}" for y, m in edited)
+            answer = QMessageBox.question(
+                self, "Выход", f"Есть правки в несохранённых месяцах: {months}.\n"
+                "Они будут потеряны. Выйти?")
+            if answer != QMessageBox.Yes:
+                event.ignore()
+                return
+        for task in self.tasks.values():
+            task.cancel()
+        self.pool.waitForDone()
+        self.flush_journal()
+        if self.journal_written:
+            db.compact_journal()
+        super().closeEvent(event)
+
+    def save_schedule(self):
+        key = (self.year, self.month)
+        self.flush_journal()
+        if key in self.unsaved:
+            # сгенерированный месяц — целиком (только изменившиеся ячейки), его журнал больше не нужен
+            stats = db.save_month_schedule(self.year, self.month, self.schedule, diff=True)
+            self.unsaved.discard(key)
+            self.update_title()
+            message = f"Добавлено: {stats['inserted']}, изменено: {stats['updated']}, без изменений: {stats['unchanged']}."
+        else:
+            # правки уже в журнале — свернуть его, не переписывая месяц
+            message = f"Перенесено правок из журнала: {db.compact_journal()}."
+            self.journal_written = False
+        db.save_pins(self.year, self.month, self.schedule.names, self.model.pins)
+        # итоги на конец месяца = итоги прошлого + этот месяц (для генерации следующего)
+        state = self.previous_state(key)
+        db.save_summary(self.year, self.month, update_state(state, self.schedule))
+        self.drop_later_months(key)
+        self.prefetch_neighbours()
+        QMessageBox.information(self, "Сохранено", "Расписание сохранено в базе.\n" + message)
+
+    @prof.timed("ui.export_excel")
     def export_excel(self):
         try:
-            from openpyxl import Workbook
-            from openpyxl.styles import PatternFill, Font
+            import export_xlsx
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Требуется пакет openpyxl: {e}")
             return
@@ -166,93 +410,140 @@ class MainWindow(QMainWindow):
         if not path:
             return
 
-        wb = Workbook()
-        ws = wb.active; ws.title = "График"
-
-        ws.cell(1,1,"Сотрудник"); ws.merge_cells(start_row=1, start_column=1, end_row=2, end_column=1)
-        col = 2
-        days = self.days
-
-        fill_weekend = PatternFill("solid", fgColor="EEEEEE")
-        fill_shift1  = PatternFill("solid", fgColor="DCEBFF")
-        fill_shift2  = PatternFill("solid", fgColor="7FA8F8")
-        fill_off     = PatternFill("solid", fgColor="F0F0F0")
-        fill_duty    = PatternFill("solid", fgColor="555555")
-        font_white   = Font(color="FFFFFF", bold=True)
-
-        for d in days:
-            ws.cell(1,col, f"{d.day}"); ws.merge_cells(start_row=1, start_column=col, end_row=1, end_column=col+1)
-            if d.weekday()>=5:
-                ws.cell(1,col).fill = fill_weekend
-                ws.cell(2,col).fill = fill_weekend
-                ws.cell(2,col+1).fill = fill_weekend
-            ws.cell(2,col, "Смена"); ws.cell(2,col+1, "Деж.")
-            col += 2
-
-        r = 3
-        for e in self.employees:
-            name = e["name"]
-            ws.cell(r,1,name)
-            c = 2
-            for d in days:
-                sh = self.schedule[name][d.day]["shift"]
-                dj = self.schedule[name][d.day]["duty"]
-                ws.cell(r,c, sh)
-                ws.cell(r,c+1, "Д" if dj else "")
-                if sh == "1":
-                    ws.cell(r,c).fill = fill_shift1
-                elif sh == "2":
-                    ws.cell(r,c).fill = fill_shift2
-                    ws.cell(r,c).font = font_white
-                elif sh == "В":
-                    ws.cell(r,c).fill = fill_off
-                if dj:
-                    ws.cell(r,c+1).fill = fill_duty
-                    ws.cell(r,c+1).font = font_white
-                c += 2
-            r += 1
-
-        wb.save(path)
+        # тот же код, что у python export_xlsx.py, но для текущего (возможно, несохранённого) графика
+        export_xlsx.export_schedules(path, [self.schedule])
         QMessageBox.information(self, "Экспорт", f"Файл сохранён: {path}")
 
+    # -------- правки, журнал, отмена
+    def set_cell(self, row, day_idx, shift=None, duty=None):
+        """
+        Ячейка через модель; у сохранённого месяца правка уходит в журнал (запись — по таймеру),
+        у несохранённого — остаётся только в окне до «Сохранить».
+        Возвращает (row, day_idx, (старая смена, дежурство), (новая смена, дежурство)).
+        """
+        day = self.days[day_idx].day
+        old = (self.schedule.shift_at(row, day), self.schedule.duty_at(row, day))
+        self.model.set_cell(row, day_idx, shift, duty)
+        new = (self.schedule.shift_at(row, day), self.schedule.duty_at(row, day))
+        key = (self.year, self.month)
+        if new != old and key not in self.unsaved:
+            self.journal.setdefault(key, []).append((row, day) + old + new)
+            if not self.flush_timer.isActive():
+                self.flush_timer.start()
+        elif new != old:
+            self.statusBar().showMessage("Месяц не сохранён: правки попадут в базу только по «Сохранить 💾».", 5000)
+        return row, day_idx, old, new
+
+    def flush_journal(self):
+        self.flush_timer.stop()
+        journal, self.journal = self.journal, {}
+        names = [e["name"] for e in self.employees]
+        for (y, m), edits in journal.items():
+            db.append_journal(y, m, names, edits)
+            self.journal_written = True
+
+    def compact_journal(self):
+        if not self.journal_written or self.compacting:
+            return
+        self.journal_written = False
+        self.compacting = True
+        task = CompactTask()
+        task.signals.finished.connect(self.compact_finished)
+        task.signals.failed.connect(self.compact_failed)
+        self.pool.start(task, -2)
+
+    def compact_finished(self, _cells):
+        self.compacting = False
+
+    def compact_failed(self, message):
+        self.compacting = False
+        self.journal_written = True     # журнал цел — свернём в следующий раз
+        self.statusBar().showMessage(f"Журнал правок не свёрнут: {message}", 5000)
+
+    def push_undo(self, cells, pinned=(), dirty_before=None):
+        """Шаг отмены; dirty_before — дни к починке до шага (после — берутся текущие)."""
+        cells = [c for c in cells if c[2] != c[3]]
+        if cells or pinned:
+            key = (self.year, self.month)
+            after = frozenset(self.dirty.get(key, ()))
+            self.undo.setdefault(key, []).append((cells, list(pinned), frozenset(dirty_before or ()), after))
+            self.redo.pop(key, None)
+
+    def restore_dirty(self, days):
+        if days:
+            self.dirty[(self.year, self.month)] = set(days)
+        else:
+            self.dirty.pop((self.year, self.month), None)
+
+    def undo_edit(self):
+        stack = self.undo.get((self.year, self.month))
+        if not stack:
+            return
+        cells, pinned, before, after = stack.pop()
+        for row, day_idx, old, _new in reversed(cells):
+            self.set_cell(row, day_idx, *old)
+        for row, day_idx in pinned:
+            self.model.unpin(row, day_idx)
+        self.restore_dirty(before)
+        self.redo.setdefault((self.year, self.month), []).append((cells, pinned, before, after))
+
+    def redo_edit(self):
+        stack = self.redo.get((self.year, self.month))
+        if not stack:
+            return
+        cells, pinned, before, after = stack.pop()
+        for row, day_idx, _old, new in cells:
+            self.set_cell(row, day_idx, *new)
+        for row, day_idx in pinned:
+            self.model.pin(row, day_idx)
+        self.restore_dirty(after)
+        self.undo.setdefault((self.year, self.month), []).append((cells, pinned, before, after))
+
+    def edit(self, row, day_idx, shift=None, duty=None):
+        """Ручная правка: ячейка закрепляется, день — в починку «Автографика», всё — одним шагом отмены."""
+        pinned = [] if (row, self.days[day_idx].day) in self.model.pins else [(row, day_idx)]
+        dirty = self.dirty.setdefault((self.year, self.month), set())
+        before = set(dirty)
+        change = self.set_cell(row, day_idx, shift, duty)
+        self.model.pin(row, day_idx)
+        dirty.add(self.days[day_idx].day)
+        self.push_undo([change], pinned, before)
+
     def cell_clicked(self, row, col):
         if col == 0:  # имя
             return
         is_shift_col = (col % 2 == 1)  # 1,3,5... — смена
         day_idx = (col-1)//2
-        name = self.employees[row]["name"]
-        item = self.table.item(row, col)
+        day = self.days[day_idx].day
+        sh = self.schedule.shift_at(row, day)
 
         if is_shift_col:
             # цикл: "" -> "1" -> "2" -> "В" -> ""
-            cur = (item.text() if item else "") or ""
-            nxt = {"": "1", "1": "2", "2":"В", "В":""}.get(cur, "1")
-            self.table.setItem(row, col, QTableWidgetItem(nxt))
+            nxt = {"": "1", "1": "2", "2":"В", "В":""}.get(sh, "1")
             # если смена пустая/В — снять дежурство
-            self.table.setItem(row, col+1, QTableWidgetItem("" if nxt in ("", "В") else (self.table.item(row, col+1).text() if self.table.item(row, col+1) else "")))
+            self.edit(row, day_idx, nxt, False if nxt in ("", "В") else None)
         else:
             # дежурство можно только если соседняя смена 1 или 2
-            sh_item = self.table.item(row, col-1)
-            sh = sh_item.text() if sh_item else ""
             if sh in ("1","2"):
-                cur = (item.text() if item else "") or ""
-                nxt = "" if cur == "Д" else "Д"
-                # в смене может быть один дежурный → проверим
-                if nxt == "Д":
-                    for r2 in range(self.table.rowCount()):
-                        if r2 == row: continue
-                        sh2_item = self.table.item(r2, col-1)
-                        dj2_item = self.table.item(r2, col)
-                        if (sh2_item and sh2_item.text()==sh) and (dj2_item and dj2_item.text()=="Д"):
-                            QMessageBox.warning(self, "Дежурство", "В этой смене уже есть дежурный.")
-                            return
-                self.table.setItem(row, col, QTableWidgetItem(nxt))
+                nxt = not self.schedule.duty_at(row, day)
+                # в смене может быть один дежурный → проверим по индексу (день, смена)
+                if nxt and self.model.stats.duty_holder(day, sh, exclude=row) is not None:
+                    QMessageBox.warning(self, "Дежурство", "В этой смене уже есть дежурный.")
+                    return
+                self.edit(row, day_idx, duty=nxt)
             else:
                 QMessageBox.information(self, "Дежурство", "Сначала назначьте смену (1 или 2).")
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    # --profile [ФАЙЛ] / --cprofile ФАЙЛ — замеры по фазам (см. prof.py); остальное уходит в Qt
+    parser = argparse.ArgumentParser(add_help=False)
+    prof.add_cli_flags(parser)
+    args, qt_argv = parser.parse_known_args()
+    prof.apply_cli_flags(args)
+    app = QApplication(sys.argv[:1] + qt_argv)
     w = MainWindow()
     w.resize(1200, 700)
     w.show()
-    sys.exit(app.exec())
+    code = app.exec()
+    db.close_all()
+    sys.exit(code)
@@ -0,0 +1,224 @@
+# ui_model.py — модели/делегат таблиц: данные берутся из ScheduleMatrix и ScheduleStats по запросу вида
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, Signal
+from PySide6.QtGui import QBrush, QColor, QFont, QPalette
+from PySide6.QtWidgets import QStyledItemDelegate
+
+from logic import WD_NAMES
+from matrix import ScheduleStats
+
+SHIFT_COL_LABEL = "Смена"
+DUTY_COL_LABEL = "Деж."
+
+class ScheduleModel(QAbstractTableModel):
+    """
+    Колонка 0 — сотрудник, далее по две на день: смена (1 + 2*i) и дежурство (2 + 2*i).
+    Ничего не копирует: строки и ячейки читаются из self.schedule при отрисовке.
+    self.stats (ScheduleStats) обновляется в set_cell — по нему проверки и панель покрытия.
+    self.pins — закреплённые ячейки {(row, day)}, показываются жирным.
+    """
+    cellChanged = Signal(int, int)   # (row, day_idx) — после set_cell
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.schedule = None
+        self.stats = None
+        self.days = []
+        self.pins = set()
+        self._weekend_brush = QBrush(QColor(238,238,238))
+        self._pin_font = QFont()
+        self._pin_font.setBold(True)
+
+    def set_schedule(self, schedule, days, pins=None, employees=None):
+        """pins — множество окна: его же меняют pin()/clear_pins(); employees — для ScheduleStats."""
+        self.beginResetModel()
+        self.schedule = schedule
+        self.stats = ScheduleStats(schedule, employees)
+        self.days = days
+        self.pins = pins if pins is not None else set()
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid() or self.schedule is None:
+            return 0
+        return len(self.schedule.names)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 1 + len(self.days)*2
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, col = index.row(), index.column()
+        if role == Qt.DisplayRole:
+            if col == 0:
+                return self.schedule.names[row]
+            day = self.days[(col-1)//2].day
+            if col % 2 == 1:
+                return self.schedule.shift_at(row, day)
+            return "Д" if self.schedule.duty_at(row, day) else ""
+        if role == Qt.TextAlignmentRole and col > 0:
+            return int(Qt.AlignCenter)
+        if role == Qt.FontRole and col > 0 and (row, self.days[(col-1)//2].day) in self.pins:
+            return self._pin_font
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation != Qt.Horizontal:
+            return super().headerData(section, orientation, role)
+        if role == Qt.DisplayRole:
+            if section == 0:
+                return "Сотрудник"
+            d = self.days[(section-1)//2]
+            return f"{d.day}\n{SHIFT_COL_LABEL if section % 2 == 1 else DUTY_COL_LABEL}"
+        # затемнение шапки у выходных
+        if role == Qt.BackgroundRole and section > 0 and self.days[(section-1)//2].weekday() >= 5:
+            return self._weekend_brush
+        return None
+
+    def set_cell(self, row: int, day_idx: int, shift=None, duty=None):
+        """Меняет ячейку в матрице и сообщает виду только о паре колонок этого дня."""
+        day = self.days[day_idx].day
+        old_shift, old_duty = self.schedule.shift_at(row, day), self.schedule.duty_at(row, day)
+        self.schedule.set_cell(row, day, shift, duty)
+        self.stats.update(row, day, old_shift, old_duty, self.schedule.shift_at(row, day), self.schedule.duty_at(row, day))
+        col = 1 + day_idx*2
+        self.dataChanged.emit(self.index(row, col), self.index(row, col+1), [Qt.DisplayRole])
+        self.cellChanged.emit(row, day_idx)
+
+    def pin(self, row: int, day_idx: int):
+        key = (row, self.days[day_idx].day)
+        if key not in self.pins:
+            self.pins.add(key)
+            col = 1 + day_idx*2
+            self.dataChanged.emit(self.index(row, col), self.index(row, col+1), [Qt.FontRole])
+
+    def unpin(self, row: int, day_idx: int):
+        key = (row, self.days[day_idx].day)
+        if key in self.pins:
+            self.pins.discard(key)
+            col = 1 + day_idx*2
+            self.dataChanged.emit(self.index(row, col), self.index(row, col+1), [Qt.FontRole])
+
+    def clear_pins(self):
+        if self.pins:
+            self.pins.clear()
+            self.dataChanged.emit(self.index(0, 1), self.index(self.rowCount()-1, self.columnCount()-1), [Qt.FontRole])
+
+class CoverageModel(QAbstractTableModel):
+    """Покрытие по дням из ScheduleStats: строка = день, при правке обновляется одна строка."""
+    HEADERS = ("День", "1-я", "2-я", "Вых.", "Деж. 1", "Деж. 2")
+
+    def __init__(self, schedule_model: ScheduleModel, parent=None):
+        super().__init__(parent)
+        self.src = schedule_model
+        self._risk_brush = QBrush(QColor("#F8C8C8"))
+        schedule_model.modelReset.connect(self._reset)
+        schedule_model.cellChanged.connect(self._day_changed)
+
+    def _reset(self):
+        self.beginResetModel()
+        self.endResetModel()
+
+    def _day_changed(self, _row, day_idx):
+        self.dataChanged.emit(self.index(day_idx, 1), self.index(day_idx, len(self.HEADERS)-1))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() or self.src.stats is None else len(self.src.days)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def _values(self, i):
+        st, day = self.src.stats, self.src.days[i].day
+        return (st.s1[i], st.s2[i], st.off[i], len(st.duty.get((day, "1"), ())), len(st.duty.get((day, "2"), ())))
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        i, col = index.row(), index.column()
+        if role == Qt.DisplayRole:
+            if col == 0:
+                d = self.src.days[i]
+                return f"{d.day:02d} {WD_NAMES[d.weekday()]}"
+            return self._values(i)[col-1]
+        if role == Qt.TextAlignmentRole and col > 0:
+            return int(Qt.AlignCenter)
+        # подсветка рисков: во 2-й меньше двух, смена без дежурного или с двумя
+        if role == Qt.BackgroundRole and col > 0:
+            s1, s2, _off, d1, d2 = self._values(i)
+            risky = {
+                2: 0 < s2 < 2,
+                4: (s1 and d1 != 1) or d1 > 1,
+                5: (s2 and d2 != 1) or d2 > 1,
+            }.get(col, False)
+            return self._risk_brush if risky else None
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+class FairnessModel(QAbstractTableModel):
+    """Итоги по сотрудникам (2-е смены, дежурства); при правке обновляется одна строка."""
+    HEADERS = ("Сотрудник", "2-я", "Деж.")
+
+    def __init__(self, schedule_model: ScheduleModel, parent=None):
+        super().__init__(parent)
+        self.src = schedule_model
+        schedule_model.modelReset.connect(self._reset)
+        schedule_model.cellChanged.connect(self._row_changed)
+
+    def _reset(self):
+        self.beginResetModel()
+        self.endResetModel()
+
+    def _row_changed(self, row, _day_idx):
+        self.dataChanged.emit(self.index(row, 1), self.index(row, 2))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() or self.src.stats is None else len(self.src.schedule.names)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, col = index.row(), index.column()
+        if role == Qt.DisplayRole:
+            st = self.src.stats
+            return (self.src.schedule.names[row], st.emp_shift2[row], st.emp_duty[row])[col]
+        if role == Qt.TextAlignmentRole and col > 0:
+            return int(Qt.AlignCenter)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+class ScheduleDelegate(QStyledItemDelegate):
+    """Раскраска ячеек по значению (цвета те же, что в экспорте Excel)."""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.fills = {
+            "1": QBrush(QColor("#DCEBFF")),
+            "2": QBrush(QColor("#7FA8F8")),
+            "В": QBrush(QColor("#F0F0F0")),
+            "Д": QBrush(QColor("#555555")),
+        }
+        self.white = QColor("#FFFFFF")
+
+    def initStyleOption(self, option, index):
+        super().initStyleOption(option, index)
+        if index.column() == 0:
+            return
+        value = index.data(Qt.DisplayRole)
+        fill = self.fills.get(value)
+        if fill is None:
+            return
+        option.backgroundBrush = fill
+        if value in ("2", "Д"):
+            option.palette.setColor(QPalette.Text, self.white)
+            option.font.setBold(True)
@@ -0,0 +1,83 @@
+# ui_tasks.py — фоновые задачи окна: загрузка/генерация месяца и свёртка журнала правок в QThreadPool
+from itertools import count
+
+from PySide6.QtCore import QObject, QRunnable, Signal
+
+import db
+from cache import generate_cached
+from logic import add_months
+
+_tokens = count(1)
+
+class Cancelled(Exception):
+    """Задачу отменили — генерация прерывается после текущего дня."""
+
+class MonthSignals(QObject):
+    # первый аргумент — token задачи: по нему окно отбрасывает результаты заменённых задач
+    progress = Signal(int, int, int, int, int)        # token, year, month, done, total
+    finished = Signal(int, int, int, object, bool)    # token, year, month, ScheduleMatrix, generated
+    cancelled = Signal(int, int, int)                 # token, year, month
+    failed = Signal(int, int, int, str)               # token, year, month, сообщение
+
+class MonthTask(QRunnable):
+    """
+    Месяц для окна: берёт сохранённый из БД, а если его нет (или generate=True) — генерирует.
+    optimize > 0 — после жадной генерации ещё столько секунд доводки (optimize.optimize_schedule).
+    Сигналы приходят в поток окна; db.get_conn() в потоке пула открывает своё соединение.
+    """
+    def __init__(self, employees, year: int, month: int, generate: bool = False, optimize: float = 0.0):
+        super().__init__()
+        self.employees = employees
+        self.year = year
+        self.month = month
+        self.generate = generate
+        self.optimize = optimize
+        self.token = next(_tokens)
+        self.signals = MonthSignals()
+        self._cancel = False
+
+    def cancel(self):
+        self._cancel = True
+
+    def _progress(self, done, total):
+        if self._cancel:
+            raise Cancelled()
+        self.signals.progress.emit(self.token, self.year, self.month, done, total)
+
+    def run(self):
+        y, m = self.year, self.month
+        try:
+            if self._cancel:
+                raise Cancelled()
+            names = [e["name"] for e in self.employees]
+            if not self.generate:
+                loaded = db.load_month_schedule(y, m, names)
+                if not loaded.is_empty():
+                    self.signals.finished.emit(self.token, y, m, loaded, False)
+                    return
+            # справедливость продолжается с итогов прошлого месяца (если он сохранён)
+            state = db.load_summary(*add_months(y, m, -1))
+            # те же входы (и бюджет доводки) уже считались — график из кэша, без генерации
+            schedule = generate_cached(self.employees, y, m, db.load_absences(y, m, names), db.load_fixed_events(y, m),
+                                       progress=self._progress, duty="flow", state=state, optimize=self.optimize)
+            self.signals.finished.emit(self.token, y, m, schedule, True)
+        except Cancelled:
+            self.signals.cancelled.emit(self.token, y, m)
+        except Exception as e:
+            self.signals.failed.emit(self.token, y, m, str(e))
+
+class CompactSignals(QObject):
+    finished = Signal(int)      # перенесено ячеек
+    failed = Signal(str)
+
+class CompactTask(QRunnable):
+    """Свёртка журнала правок в график (db.compact_journal) в потоке пула, своим соединением."""
+    def __init__(self):
+        super().__init__()
+        self.signals = CompactSignals()
+
+    def run(self):
+        try:
+            self.signals.finished.emit(db.compact_journal())
+        except Exception as e:
+            self.signals.failed.emit(str(e))